@@ -0,0 +1,363 @@
+"""
+Account wipes: everything a user stored, deleted in small throttled batches.
+
+A wipe runs its phases in order: the user's entries, then their images. Each
+phase is a step function that handles up to ``batch_size`` of what is left
+and returns how many it handled; 0 means the phase is done. Steps find what
+is left from the data itself, so a step repeated after a crash does no harm.
+
+After every batch the wipe's record is checkpointed: phase, counts, and a
+renewed lease on the wipe for this process. Then the wiper sleeps long enough
+to stay busy at most ``duty_cycle`` of the time, so one large account does not
+crowd out other users' queries. A pause never runs past half the lease, so
+the next batch starts while this process still holds the wipe.
+
+A wipe whose process died is taken over once its lease runs out: every
+process sweeps for such wipes every ``lease`` seconds, and at startup.
+
+The auth record is not stored here; it is deleted with the auth provider.
+"""
+import abc
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+WIPE_INDEXES = [
+    IndexModel(
+        [("status", ASCENDING), ("lease_until", ASCENDING)],
+        name="status_lease_until",
+    )
+]
+WIPE_PROJECTION = {"_id": 0, "holder": 0, "lease_until": 0}
+
+# (name, step): step(user_id, limit) handles up to limit items, returns how many
+Phase = Tuple[str, Callable[[str, int], Awaitable[int]]]
+
+
+class WipeRepository(abc.ABC):
+    async def setup(self) -> None:
+        """Index wipes by status and lease, for the sweep that resumes them."""
+
+    async def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def start(self, user_id: str, phase: str) -> dict:
+        """The user's running wipe, or a new one at ``phase``; a finished wipe
+        starts over, for whatever the user stored since."""
+
+    @abc.abstractmethod
+    async def get(self, user_id: str) -> Optional[dict]:
+        ...
+
+    @abc.abstractmethod
+    async def claim(
+        self, user_id: str, holder: str, lease_until: datetime
+    ) -> Optional[dict]:
+        """Lease the running wipe to ``holder``; None if another holder's lease is
+        current or the wipe is not running."""
+
+    @abc.abstractmethod
+    async def checkpoint(
+        self,
+        user_id: str,
+        holder: str,
+        changes: dict,
+        counts: Dict[str, int],
+        lease_until: Optional[datetime],
+    ) -> bool:
+        """Apply ``changes``, add ``counts`` and renew (or with None, release) the
+        lease; False if ``holder`` no longer holds it."""
+
+    @abc.abstractmethod
+    async def unfinished(self, now: datetime) -> List[str]:
+        """Users whose wipe is running with no current lease."""
+
+
+def _new_wipe(user_id: str, phase: str, now: datetime) -> dict:
+    return {
+        "user_id": user_id,
+        "status": "running",
+        "phase": phase,
+        "deleted": {},
+        "error": None,
+        "started_at": now,
+        "updated_at": now,
+        "finished_at": None,
+    }
+
+
+class MongoWipeRepository(WipeRepository):
+    def __init__(self, db):
+        self.db = db
+
+    async def setup(self):
+        await self.db.account_wipes.create_indexes(WIPE_INDEXES)
+
+    async def start(self, user_id, phase):
+        now = datetime.now(timezone.utc)
+        restarted = await self.db.account_wipes.find_one_and_update(
+            {"_id": user_id, "status": "done"},
+            {
+                "$set": {
+                    **_new_wipe(user_id, phase, now),
+                    "holder": None,
+                    "lease_until": now,
+                }
+            },
+            projection=WIPE_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        if restarted is not None:
+            return restarted
+        return await self.db.account_wipes.find_one_and_update(
+            {"_id": user_id},
+            {
+                "$setOnInsert": {
+                    **_new_wipe(user_id, phase, now),
+                    "holder": None,
+                    "lease_until": now,
+                }
+            },
+            projection=WIPE_PROJECTION,
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def get(self, user_id):
+        return await self.db.account_wipes.find_one(
+            {"_id": user_id}, WIPE_PROJECTION
+        )
+
+    async def claim(self, user_id, holder, lease_until):
+        now = datetime.now(timezone.utc)
+        return await self.db.account_wipes.find_one_and_update(
+            {"_id": user_id, "status": "running",
+             "$or": [{"holder": holder}, {"lease_until": {"$lt": now}}]},
+            {"$set": {"holder": holder, "lease_until": lease_until}},
+            projection=WIPE_PROJECTION, return_document=ReturnDocument.AFTER,
+        )
+
+    async def checkpoint(self, user_id, holder, changes, counts, lease_until):
+        now = datetime.now(timezone.utc)
+        update = {
+            "$set": {
+                **changes,
+                "updated_at": now,
+                "lease_until": lease_until or now,
+            }
+        }
+        if counts:
+            update["$inc"] = {
+                f"deleted.{name}": count for name, count in counts.items()
+            }
+        result = await self.db.account_wipes.update_one(
+            {"_id": user_id, "holder": holder}, update
+        )
+        return result.matched_count == 1
+
+    async def unfinished(self, now):
+        docs = self.db.account_wipes.find(
+            {"status": "running", "lease_until": {"$lt": now}}, {"_id": 1}
+        )
+        return [doc["_id"] async for doc in docs]
+
+
+class InMemoryWipeRepository(WipeRepository):
+    def __init__(self):
+        self._wipes: Dict[str, dict] = {}
+
+    def _public(self, wipe: dict) -> dict:
+        return {
+            key: value for key, value in wipe.items() if key not in WIPE_PROJECTION
+        }
+
+    async def start(self, user_id, phase):
+        now = datetime.now(timezone.utc)
+        wipe = self._wipes.get(user_id)
+        if wipe is None or wipe["status"] == "done":
+            wipe = self._wipes[user_id] = {
+                **_new_wipe(user_id, phase, now),
+                "holder": None,
+                "lease_until": now,
+            }
+        return self._public(wipe)
+
+    async def get(self, user_id):
+        wipe = self._wipes.get(user_id)
+        return self._public(wipe) if wipe is not None else None
+
+    async def claim(self, user_id, holder, lease_until):
+        wipe = self._wipes.get(user_id)
+        if wipe is None or wipe["status"] != "running":
+            return None
+        if wipe["holder"] != holder and wipe["lease_until"] >= datetime.now(
+            timezone.utc
+        ):
+            return None
+        wipe.update(holder=holder, lease_until=lease_until)
+        return self._public(wipe)
+
+    async def checkpoint(self, user_id, holder, changes, counts, lease_until):
+        wipe = self._wipes.get(user_id)
+        if wipe is None or wipe["holder"] != holder:
+            return False
+        now = datetime.now(timezone.utc)
+        wipe.update(changes, updated_at=now, lease_until=lease_until or now)
+        for name, count in counts.items():
+            wipe["deleted"][name] = wipe["deleted"].get(name, 0) + count
+        return True
+
+    async def unfinished(self, now):
+        return [user_id for user_id, wipe in self._wipes.items()
+                if wipe["status"] == "running" and wipe["lease_until"] < now]
+
+
+class AccountWiper:
+
+    def __init__(
+        self,
+        wipes: WipeRepository,
+        phases: List[Phase],
+        batch_size: int = 100,
+        duty_cycle: float = 0.2,
+        lease: float = 60.0,
+    ):
+        if not 0 < duty_cycle <= 1:
+            raise ValueError(f"duty_cycle must be over 0 and at most 1, "
+                             f"not {duty_cycle}")
+        self.wipes = wipes
+        self.phases = phases
+        self.batch_size = batch_size
+        self.duty_cycle = duty_cycle
+        self.lease = lease
+        # Identifies this process's leases
+        self.holder = uuid.uuid4().hex
+        self._running: Dict[str, asyncio.Task] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def request(self, user_id: str) -> dict:
+        """Start wiping the user's data, or report the wipe already under way."""
+        wipe = await self.wipes.start(user_id, self.phases[0][0])
+        if wipe["status"] == "running":
+            self._schedule(user_id)
+        return wipe
+
+    def _schedule(self, user_id: str) -> None:
+        if user_id not in self._running:
+            self._running[user_id] = asyncio.get_running_loop().create_task(
+                self._run(user_id)
+            )
+
+    async def resume(self) -> int:
+        """Take over wipes whose lease ran out; returns how many."""
+        user_ids = [
+            user_id
+            for user_id in await self.wipes.unfinished(datetime.now(timezone.utc))
+            if user_id not in self._running
+        ]
+        for user_id in user_ids:
+            self._schedule(user_id)
+        return len(user_ids)
+
+    async def _sweep(self) -> None:
+        while True:
+            try:
+                resumed = await self.resume()
+                if resumed:
+                    logger.info("Resumed %d account wipes", resumed)
+            except Exception:
+                logger.exception("Looking for account wipes to resume failed")
+            await asyncio.sleep(self.lease)
+
+    def _lease_until(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.lease)
+
+    async def _run(self, user_id: str) -> None:
+        try:
+            wipe = await self.wipes.claim(
+                user_id, self.holder, self._lease_until()
+            )
+            if wipe is not None:
+                await self._wipe(user_id, wipe["phase"])
+        except asyncio.CancelledError:
+            # Shutting down: let another process take over right away
+            await self.wipes.checkpoint(user_id, self.holder, {}, {}, None)
+            raise
+        except Exception as exc:
+            # The lease runs out and a sweep retries
+            logger.exception("Wiping the account of %s failed", user_id)
+            await self.wipes.checkpoint(
+                user_id,
+                self.holder,
+                {"error": str(exc) or type(exc).__name__},
+                {},
+                None,
+            )
+        finally:
+            del self._running[user_id]
+
+    async def _wipe(self, user_id: str, phase: str) -> None:
+        names = [name for name, _ in self.phases]
+        # None once the last phase is through
+        first = names.index(phase) if phase is not None else len(names)
+        for position in range(first, len(names)):
+            name, step = self.phases[position]
+            while True:
+                started = time.monotonic()
+                handled = await step(user_id, self.batch_size)
+                busy = time.monotonic() - started
+                if not handled:
+                    break
+                if not await self.wipes.checkpoint(
+                    user_id,
+                    self.holder,
+                    {"phase": name, "error": None},
+                    {name: handled},
+                    self._lease_until(),
+                ):
+                    logger.warning(
+                        "Lost the lease on the account wipe of %s", user_id
+                    )
+                    return
+                # Idle long enough that this wipe is busy at most duty_cycle of
+                # the time, within the lease the checkpoint just renewed
+                pause = busy * (1 - self.duty_cycle) / self.duty_cycle
+                await asyncio.sleep(min(pause, self.lease / 2))
+            following = names[position + 1] if position + 1 < len(names) else None
+            await self.wipes.checkpoint(
+                user_id, self.holder, {"phase": following}, {}, self._lease_until()
+            )
+        await self.wipes.checkpoint(
+            user_id,
+            self.holder,
+            {"status": "done", "finished_at": datetime.now(timezone.utc)},
+            {},
+            None,
+        )
+        logger.info("Wiped the account of %s", user_id)
+
+    async def wait(self) -> None:
+        """Wait for every wipe in progress."""
+        while self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    async def close(self) -> None:
+        tasks = list(self._running.values())
+        if self._sweeper is not None:
+            tasks.append(self._sweeper)
+            self._sweeper = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
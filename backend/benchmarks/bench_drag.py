@@ -0,0 +1,146 @@
+"""
+Load test for the board drag WebSocket: entry writes per second against
+drag event rate.
+
+Drives ``server:app`` in-process: its lifespan, plus ``--clients``
+WebSocket connections speaking ASGI directly, without sockets. Each client
+drags ``--entries`` entries of its own, sending every entry's position
+``--rate`` times a second for ``--seconds``. Runs once per rate and reports
+events/s against the position writes the drag ticks made. Writes per second
+should hold near entries moved / tick whatever the event rate. Run from the
+backend directory:
+
+    python -m benchmarks.bench_drag --clients 50 --rates 10 60 240
+
+Unless STORAGE_ENGINE is set the memory engine is used. DRAG_TICK_MS sets
+the tick as it does for the server.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import List
+
+os.environ.setdefault('STORAGE_ENGINE', 'memory')
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+
+import httpx  # noqa: E402
+
+import metrics  # noqa: E402
+import server  # noqa: E402
+
+BOARD = "bench-drag"
+
+
+def total(counter: metrics.Counter) -> float:
+    return sum(value for _, value in counter.items())
+
+
+async def drag_client(entry_ids: List[str], rate: float, seconds: float) -> None:
+    """One WebSocket connection to the drag endpoint, spoken as raw ASGI."""
+    incoming: asyncio.Queue = asyncio.Queue()
+    accepted = asyncio.Event()
+
+    async def receive():
+        return await incoming.get()
+
+    async def send(message):
+        if message["type"] == "websocket.accept":
+            accepted.set()
+
+    path = f"/api/boards/{BOARD}/drag"
+    scope = {
+        "type": "websocket",
+        "asgi": {"version": "3.0"},
+        "scheme": "ws",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [],
+        "subprotocols": [],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    connection = asyncio.create_task(server.app(scope, receive, send))
+    await incoming.put({"type": "websocket.connect"})
+    await accepted.wait()
+
+    interval, started, step = 1 / rate, time.perf_counter(), 0
+    while time.perf_counter() - started < seconds:
+        step += 1
+        moves = [{"id": entry_id, "x": step, "y": step} for entry_id in entry_ids]
+        await incoming.put(
+            {"type": "websocket.receive", "text": json.dumps(moves)}
+        )
+        # Paced against the start, so a slow loop does not lower the rate
+        await asyncio.sleep(
+            max(0.0, started + step * interval - time.perf_counter())
+        )
+    await incoming.put({"type": "websocket.disconnect", "code": 1000})
+    await connection
+
+
+async def run(args) -> None:
+    # One request log line per created entry otherwise
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            entry_ids = []
+            for i in range(args.clients * args.entries):
+                response = await client.post(
+                    f"/api/boards/{BOARD}/entries",
+                    json={"user_id": "bench", "title": str(i), "x": 0, "y": 0},
+                )
+                entry_ids.append(response.json()["id"])
+        tick = server.drag_coalescer.tick
+        moved = len(entry_ids)
+        print(
+            f"{args.clients} clients x {args.entries} entries, "
+            f"tick {tick * 1000:.0f} ms: "
+            f"writes/s bound {moved / tick:,.0f}"
+        )
+
+        for rate in args.rates:
+            events, writes = total(metrics.drag_events), total(metrics.drag_writes)
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                drag_client(entry_ids[i * args.entries:(i + 1) * args.entries],
+                            rate, args.seconds)
+                for i in range(args.clients)
+            ))
+            # Count the final tick's writes too
+            await server.drag_coalescer.flush()
+            elapsed = time.perf_counter() - started
+            events = total(metrics.drag_events) - events
+            writes = total(metrics.drag_writes) - writes
+            print(
+                f"rate {rate:>6.0f}/s per entry: "
+                f"{events / elapsed:>10,.0f} events/s  "
+                f"{writes / elapsed:>8,.0f} writes/s  "
+                f"({events / max(writes, 1):,.1f} events per write)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drag WebSocket coalescing load test"
+    )
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument(
+        "--entries", type=int, default=1, help="entries dragged per client"
+    )
+    parser.add_argument("--rates", type=float, nargs="+", default=[10, 60, 240],
+                        help="position events per second per entry")
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Board exports against request latency.
+
+Seeds a board with ``--entries`` entries, then measures GET latency for one
+entry in-process (httpx ASGI transport) twice: idle, and while ``--jobs``
+exports of the board render at ``--scale``. Renders run in EXPORT_WORKERS
+processes, so request latency should barely move while they run. Also
+reports export throughput in megapixels per second. Run from the backend
+directory:
+
+    EXPORT_WORKERS=2 python -m benchmarks.bench_exports --entries 5000 --jobs 4
+
+Uses the memory engine unless STORAGE_ENGINE is set, and writes exports to
+a temporary EXPORT_DIR.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+os.environ.setdefault('STORAGE_ENGINE', 'memory')
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+os.environ.setdefault('EXPORT_DIR', tempfile.mkdtemp(prefix="bench-exports-"))
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from benchmarks.load import percentile  # noqa: E402
+
+BOARD = "bench-export"
+
+
+async def latencies(client: httpx.AsyncClient, path: str, until) -> List[float]:
+    samples = []
+    while not until():
+        started = time.perf_counter()
+        await client.get(path)
+        samples.append(time.perf_counter() - started)
+        # About 100 requests a second, like a busy but not saturated worker
+        await asyncio.sleep(0.01)
+    return sorted(samples)
+
+
+def summary(samples: List[float]) -> str:
+    return (
+        f"{len(samples):>5} requests  "
+        f"p50 {percentile(samples, 0.50) * 1000:6.2f} ms  "
+        f"p99 {percentile(samples, 0.99) * 1000:6.2f} ms  "
+        f"max {samples[-1] * 1000:7.2f} ms"
+    )
+
+
+async def run(args) -> None:
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    rng = random.Random(24)
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            entry_id = None
+            for i in range(args.entries):
+                response = await client.post(
+                    f"/api/boards/{BOARD}/entries",
+                    json={
+                        "user_id": "bench",
+                        "title": str(i),
+                        "x": rng.uniform(0, args.board_size),
+                        "y": rng.uniform(0, args.board_size),
+                        "color": rng.choice(["butter", "grass", "mint", "sky"]),
+                    },
+                )
+                entry_id = response.json()["id"]
+            path = f"/api/boards/{BOARD}/entries/{entry_id}"
+
+            deadline = time.perf_counter() + args.idle_seconds
+            print(
+                "idle:      ",
+                summary(
+                    await latencies(
+                        client, path, lambda: time.perf_counter() > deadline
+                    )
+                ),
+            )
+
+            started = time.perf_counter()
+            jobs = [
+                (
+                    await client.post(
+                        f"/api/boards/{BOARD}/exports",
+                        json={"format": args.format, "scale": args.scale},
+                    )
+                ).json()
+                for _ in range(args.jobs)
+            ]
+            samples = await latencies(
+                client, path, lambda: not server.export_runner.active
+            )
+            elapsed = time.perf_counter() - started
+            print("exporting: ", summary(samples))
+
+            jobs = [
+                (await client.get(f"/api/exports/{job['id']}")).json()
+                for job in jobs
+            ]
+            pixels = sum(
+                job["width"] * job["height"]
+                for job in jobs
+                if job["status"] == "done"
+            )
+            print(
+                f"{args.jobs} x {jobs[0]['width']}x{jobs[0]['height']} "
+                f"{args.format} with {server.EXPORT_WORKERS} workers "
+                f"in {elapsed:.1f}s: {pixels / elapsed / 1e6:.1f} MPix/s, "
+                f"{sum(job['size'] or 0 for job in jobs) / 1e6:.1f} MB written"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export rendering vs request latency"
+    )
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--board-size", type=float, default=10000)
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--scale", type=float, default=1)
+    parser.add_argument("--format", choices=["png", "pdf"], default="png")
+    parser.add_argument("--idle-seconds", type=float, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
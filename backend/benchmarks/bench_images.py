@@ -0,0 +1,189 @@
+"""
+Concurrent image fetches against one uvicorn worker.
+
+Starts ``server:app`` under uvicorn in a subprocess with a fresh IMAGE_DIR,
+uploads ``--images`` random images of ``--size`` bytes, then fetches them
+with ``--concurrency`` concurrent clients the way a board open does, once per
+mode:
+
+* ``full``: whole images (200)
+* ``range``: one 64 KiB byte range per request (206), as a resumed download
+* ``revalidate``: conditional requests with the image's ETag (304)
+
+and reports requests/s, throughput and latency percentiles per mode. Run
+from the backend directory:
+
+    python -m benchmarks.bench_images --images 64 --size 400000 --concurrency 64
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+MODES = ("full", "range", "revalidate")
+RANGE_BYTES = 64 * 1024
+
+
+def start_server(port: int, image_dir: str) -> subprocess.Popen:
+    env = {**os.environ, "IMAGE_DIR": image_dir, "IMAGE_STORAGE": "local"}
+    env.setdefault('STORAGE_ENGINE', 'memory')
+    env.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    env.setdefault('DB_NAME', 'benchmark')
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            httpx.get(
+                f"http://127.0.0.1:{port}/api/", timeout=1
+            ).raise_for_status()
+            return process
+        except httpx.TransportError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.terminate()
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.05)
+
+
+async def seed(client: httpx.AsyncClient, images: int, size: int) -> List[str]:
+    digests = []
+    for _ in range(images):
+        data = os.urandom(size)
+        response = await client.post(
+            "/api/images",
+            params={"user_id": "bench"},
+            content=data,
+            headers={"content-type": "image/jpeg"},
+        )
+        response.raise_for_status()
+        digests.append(hashlib.sha256(data).hexdigest())
+    return digests
+
+
+def request_headers(mode: str, digest: str, size: int) -> Dict[str, str]:
+    if mode == "range":
+        start = random.randrange(max(size - RANGE_BYTES, 1))
+        return {"range": f"bytes={start}-{start + RANGE_BYTES - 1}"}
+    if mode == "revalidate":
+        return {"if-none-match": f'"{digest}"'}
+    return {}
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    mode: str,
+    digests: List[str],
+    size: int,
+    requests: int,
+    concurrency: int,
+) -> dict:
+    latencies: List[float] = []
+    received = errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal received, errors
+        for i in counter:
+            digest = digests[i % len(digests)]
+            started = time.perf_counter()
+            response = await client.get(
+                f"/api/images/{digest}",
+                headers=request_headers(mode, digest, size),
+            )
+            latencies.append(time.perf_counter() - started)
+            received += len(response.content)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "mib_per_s": round(received / elapsed / 2**20, 1),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies) * 1000, 2),
+            "p99": round(
+                latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000, 2
+            ),
+        },
+    }
+
+
+async def run(args) -> None:
+    limits = httpx.Limits(
+        max_connections=args.concurrency,
+        max_keepalive_connections=args.concurrency,
+    )
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60
+    ) as client:
+        digests = await seed(client, args.images, args.size)
+        for mode in args.modes:
+            # Warm-up pass (page cache, connections), not recorded
+            await drive(
+                client,
+                mode,
+                digests,
+                args.size,
+                min(args.requests, 200),
+                args.concurrency,
+            )
+            result = await drive(
+                client, mode, digests, args.size, args.requests, args.concurrency
+            )
+            print(
+                f"{mode:<11} {result['req_per_s']:>9,.0f} req/s  "
+                f"{result['mib_per_s']:>8,.1f} MiB/s  "
+                f"p50 {result['latency_ms']['p50']:7.2f} ms  "
+                f"p99 {result['latency_ms']['p99']:7.2f} ms"
+                f"  errors {result['errors']}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Concurrent image fetch benchmark, one worker"
+    )
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument(
+        "--size", type=int, default=400_000, help="bytes per image"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="requests per mode"
+    )
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as image_dir:
+        process = start_server(args.port, image_dir)
+        try:
+            asyncio.run(run(args))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
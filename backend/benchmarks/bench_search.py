@@ -0,0 +1,162 @@
+"""
+Search latency at scale: GET /api/search over one user's entries.
+
+Stores ``--entries`` entries for one user, spread over boards. Their titles
+and commentary are drawn from a synthetic vocabulary with a Zipf-like word
+frequency, as real text has. Then it times each query kind in-process
+through the endpoint (httpx ASGI transport, no sockets), so times include
+validation and serialization. Reports p50/p95/p99 and the match count per
+query. Run from the backend directory:
+
+    python -m benchmarks.bench_search --entries 100000
+
+Unless STORAGE_ENGINE is set the mongo engine is used, since its index
+plan is what the numbers are about: the entries are written to DB_NAME and
+dropped afterwards. STORAGE_ENGINE=memory times the in-process TermIndex
+instead.
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import time
+from typing import List
+
+os.environ.setdefault('STORAGE_ENGINE', 'mongo')
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from benchmarks.load import percentile  # noqa: E402
+
+USER = "bench-user"
+SYLLABLES = [
+    "ka",
+    "to",
+    "ra",
+    "men",
+    "shi",
+    "ku",
+    "yo",
+    "no",
+    "ma",
+    "ri",
+    "sa",
+    "ta",
+    "chi",
+    "ne",
+    "ho",
+    "mi",
+]
+
+
+def vocabulary(size: int, rng: random.Random) -> List[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def sentence(
+    words: List[str], cum_weights: List[float], count: int, rng: random.Random
+) -> str:
+    return " ".join(
+        rng.choices(words, cum_weights=cum_weights, k=count)
+    ).capitalize()
+
+
+async def seed(count: int, boards: int, rng: random.Random) -> List[str]:
+    words = vocabulary(20000, rng)
+    rng.shuffle(words)
+    # Zipf-like: the n-th word is 1/n as frequent as the first
+    weights = list(
+        itertools.accumulate(1 / rank for rank in range(1, len(words) + 1))
+    )
+    for i in range(count):
+        entry = server.Entry(
+            board_id=f"bench-board-{i % boards}",
+            user_id=USER,
+            x=i % 5000,
+            y=i // 5000 * 200,
+            title=sentence(words, weights, rng.randint(1, 4), rng),
+            commentary=sentence(words, weights, rng.randint(0, 12), rng) or None,
+            z_key=f"V{i:08d}1",
+        )
+        await server.board_entries.insert(server.entry_to_doc(entry))
+    return words
+
+
+async def run(args) -> None:
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        started = time.perf_counter()
+        words = await seed(args.entries, args.boards, rng)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{args.entries:,} entries indexed in {elapsed:.1f}s "
+            f"({args.entries / elapsed:,.0f}/s, "
+            f"{server.STORAGE_ENGINE} engine)"
+        )
+
+        common, rare = words[0], words[-1]
+        queries = {
+            "common word": common,
+            "rare word": rare,
+            "1-char prefix": common[:1],
+            "3-char prefix": common[:3],
+            "two prefixes": f"{common[:3]} {words[1][:3]}",
+            "two words": f"{words[1]} {words[2]}",
+            "no match": "zzz",
+        }
+        try:
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench"
+            ) as client:
+                for name, q in queries.items():
+                    params = {"q": q, "user_id": USER, "limit": args.limit}
+                    latencies, found = [], 0
+                    for _ in range(args.repeat):
+                        started = time.perf_counter()
+                        response = await client.get("/api/search", params=params)
+                        latencies.append(time.perf_counter() - started)
+                        found = len(response.json())
+                    matched = len(
+                        await server.board_entries.search(
+                            USER, server.search.terms(q), args.entries
+                        )
+                    )
+                    latencies.sort()
+                    print(
+                        f"{name:>14} {q!r:>22}: {matched:>7,} matches, "
+                        f"{found:>3} returned  "
+                        f"p50 {percentile(latencies, 0.50) * 1000:7.2f} ms  "
+                        f"p95 {percentile(latencies, 0.95) * 1000:7.2f} ms  "
+                        f"p99 {percentile(latencies, 0.99) * 1000:7.2f} ms"
+                    )
+        finally:
+            if server.db is not None:
+                await server.db.entries.drop()
+                await server.db.entry_tiles.drop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entry search latency benchmark")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--boards", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument(
+        "--repeat", type=int, default=50, help="requests per query"
+    )
+    parser.add_argument("--seed", type=int, default=23)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
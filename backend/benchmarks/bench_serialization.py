@@ -0,0 +1,103 @@
+"""
+Microbenchmark: encoding a GET /api/status page.
+
+Compares the default FastAPI response-model path (validate every row, then
+jsonable_encoder + stdlib json), pydantic's own dump_json, and the orjson fast
+path in serialization.py. Run from the backend directory:
+
+    python -m benchmarks.bench_serialization --rows 1000
+"""
+import argparse
+import json
+import os
+import timeit
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from serialization import dump_status_checks  # noqa: E402
+from server import StatusCheck  # noqa: E402
+
+status_check_list = TypeAdapter(List[StatusCheck])
+
+
+def make_docs(rows: int, native: bool) -> List[dict]:
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    docs = []
+    for i in range(rows):
+        timestamp = start + timedelta(seconds=i, microseconds=i)
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "client_name": f"agent-{i % 50}",
+            "timestamp": timestamp if native else timestamp.isoformat(),
+        })
+    return docs
+
+
+def response_model_path(docs, native):
+    rows = [dict(doc) for doc in docs]
+    if not native:
+        for row in rows:
+            row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    validated = status_check_list.validate_python(rows)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def pydantic_path(docs, native):
+    rows = [dict(doc) for doc in docs]
+    return status_check_list.dump_json(status_check_list.validate_python(rows))
+
+
+def fast_path(docs, native):
+    return dump_status_checks([dict(doc) for doc in docs], native)
+
+
+PATHS = {
+    "response_model": response_model_path,
+    "pydantic_dump_json": pydantic_path,
+    "orjson_fast": fast_path,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Status list serialization benchmark"
+    )
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    for native in (False, True):
+        docs = make_docs(args.rows, native)
+        # All paths must produce the same document
+        expected = json.loads(pydantic_path(docs, native))
+        baseline = None
+        kind = 'native' if native else 'iso string'
+        print(f"\n{args.rows} rows, {kind} timestamps")
+        for name, path in PATHS.items():
+            assert json.loads(path(docs, native)) == expected, name
+            best = (
+                min(
+                    timeit.repeat(
+                        lambda: path(docs, native),
+                        repeat=args.repeat,
+                        number=args.number,
+                    )
+                )
+                / args.number
+            )
+            baseline = baseline or best
+            print(
+                f"  {name:<20} {best * 1000:8.3f} ms/page  {baseline / best:5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Load test for GET /api/status/stream: thousands of SSE subscribers on one worker.
+
+Starts the app under uvicorn in this process, opens ``--subscribers`` raw
+connections to the stream, then publishes ``--events`` status checks through
+the broker (as the write path does after an insert) and measures delivery
+latency and process memory. Run from the backend directory:
+
+    python -m benchmarks.bench_sse --subscribers 5000 --events 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+os.environ.setdefault('STORAGE_ENGINE', 'memory')
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+
+import uvicorn  # noqa: E402
+
+import server  # noqa: E402
+from serialization import dump_status_check_line  # noqa: E402
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def subscriber(
+    port: int, ready: asyncio.Event, counter: list, latencies: list, events: int
+):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        b"GET /api/status/stream HTTP/1.1\r\nHost: bench\r\n"
+        b"Accept: text/event-stream\r\n\r\n"
+    )
+    await writer.drain()
+    received = 0
+    try:
+        while received < events:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith(b"retry:"):
+                counter[0] += 1
+                if counter[0] == counter[1]:
+                    ready.set()
+            elif line.startswith(b"data: {"):
+                sent_at = json.loads(line[6:])["client_name"]
+                latencies.append(time.perf_counter() - float(sent_at))
+                received += 1
+    finally:
+        writer.close()
+
+
+async def run(subscribers: int, events: int, interval: float, port: int):
+    config = uvicorn.Config(
+        server.app,
+        host="127.0.0.1",
+        port=port,
+        log_level="warning",
+        backlog=subscribers,
+    )
+    uvicorn_server = uvicorn.Server(config)
+    serve = asyncio.create_task(uvicorn_server.serve())
+    while not uvicorn_server.started:
+        if serve.done():
+            serve.result()
+            raise RuntimeError("uvicorn exited before it started serving")
+        await asyncio.sleep(0.05)
+
+    rss_before = max_rss_mb()
+    ready, counter, latencies = asyncio.Event(), [0, subscribers], []
+    clients = [
+        asyncio.create_task(subscriber(port, ready, counter, latencies, events))
+        for _ in range(subscribers)
+    ]
+    connect_started = time.perf_counter()
+    await asyncio.wait_for(ready.wait(), timeout=120)
+    connect_seconds = time.perf_counter() - connect_started
+
+    publish_started = time.perf_counter()
+    for _ in range(events):
+        # The sender's clock rides in client_name so subscribers can time delivery
+        doc = {"id": str(uuid.uuid4()), "client_name": repr(time.perf_counter()),
+               "timestamp": datetime.now(timezone.utc)}
+        server.status_broker.publish(
+            (
+                doc["client_name"],
+                doc["id"],
+                dump_status_check_line(doc, True).rstrip(),
+            )
+        )
+        await asyncio.sleep(interval)
+    await asyncio.wait_for(asyncio.gather(*clients), timeout=300)
+    deliver_seconds = time.perf_counter() - publish_started
+
+    uvicorn_server.should_exit = True
+    await serve
+
+    latencies.sort()
+    print(f"subscribers connected: {subscribers} in {connect_seconds:.2f}s")
+    print(
+        f"events delivered:     {len(latencies)} / {subscribers * events} "
+        f"in {deliver_seconds:.2f}s "
+        f"({len(latencies) / deliver_seconds:,.0f} msg/s)"
+    )
+    print(
+        f"delivery latency:     p50 {statistics.median(latencies) * 1000:.1f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms"
+    )
+    print(f"max RSS:              {max_rss_mb():.0f} MB "
+          f"(+{max_rss_mb() - rss_before:.0f} MB for subscribers)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE fan-out load test")
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.05,
+                        help="seconds between published events")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    # Each subscriber holds two sockets (client and server side) in this process
+    resource.setrlimit(
+        resource.RLIMIT_NOFILE,
+        (max(soft, min(hard, args.subscribers * 2 + 256)), hard),
+    )
+    asyncio.run(run(args.subscribers, args.events, args.interval, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Cold-start profiler for the API.
+
+Measures what an autoscaled worker pays before it can serve traffic, each run
+in a fresh interpreter so nothing is already imported:
+
+* ``import``: ``import server`` (modules and app construction)
+* ``startup``: the app's lifespan startup (clients, indexes, caches, tasks)
+* ``first_request``: the first ``GET /api/`` through the ASGI app
+* ``total``: process spawn to exit, including interpreter start
+
+``--server uvicorn`` instead times a real uvicorn process from spawn to its
+first HTTP response (reported as ``total``). ``--importtime`` lists the
+slowest imports reported by ``python -X importtime``. Run from the backend
+directory:
+
+    python -m benchmarks.cold_start --runs 5
+    python -m benchmarks.cold_start --importtime 15
+    python -m benchmarks.cold_start --server uvicorn
+
+Unless STORAGE_ENGINE is set the memory engine is used, so the numbers are
+the process's own cost rather than MongoDB's.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+PHASES = ("import", "startup", "first_request", "total")
+
+# Runs in the child interpreter; prints one JSON object of phase timings
+PROBE = """
+import asyncio
+import json
+import time
+
+import httpx
+
+started = time.perf_counter()
+import server
+
+imported = time.perf_counter()
+
+
+async def main():
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        ready = time.perf_counter()
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://cold-start"
+        ) as client:
+            response = await client.get("/api/")
+            response.raise_for_status()
+        return ready, time.perf_counter()
+
+
+ready, served = asyncio.run(main())
+print(json.dumps({
+    "import": imported - started,
+    "startup": ready - imported,
+    "first_request": served - ready,
+}))
+"""
+
+
+def child_env() -> Dict[str, str]:
+    env = {**os.environ}
+    env.setdefault('STORAGE_ENGINE', 'memory')
+    env.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    env.setdefault('DB_NAME', 'benchmark')
+    return env
+
+
+def measure_in_process() -> Dict[str, float]:
+    """One cold start in a fresh interpreter; seconds per phase."""
+    spawned = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=child_env(),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    # Spawn to exit; interpreter start and teardown included
+    timings["total"] = time.perf_counter() - spawned
+    return timings
+
+
+def measure_uvicorn(port: int, timeout: float = 60) -> Dict[str, float]:
+    import httpx
+
+    spawned = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=child_env(),
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                httpx.get(
+                    f"http://127.0.0.1:{port}/api/", timeout=1
+                ).raise_for_status()
+                return {"total": time.perf_counter() - spawned}
+            except httpx.TransportError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def slowest_imports(limit: int) -> List[tuple]:
+    """(cumulative seconds, module) for the slowest imports of ``server``."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR,
+        env=child_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1e6, module.rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def summarize(runs: List[Dict[str, float]]) -> Dict[str, dict]:
+    summary = {}
+    for phase in PHASES:
+        values = sorted(run[phase] for run in runs if phase in run)
+        if values:
+            summary[phase] = {
+                "median_ms": round(statistics.median(values) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+            }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API cold-start profiler")
+    parser.add_argument(
+        "--server", choices=["inprocess", "uvicorn"], default="inprocess"
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--importtime", type=int, metavar="N", default=0,
+                        help="also list the N slowest imports")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    if args.server == "inprocess":
+        runs = [measure_in_process() for _ in range(args.runs)]
+    else:
+        runs = [measure_uvicorn(args.port) for _ in range(args.runs)]
+    summary = summarize(runs)
+    for phase, result in summary.items():
+        print(
+            f"{phase:<14} median {result['median_ms']:8.1f} ms  "
+            f"max {result['max_ms']:8.1f} ms"
+        )
+
+    report = {"server": args.server, "runs": args.runs, "results": summary}
+    if args.importtime:
+        imports = slowest_imports(args.importtime)
+        print("\nslowest imports (cumulative):")
+        for seconds, module in imports:
+            print(f"  {seconds * 1000:8.1f} ms  {module.strip()}")
+        report["slowest_imports"] = [
+            {"module": module.strip(), "cumulative_ms": round(seconds * 1000, 1)}
+            for seconds, module in imports
+        ]
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+HTTP load benchmark for the status API.
+
+Drives the ASGI ``app`` from server.py either in-process (httpx ASGI
+transport, no sockets) or over a local uvicorn subprocess, with a fixed
+number of concurrent asyncio workers per route. Reports requests/s and
+p50/p95/p99 latency per route and, in-process, memory allocated per request
+as measured by tracemalloc. Results are written as JSON so runs can be
+compared across commits. Run from the backend directory:
+
+    python -m benchmarks.load --requests 5000 --concurrency 32
+    python -m benchmarks.load --server uvicorn --output results/head.json
+    python -m benchmarks.load --compare results/base.json results/head.json
+
+The in-process mode uses the memory storage engine unless STORAGE_ENGINE is
+set, so it measures the API's own overhead rather than database latency.
+
+GET pages are cached until the next write, so replaying reads alone would
+time nothing but the cache. GET routes therefore interleave a status check
+write every ``1 / --write-ratio`` requests. Their latencies are reported
+overall and split by the X-Cache header into cache hits and misses (the
+query path); the interleaved writes are timed separately.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+class Route(NamedTuple):
+    method: str
+    path: str
+    body: Callable[[int], dict]
+
+
+def check_body(i: int) -> dict:
+    return {"client_name": f"bench-{i % 64}"}
+
+
+WRITE = Route("POST", "/api/status", check_body)
+ROUTES: Dict[str, Route] = {
+    "POST /api/status": WRITE,
+    "GET /api/status": Route("GET", "/api/status?limit=100", None),
+    "GET /api/status?limit=1000": Route("GET", "/api/status?limit=1000", None),
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = round(fraction * len(sorted_values)) - 1
+    return sorted_values[min(len(sorted_values) - 1, max(0, rank))]
+
+
+def latency_ms(latencies: List[float]) -> dict:
+    """Mean and percentiles of already sorted ``latencies``, in ms."""
+    if not latencies:
+        return {}
+    return {
+        "mean": round(statistics.fmean(latencies) * 1000, 3),
+        "p50": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def is_write(i: int, write_ratio: float) -> bool:
+    """Whether request ``i`` is a write: evenly spread, ``write_ratio`` of all."""
+    return int((i + 1) * write_ratio) > int(i * write_ratio)
+
+
+async def send(client: httpx.AsyncClient, route: Route, i: int) -> httpx.Response:
+    if route.method == "POST":
+        return await client.post(route.path, json=route.body(i))
+    return await client.get(route.path)
+
+
+async def drive(client: httpx.AsyncClient, route: Route, requests: int,
+                concurrency: int, write_ratio: float = 0.0) -> dict:
+    """Send ``requests`` to ``route``; GETs interleave ``write_ratio`` writes."""
+    if route.method != "GET":
+        write_ratio = 0.0
+    latencies: List[float] = []
+    # By X-Cache; routes without it count as misses
+    by_cache: Dict[str, List[float]] = {"hit": [], "miss": []}
+    writes: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            write = is_write(i, write_ratio)
+            started = time.perf_counter()
+            response = await send(client, WRITE if write else route, i)
+            elapsed = time.perf_counter() - started
+            if write:
+                writes.append(elapsed)
+            else:
+                latencies.append(elapsed)
+                cache = response.headers.get("x-cache", "miss")
+                by_cache["hit" if cache == "hit" else "miss"].append(elapsed)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    for values in (latencies, writes, *by_cache.values()):
+        values.sort()
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "latency_ms": latency_ms(latencies),
+    }
+    if route.method == "GET":
+        result["cache"] = {
+            "hit_ratio": round(len(by_cache["hit"]) / max(1, len(latencies)), 3),
+            "hit_ms": latency_ms(by_cache["hit"]),
+            "miss_ms": latency_ms(by_cache["miss"]),
+        }
+        result["writes"] = {"write_ratio": write_ratio, "requests": len(writes),
+                            "latency_ms": latency_ms(writes)}
+    return result
+
+
+async def measure_allocations(client: httpx.AsyncClient, route: Route,
+                              samples: int, bust: Callable[[], None]) -> dict:
+    """Per-request peak allocation and retained memory, one request at a time.
+
+    ``bust`` invalidates the response cache before each sample, so GETs are
+    measured on the query path, not as cache hits.
+    """
+    # Warm up so import-time and first-call caches are not billed to requests
+    for i in range(10):
+        await send(client, route, i)
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        peaks = []
+        for i in range(samples):
+            bust()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await send(client, route, i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    return {
+        "alloc_peak_bytes_per_request": int(statistics.median(peaks)),
+        "retained_bytes_per_request": int(retained / samples),
+    }
+
+
+async def seed(client: httpx.AsyncClient, count: int) -> None:
+    items = [{"client_name": f"seed-{i % 64}"} for i in range(count)]
+    for start in range(0, count, 1000):
+        response = await client.post("/api/status/bulk",
+                                     json=items[start:start + 1000])
+        response.raise_for_status()
+
+
+async def run_routes(client, routes, args, bust=None) -> dict:
+    """Drive each route; ``bust`` is given in-process, for allocation samples."""
+    if args.seed:
+        await seed(client, args.seed)
+    results = {}
+    for name in routes:
+        route = ROUTES[name]
+        # Warm-up pass, not recorded
+        await drive(client, route, min(200, args.requests), args.concurrency,
+                    args.write_ratio)
+        result = await drive(client, route, args.requests, args.concurrency,
+                             args.write_ratio)
+        if bust is not None and args.alloc_samples:
+            result.update(await measure_allocations(client, route,
+                                                    args.alloc_samples, bust))
+        results[name] = result
+        print_result(name, result)
+    return results
+
+
+async def run_in_process(routes, args) -> dict:
+    os.environ.setdefault('STORAGE_ENGINE', 'memory')
+    os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    os.environ.setdefault('DB_NAME', 'benchmark')
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    # server.py logs at INFO; per-request client logs would swamp the timings
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://bench") as client:
+            return await run_routes(client, routes, args,
+                                    bust=server.status_cache.bump)
+
+
+async def run_over_uvicorn(routes, args) -> dict:
+    env = {**os.environ}
+    env.setdefault('STORAGE_ENGINE', 'memory')
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency,
+                          max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits,
+                                     timeout=30) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    await client.get("/api/")
+                    break
+                except httpx.TransportError:
+                    if process.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError("uvicorn did not start")
+                    await asyncio.sleep(0.1)
+            return await run_routes(client, routes, args)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def print_result(name: str, result: dict) -> None:
+    latency = result["latency_ms"]
+    line = (f"{name:<28} {result['req_per_s']:>9,.0f} req/s  "
+            f"p50 {latency['p50']:7.2f} ms  p95 {latency['p95']:7.2f} ms  "
+            f"p99 {latency['p99']:7.2f} ms")
+    if "alloc_peak_bytes_per_request" in result:
+        kib = result['alloc_peak_bytes_per_request'] / 1024
+        line += f"  alloc {kib:7.1f} KiB/req"
+    if result["errors"]:
+        line += f"  errors {result['errors']}"
+    print(line)
+    cache = result.get("cache")
+    if cache:
+        parts = [f"{' ':<28} hits {cache['hit_ratio']:6.1%}"]
+        for kind in ("hit", "miss"):
+            if cache[f"{kind}_ms"]:
+                timing = cache[f"{kind}_ms"]
+                parts.append(f"{kind} p50 {timing['p50']:7.2f} ms "
+                             f"p99 {timing['p99']:7.2f} ms")
+        print("  ".join(parts))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def change(old_value: float, new_value: float) -> str:
+    if not old_value:
+        return "   n/a"
+    return f"{(new_value - old_value) / old_value * 100:+6.1f}%"
+
+
+def compare(base_path: str, head_path: str) -> None:
+    base = json.loads(Path(base_path).read_text())
+    head = json.loads(Path(head_path).read_text())
+    print(f"{base['commit']} -> {head['commit']}")
+    for name, new in head["results"].items():
+        old = base["results"].get(name)
+        if old is None:
+            continue
+        was, now = old["latency_ms"], new["latency_ms"]
+        line = (f"{name:<28} req/s {change(old['req_per_s'], new['req_per_s'])}  "
+                f"p50 {change(was['p50'], now['p50'])}  "
+                f"p99 {change(was['p99'], now['p99'])}")
+        old_miss = old.get("cache", {}).get("miss_ms")
+        new_miss = new.get("cache", {}).get("miss_ms")
+        if old_miss and new_miss:
+            line += f"  miss p50 {change(old_miss['p50'], new_miss['p50'])}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Status API load benchmark")
+    parser.add_argument("--server", choices=["inprocess", "uvicorn"],
+                        default="inprocess")
+    parser.add_argument("--routes", nargs="+", choices=sorted(ROUTES),
+                        default=list(ROUTES))
+    parser.add_argument("--requests", type=int, default=2000,
+                        help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=1000,
+                        help="status checks to insert before the routes run")
+    parser.add_argument("--write-ratio", type=float, default=0.1,
+                        help="share of GET route requests sent as writes instead, "
+                             "which invalidate the response cache (0 to 1)")
+    parser.add_argument("--alloc-samples", type=int, default=200,
+                        help="sequential requests traced for allocations "
+                             "(in-process only)")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"),
+                        help="compare two result files instead of running")
+    args = parser.parse_args()
+    if not 0 <= args.write_ratio < 1:
+        parser.error("--write-ratio must be at least 0 and below 1")
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    runner = run_in_process if args.server == "inprocess" else run_over_uvicorn
+    results = asyncio.run(runner(args.routes, args))
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "server": args.server,
+            "storage_engine": os.environ.get('STORAGE_ENGINE', 'memory'),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "write_ratio": args.write_ratio,
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
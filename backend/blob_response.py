@@ -0,0 +1,87 @@
+"""
+HTTP responses for stored blobs: single byte ranges, streamed in chunks.
+
+Blobs are immutable and named by their digest, so the digest is a strong
+ETag and the response can be cached forever. ``BlobResponse`` sends a whole
+blob or one byte range of it, read in ``CHUNK_SIZE`` chunks off the event
+loop, so a large image never sits whole in memory.
+"""
+import re
+from typing import Optional, Tuple
+
+from starlette.responses import Response
+
+from blobs import BlobStore
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """The [start, stop) slice a ``Range`` header asks of a ``size``-byte blob.
+
+    None means the whole blob: no header, a malformed one or several ranges,
+    all of which RFC 9110 lets a server answer with a plain 200. Raises
+    ``RangeNotSatisfiable`` when the range lies past the end.
+    """
+    match = _RANGE.match(header.replace(" ", "")) if header else None
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        if int(last) == 0:
+            raise RangeNotSatisfiable()
+        return max(size - int(last), 0), size
+    start = int(first)
+    stop = size if last == "" else min(int(last) + 1, size)
+    if last != "" and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, stop
+
+
+class BlobResponse(Response):
+    """Bytes ``start:stop`` of a stored blob (200 for all of it, 206 for part)."""
+
+    def __init__(
+        self,
+        store: BlobStore,
+        digest: str,
+        size: int,
+        media_type: str,
+        byte_range: Optional[Tuple[int, int]] = None,
+        headers: Optional[dict] = None,
+        send_body: bool = True,
+    ):
+        self.store = store
+        self.digest = digest
+        self.start, self.stop = byte_range or (0, size)
+        self.send_body = send_body
+        self.media_type = media_type
+        self.status_code = 206 if byte_range is not None else 200
+        self.background = None
+        headers = {**(headers or {}), "accept-ranges": "bytes",
+                   "content-length": str(self.stop - self.start)}
+        if byte_range is not None:
+            headers["content-range"] = f"bytes {self.start}-{self.stop - 1}/{size}"
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code,
+                    "headers": self.raw_headers})
+        if not self.send_body or self.start == self.stop:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async for chunk in self.store.read(self.digest, self.start, self.stop):
+            await send(
+                {"type": "http.response.body", "body": chunk, "more_body": True}
+            )
+        await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,208 @@
+"""
+Content-addressed storage for uploaded images.
+
+Blobs are named by the SHA-256 of their bytes. An upload is streamed in
+fixed-size chunks to a staging location while it is hashed, and only then
+given its name; if a blob with that digest already exists the staged copy is
+dropped, so identical images are stored once. ``IMAGE_STORAGE`` selects the
+store: ``local`` (files under ``IMAGE_DIR``, default) or ``gridfs``.
+"""
+import abc
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+# Upload and GridFS chunk size: big enough to keep per-chunk overhead small,
+# small enough that an upload never holds more than one chunk in memory
+CHUNK_SIZE = 256 * 1024
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+async def fixed_chunks(
+    stream: AsyncIterable[bytes], size: int = CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Re-chunk ``stream`` into ``size``-byte chunks (the last may be shorter)."""
+    buffer = bytearray()
+    async for data in stream:
+        buffer += data
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
+
+class BlobStore(abc.ABC):
+    async def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def exists(self, digest: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def write(
+        self, stream: AsyncIterable[bytes], max_size: int
+    ) -> Tuple[str, int, bool]:
+        """Store ``stream``; returns (digest, size, created).
+
+        ``created`` is False when a blob with the same digest was already
+        stored. Raises ``BlobTooLarge`` past ``max_size`` bytes, leaving
+        nothing behind.
+        """
+
+    @abc.abstractmethod
+    async def delete(self, digest: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def size(self, digest: str) -> Optional[int]:
+        """The blob's size in bytes, or None if it is not stored."""
+
+    @abc.abstractmethod
+    def read(self, digest: str, start: int, stop: int) -> AsyncIterator[bytes]:
+        """Bytes ``start:stop`` of the blob, in chunks of up to ``CHUNK_SIZE``."""
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files, fanned out by digest prefix: ``ab/cd/abcd...``."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.staging = self.root / ".staging"
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    async def exists(self, digest):
+        return self.path(digest).exists()
+
+    async def write(self, stream, max_size):
+        await asyncio.to_thread(self.staging.mkdir, parents=True, exist_ok=True)
+        fd, staged = tempfile.mkstemp(dir=self.staging)
+        sha256, size = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, "wb") as staged_file:
+                async for chunk in fixed_chunks(stream):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise BlobTooLarge(max_size)
+                    sha256.update(chunk)
+                    # Disk writes run off the event loop
+                    await asyncio.to_thread(staged_file.write, chunk)
+            digest = sha256.hexdigest()
+            created = await asyncio.to_thread(self._commit, staged, digest)
+        finally:
+            if os.path.exists(staged):
+                os.unlink(staged)
+        return digest, size, created
+
+    def _commit(self, staged: str, digest: str) -> bool:
+        target = self.path(digest)
+        if target.exists():
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            # link() fails if a concurrent upload of the same bytes won the race
+            os.link(staged, target)
+        except FileExistsError:
+            return False
+        return True
+
+    async def delete(self, digest):
+        try:
+            await asyncio.to_thread(self.path(digest).unlink)
+        except FileNotFoundError:
+            pass
+
+    async def size(self, digest):
+        try:
+            return (await asyncio.to_thread(os.stat, self.path(digest))).st_size
+        except FileNotFoundError:
+            return None
+
+    async def read(self, digest, start, stop):
+        fd = await asyncio.to_thread(os.open, self.path(digest), os.O_RDONLY)
+        try:
+            while start < stop:
+                chunk = await asyncio.to_thread(
+                    os.pread, fd, min(CHUNK_SIZE, stop - start), start
+                )
+                if not chunk:
+                    break
+                start += len(chunk)
+                yield chunk
+        finally:
+            os.close(fd)
+
+
+class GridFSBlobStore(BlobStore):
+    """Blobs in a GridFS bucket, one file per digest (the file's name)."""
+
+    def __init__(self, db, bucket_name: str = "images"):
+        self.db = db
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name,
+                                               chunk_size_bytes=CHUNK_SIZE)
+        self.files = db[f"{bucket_name}.files"]
+
+    async def exists(self, digest):
+        return await self.files.count_documents({"filename": digest}, limit=1) > 0
+
+    async def write(self, stream, max_size):
+        file_id = ObjectId()
+        upload = self.bucket.open_upload_stream_with_id(file_id, "staging")
+        sha256, size = hashlib.sha256(), 0
+        try:
+            async for chunk in fixed_chunks(stream):
+                size += len(chunk)
+                if size > max_size:
+                    raise BlobTooLarge(max_size)
+                sha256.update(chunk)
+                await upload.write(chunk)
+            await upload.close()
+        except BaseException:
+            await upload.abort()
+            raise
+
+        digest = sha256.hexdigest()
+        # Two concurrent uploads of new bytes can both get here and keep a
+        # copy each; reads take either and delete removes both
+        if await self.exists(digest):
+            await self.bucket.delete(file_id)
+            return digest, size, False
+        await self.bucket.rename(file_id, digest)
+        return digest, size, True
+
+    async def delete(self, digest):
+        async for grid_file in self.files.find({"filename": digest}, {"_id": 1}):
+            await self.bucket.delete(grid_file["_id"])
+
+    async def size(self, digest):
+        grid_file = await self.files.find_one({"filename": digest}, {"length": 1})
+        return grid_file["length"] if grid_file is not None else None
+
+    async def read(self, digest, start, stop):
+        download = await self.bucket.open_download_stream_by_name(digest)
+        try:
+            download.seek(start)
+            while start < stop:
+                chunk = await download.readchunk()
+                if not chunk:
+                    break
+                chunk = chunk[:stop - start]
+                start += len(chunk)
+                yield chunk
+        finally:
+            download.close()
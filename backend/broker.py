@@ -0,0 +1,74 @@
+"""
+In-process publish/subscribe broker for live feeds.
+
+Each subscriber owns a bounded deque. Publishing never waits: when a
+subscriber has fallen ``maxlen`` messages behind, its oldest messages are
+dropped (and counted), so a slow consumer costs at most ``maxlen`` messages of
+memory and never slows down publishers or other subscribers.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Optional
+
+
+class Subscription:
+    def __init__(self, broker: "Broker", maxlen: int):
+        self._broker = broker
+        self._messages: deque = deque(maxlen=maxlen)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self.closed = False
+
+    def _deliver(self, message: Any) -> None:
+        if len(self._messages) == self._messages.maxlen:
+            self.dropped += 1
+        self._messages.append(message)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Any:
+        """Next message; None if ``timeout`` passes or the broker closes first."""
+        while not self._messages:
+            if self.closed:
+                return None
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._messages.popleft()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._ready.set()
+            self._broker._subscribers.discard(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class Broker:
+    def __init__(self, maxlen: int = 100):
+        self.maxlen = maxlen
+        self._subscribers: set = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self, self.maxlen)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def publish(self, message: Any) -> None:
+        # Encode once upstream; every subscriber gets the same object
+        for subscription in self._subscribers:
+            subscription._deliver(message)
+
+    def close(self) -> None:
+        for subscription in list(self._subscribers):
+            subscription.close()
@@ -0,0 +1,300 @@
+"""
+Level-of-detail tiles for zoomed-out board views.
+
+Below a zoom threshold the board is drawn as clusters, one per tile of a
+quadtree level (see spatial.py): how many entries the tile holds, its
+dominant color and a representative entry (the topmost one). Tiles are kept
+in ``entry_tiles`` and updated incrementally whenever an entry is created,
+moved, edited or deleted, so a view reads a bounded number of tile documents
+however many entries the board holds.
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+import spatial
+from spatial import BBox
+
+# Quadtree levels tiles are kept for: 4096, 2048, 1024 and 512 px tiles
+CLUSTER_LEVELS = (9, 10, 11, 12)
+
+TILE_INDEXES = [
+    IndexModel(
+        [("board_id", ASCENDING), ("level", ASCENDING), ("tile", ASCENDING)],
+        unique=True,
+        name="board_id_level_tile",
+    )
+]
+
+# Entry colors in the order dominant-color ties are broken
+COLORS = ("butter", "grass", "mint", "sky")
+REPRESENTATIVE_FIELDS = ("id", "title", "color", "image_path", "z_key")
+REPRESENTATIVE_PROJECTION = {
+    "_id": 0,
+    **{field: 1 for field in REPRESENTATIVE_FIELDS},
+}
+
+
+class TileChange(NamedTuple):
+    level: int
+    tile: int
+    removed: Optional[dict] = None  # entry that left the tile
+    added: Optional[dict] = None  # entry that joined it, or its new version
+
+
+def tile_size(level: int) -> int:
+    return spatial.WORLD_SIZE >> level
+
+
+def tile_of(doc: dict, level: int) -> int:
+    return spatial.cell_of(doc["x"], doc["y"]) >> 2 * (spatial.DEPTH - level)
+
+
+def tiles_in(viewport: BBox, level: int) -> Dict[int, BBox]:
+    """Tile code -> tile area for every tile on ``level`` the viewport touches."""
+    columns = range(
+        spatial.node_index(viewport.x0, level),
+        spatial.node_index(viewport.x1, level) + 1,
+    )
+    rows = range(
+        spatial.node_index(viewport.y0, level),
+        spatial.node_index(viewport.y1, level) + 1,
+    )
+    return {
+        spatial.morton(ix, iy): spatial.node_bbox(level, ix, iy)
+        for ix in columns
+        for iy in rows
+    }
+
+
+def tile_count(viewport: BBox, level: int) -> int:
+    columns = (
+        spatial.node_index(viewport.x1, level)
+        - spatial.node_index(viewport.x0, level)
+        + 1
+    )
+    rows = (
+        spatial.node_index(viewport.y1, level)
+        - spatial.node_index(viewport.y0, level)
+        + 1
+    )
+    return columns * rows
+
+
+def representative(doc: dict) -> dict:
+    return {field: doc.get(field) for field in REPRESENTATIVE_FIELDS}
+
+
+def dominant_color(colors: Dict[str, int]) -> str:
+    return max(
+        COLORS, key=lambda color: (colors.get(color, 0), -COLORS.index(color))
+    )
+
+
+def tile_changes(old: Optional[dict], new: Optional[dict]) -> List[TileChange]:
+    """What an entry write means for the tiles on every level.
+
+    A move within a tile that leaves color and representative fields alone
+    changes nothing, so most drags cost no tile writes at all.
+    """
+    changes = []
+    for level in CLUSTER_LEVELS:
+        old_tile = tile_of(old, level) if old else None
+        new_tile = tile_of(new, level) if new else None
+        if old_tile == new_tile:
+            if representative(old) != representative(new):
+                changes.append(TileChange(level, new_tile, old, new))
+            continue
+        if old is not None:
+            changes.append(TileChange(level, old_tile, removed=old))
+        if new is not None:
+            changes.append(TileChange(level, new_tile, added=new))
+    return changes
+
+
+def _key(board_id: str, change: TileChange) -> dict:
+    return {"board_id": board_id, "level": change.level, "tile": change.tile}
+
+
+def tile_updates(board_id: str, changes: Iterable[TileChange]) -> List[UpdateOne]:
+    """Counter and representative updates, to run as one ordered bulk write."""
+    updates = []
+    for change in changes:
+        key = _key(board_id, change)
+        counts = Counter()
+        if change.removed is not None:
+            counts["count"] -= 1
+            counts[f"colors.{change.removed['color']}"] -= 1
+        if change.added is not None:
+            counts["count"] += 1
+            counts[f"colors.{change.added['color']}"] += 1
+        counts = {field: delta for field, delta in counts.items() if delta}
+        if counts:
+            updates.append(
+                UpdateOne(key, {"$inc": counts}, upsert=change.added is not None)
+            )
+        if change.added is not None:
+            # Taken over by a higher entry, or refreshed if this entry is it
+            added = change.added
+            updates.append(UpdateOne(
+                {**key, "$or": [{"rep": None}, {"rep.id": added["id"]},
+                                {"rep.z_key": {"$lt": added["z_key"]}}]},
+                {"$set": {"rep": representative(added)}},
+            ))
+    return updates
+
+
+def needs_new_representative(change: TileChange) -> bool:
+    """Whether the tile may need a different topmost entry after ``change``."""
+    if change.removed is None:
+        return False
+    return change.added is None or change.added["z_key"] < change.removed["z_key"]
+
+
+async def record_tile_changes(
+    db, board_id: str, old: Optional[dict], new: Optional[dict]
+) -> None:
+    changes = tile_changes(old, new)
+    if not changes:
+        return
+    await db.entry_tiles.bulk_write(tile_updates(board_id, changes), ordered=True)
+
+    stale = [change for change in changes if needs_new_representative(change)]
+    if not stale:
+        return
+    await db.entry_tiles.delete_many({
+        "$or": [_key(board_id, change) for change in stale], "count": {"$lte": 0},
+    })
+    entry_id = old["id"]
+    for change in stale:
+        # Only tiles this entry still represents; the tile's entries are one
+        # cell range on the (board_id, cell) index
+        key = {**_key(board_id, change), "rep.id": entry_id}
+        if await db.entry_tiles.count_documents(key, limit=1) == 0:
+            continue
+        shift = 2 * (spatial.DEPTH - change.level)
+        top = await db.entries.find_one(
+            {
+                "board_id": board_id,
+                "cell": {
+                    "$gte": change.tile << shift,
+                    "$lt": (change.tile + 1) << shift,
+                },
+            },
+            REPRESENTATIVE_PROJECTION,
+            sort=[("z_key", -1)],
+        )
+        if top is not None:
+            await db.entry_tiles.update_one(
+                key, {"$set": {"rep": representative(top)}}
+            )
+
+
+async def rekey_representative(db, board_id: str, doc: dict, z_key: str) -> None:
+    """Keep the z_key of tiles ``doc`` represents in step with a rekey."""
+    await db.entry_tiles.update_many(
+        {
+            "$or": [
+                {"board_id": board_id, "level": level, "tile": tile_of(doc, level)}
+                for level in CLUSTER_LEVELS
+            ],
+            "rep.id": doc["id"],
+        },
+        {"$set": {"rep.z_key": z_key}},
+    )
+
+
+def tile_rebuild_pipeline(rebuilt_at) -> list:
+    """Recompute every tile from ``entries`` and merge it into ``entry_tiles``.
+
+    Needs MongoDB 5.2+ for $top and $sortArray.
+    """
+    return [
+        {
+            "$project": {
+                "board_id": 1,
+                "color": 1,
+                "rep": {field: f"${field}" for field in REPRESENTATIVE_FIELDS},
+                "tiles": [
+                    {
+                        "level": level,
+                        "tile": {
+                            "$toLong": {
+                                "$floor": {
+                                    "$divide": [
+                                        "$cell",
+                                        4 ** (spatial.DEPTH - level),
+                                    ]
+                                }
+                            }
+                        },
+                    }
+                    for level in CLUSTER_LEVELS
+                ],
+            }
+        },
+        {"$unwind": "$tiles"},
+        {
+            "$group": {
+                "_id": {
+                    "board_id": "$board_id",
+                    "level": "$tiles.level",
+                    "tile": "$tiles.tile",
+                    "color": "$color",
+                },
+                "count": {"$sum": 1},
+                "rep": {"$top": {"sortBy": {"rep.z_key": -1}, "output": "$rep"}},
+            }
+        },
+        {
+            "$group": {
+                "_id": {
+                    "board_id": "$_id.board_id",
+                    "level": "$_id.level",
+                    "tile": "$_id.tile",
+                },
+                "count": {"$sum": "$count"},
+                "colors": {"$push": {"k": "$_id.color", "v": "$count"}},
+                "reps": {"$push": "$rep"},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "board_id": "$_id.board_id",
+                "level": "$_id.level",
+                "tile": "$_id.tile",
+                "count": 1,
+                "colors": {"$arrayToObject": "$colors"},
+                "rep": {
+                    "$first": {
+                        "$sortArray": {"input": "$reps", "sortBy": {"z_key": -1}}
+                    }
+                },
+                "rebuilt_at": {"$literal": rebuilt_at},
+            }
+        },
+        {
+            "$merge": {
+                "into": "entry_tiles",
+                "on": ["board_id", "level", "tile"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+
+
+def choose_level(viewport: BBox, zoom: float, tile_screen_px: float,
+                 max_tiles: int) -> Optional[int]:
+    """Finest level whose tiles are at least ``tile_screen_px`` on screen
+    and that covers the viewport in at most ``max_tiles`` tiles."""
+    for level in sorted(CLUSTER_LEVELS, reverse=True):
+        if (
+            tile_size(level) * zoom >= tile_screen_px
+            and tile_count(viewport, level) <= max_tiles
+        ):
+            return level
+    coarsest = min(CLUSTER_LEVELS)
+    return coarsest if tile_count(viewport, coarsest) <= max_tiles else None
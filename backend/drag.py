@@ -0,0 +1,88 @@
+"""
+Server-side coalescing of drag updates.
+
+A drag sends a position many times a second over the board's WebSocket.
+``DragCoalescer.move`` only records the latest position per entry in memory.
+Every ``tick`` seconds the positions that changed since the last tick are
+persisted, one write per moved entry. So writes per second are bounded by
+entries moved per tick, not by how fast clients send events. A tick that
+takes longer than ``tick`` delays the next one, and positions keep coalescing
+meanwhile. Closing flushes whatever is still pending.
+
+Positions live in this worker's memory until their tick, so a crash loses
+at most the last ``tick`` of drag movement.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+Positions = Dict[str, Tuple[float, float]]
+
+
+class DragCoalescer:
+
+    def __init__(
+        self,
+        persist: Callable[[str, Positions], Awaitable[int]],
+        tick: float = 0.1,
+    ):
+        """``persist(board_id, positions)`` writes one board's positions and
+        returns how many entries it wrote."""
+        self._persist = persist
+        self.tick = tick
+        self._dirty: Dict[str, Positions] = defaultdict(dict)
+        self._task = None
+
+    @property
+    def pending(self) -> int:
+        return sum(len(positions) for positions in self._dirty.values())
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def move(self, board_id: str, entry_id: str, x: float, y: float) -> None:
+        self._dirty[board_id][entry_id] = (x, y)
+        metrics.drag_events.inc()
+
+    def _requeue(self, board_id: str, positions: Positions) -> None:
+        # Kept for the next tick, unless the entry has moved again since
+        pending = self._dirty[board_id]
+        for entry_id, position in positions.items():
+            pending.setdefault(entry_id, position)
+
+    async def flush(self) -> None:
+        for board_id in list(self._dirty):
+            positions = self._dirty.pop(board_id)
+            try:
+                written = await self._persist(board_id, positions)
+            except asyncio.CancelledError:
+                # Shutting down mid-tick: close() flushes these
+                self._requeue(board_id, positions)
+                raise
+            except Exception:
+                logger.exception("Persisting %d drag positions on board %s failed",
+                                 len(positions), board_id)
+                self._requeue(board_id, positions)
+            else:
+                metrics.drag_writes.inc(amount=written)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            await self.flush()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
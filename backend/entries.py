@@ -0,0 +1,590 @@
+"""
+Storage engines for board entries (the PRD's polaroids).
+
+Viewport queries are answered from a spatial index: each entry stores the
+quadtree leaf ``cell`` of its position (see spatial.py), and a bounding box
+is covered by a few cell ranges scanned on ``(board_id, cell)``. Candidates
+from the covering are then checked against the box exactly, so the index only
+has to be a superset.
+
+Stacking order is the fractional ``z_key`` (see zorder.py), indexed per
+board so the top, the bottom and an entry's neighbours are single index
+lookups.
+
+Titles and commentary are searchable by term prefix through an inverted
+index kept up to date by every write, see search.py.
+
+Every entry carries a ``version``, 1 when created and bumped by each update.
+Updates and deletes can be made conditional on it, failing with
+``VersionConflict`` when the entry has moved on.
+
+``STORAGE_ENGINE`` selects the engine the same way it does for status checks.
+"""
+import abc
+import bisect
+import itertools
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+
+import clusters
+import search
+import spatial
+from spatial import BBox
+
+# An entry's footprint relative to its (x, y) top-left corner: a ~120x140 px
+# polaroid, padded for the up to ±8° rotation it is drawn with
+ENTRY_FOOTPRINT = BBox(-16, -16, 136, 156)
+
+ENTRY_FIELDS = (
+    "id",
+    "board_id",
+    "user_id",
+    "title",
+    "commentary",
+    "color",
+    "image_path",
+    "x",
+    "y",
+    "rotation",
+    "z_key",
+    "version",
+    "created_at",
+)
+ENTRY_PROJECTION = {"_id": 0, **{field: 1 for field in ENTRY_FIELDS}}
+
+ENTRY_INDEXES = [
+    IndexModel(
+        [("board_id", ASCENDING), ("id", ASCENDING)],
+        unique=True,
+        name="board_id_id",
+    ),
+    # The spatial index: viewport queries scan cell ranges within one board
+    IndexModel(
+        [("board_id", ASCENDING), ("cell", ASCENDING)], name="board_id_cell"
+    ),
+    # Stacking order: top, bottom and neighbours of a key
+    IndexModel(
+        [("board_id", ASCENDING), ("z_key", ASCENDING), ("id", ASCENDING)],
+        name="board_id_z_key",
+    ),
+    # Search, and the owner lookups of account wipes. The scan walks the
+    # user's entries newest first, so no sort is needed and the limit ends
+    # it; within each entry it seeks the first prefix's range of terms, and
+    # only entries with a term in that range are fetched
+    IndexModel(
+        [
+            ("user_id", ASCENDING),
+            ("created_at", ASCENDING),
+            ("id", ASCENDING),
+            ("search_terms", ASCENDING),
+        ],
+        name="user_id_created_at_search_terms",
+    ),
+]
+
+# Replaced by user_id_created_at_search_terms; setup() drops them
+RETIRED_ENTRY_INDEXES = ("user_id", "user_id_search_terms_created_at")
+
+# A change to either of these changes what an entry is found by
+SEARCHED_FIELDS = ("title", "commentary")
+
+
+class VersionConflict(Exception):
+    """The entry is not at the expected version; ``current`` is what it is now."""
+
+    def __init__(self, current: dict):
+        super().__init__(
+            f"entry {current['id']!r} is at version {current['version']}"
+        )
+        self.current = current
+
+
+def footprint(doc: dict) -> BBox:
+    x, y = doc["x"], doc["y"]
+    return BBox(x + ENTRY_FOOTPRINT.x0, y + ENTRY_FOOTPRINT.y0,
+                x + ENTRY_FOOTPRINT.x1, y + ENTRY_FOOTPRINT.y1)
+
+
+def anchor_bbox(viewport: BBox) -> BBox:
+    """Where an entry's (x, y) must lie for its footprint to meet ``viewport``."""
+    return BBox(viewport.x0 - ENTRY_FOOTPRINT.x1, viewport.y0 - ENTRY_FOOTPRINT.y1,
+                viewport.x1 - ENTRY_FOOTPRINT.x0, viewport.y1 - ENTRY_FOOTPRINT.y0)
+
+
+class EntryRepository(abc.ABC):
+    async def setup(self) -> None:
+        """Create the entry indexes (spatial cells, z-order, owner and search
+        terms) and the cluster tile indexes."""
+
+    async def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def insert(self, doc: dict) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def get(self, board_id: str, entry_id: str) -> Optional[dict]:
+        ...
+
+    @abc.abstractmethod
+    async def update(self, board_id: str, entry_id: str, changes: dict,
+                     expected_version: Optional[int] = None) -> Optional[dict]:
+        """Apply ``changes``, bump the version and return the updated entry, or
+        None if it does not exist.
+
+        A change of position must set both ``x`` and ``y``. Raises
+        ``VersionConflict`` if ``expected_version`` is given and not current.
+        """
+
+    @abc.abstractmethod
+    async def delete(self, board_id: str, entry_id: str,
+                     expected_version: Optional[int] = None) -> bool:
+        """Delete the entry; False if it does not exist. Raises ``VersionConflict``
+        like ``update``."""
+
+    @abc.abstractmethod
+    async def owned_by(self, user_id: str, limit: int) -> List[Tuple[str, str]]:
+        """(board_id, id) of up to ``limit`` of the user's entries, any board."""
+
+    @abc.abstractmethod
+    async def in_bbox(self, board_id: str, viewport: BBox) -> List[dict]:
+        """Entries on the board whose footprint intersects ``viewport``."""
+
+    @abc.abstractmethod
+    async def edge_z_key(self, board_id: str, top: bool) -> Optional[str]:
+        """The topmost (or bottommost) z_key on the board; None if it is empty."""
+
+    @abc.abstractmethod
+    async def next_z_key(
+        self, board_id: str, z_key: str, above: bool
+    ) -> Optional[str]:
+        """The nearest z_key strictly above (or below) ``z_key``; None if none."""
+
+    @abc.abstractmethod
+    async def z_order(self, board_id: str) -> List[Tuple[str, str]]:
+        """(id, z_key) of every entry on the board, bottom to top."""
+
+    @abc.abstractmethod
+    async def stacked(self, board_id: str) -> List[dict]:
+        """Every entry on the board, bottom to top, as copies the caller owns."""
+
+    @abc.abstractmethod
+    async def rekey(
+        self, board_id: str, moves: List[Tuple[str, str, str]]
+    ) -> List[str]:
+        """Apply (id, old z_key, new z_key) moves in order, each only if the entry
+        still has its old key; returns the ids rekeyed.
+
+        Rekeying keeps the stack order, so versions are left alone.
+        """
+
+    @abc.abstractmethod
+    async def tiles(
+        self, board_id: str, level: int, codes: Iterable[int]
+    ) -> List[dict]:
+        """Non-empty cluster tiles among ``codes`` on ``level``.
+
+        Each has its tile, count, colors and rep.
+        """
+
+    @abc.abstractmethod
+    async def search(
+        self, user_id: str, prefixes: List[str], limit: int
+    ) -> List[dict]:
+        """Up to ``limit`` of the user's entries, on any board, newest first, that
+        have a title or commentary term starting with each of ``prefixes``.
+
+        ``prefixes`` are folded like stored terms, see ``search.terms``.
+        """
+
+
+class MongoEntryRepository(EntryRepository):
+    def __init__(self, db):
+        self.db = db
+
+    async def setup(self) -> None:
+        existing = await self.db.entries.index_information()
+        for name in RETIRED_ENTRY_INDEXES:
+            if name in existing:
+                await self.db.entries.drop_index(name)
+        await self.db.entries.create_indexes(ENTRY_INDEXES)
+        await self.db.entry_tiles.create_indexes(clusters.TILE_INDEXES)
+
+    async def insert(self, doc: dict) -> None:
+        # A copy, so neither _id, cell nor search_terms leak into the caller's doc
+        await self.db.entries.insert_one(
+            {
+                **doc,
+                "cell": spatial.cell_of(doc["x"], doc["y"]),
+                "search_terms": search.entry_terms(doc),
+            }
+        )
+        await clusters.record_tile_changes(self.db, doc["board_id"], None, doc)
+
+    async def get(self, board_id, entry_id):
+        return await self.db.entries.find_one(
+            {"board_id": board_id, "id": entry_id}, ENTRY_PROJECTION
+        )
+
+    def _filter(
+        self, board_id: str, entry_id: str, expected_version: Optional[int]
+    ) -> dict:
+        query = {"board_id": board_id, "id": entry_id}
+        if expected_version is not None:
+            query["version"] = expected_version
+        return query
+
+    async def _missing_or_conflict(self, board_id: str, entry_id: str,
+                                   expected_version: Optional[int]) -> None:
+        """After a conditional write matched nothing: raise if the entry exists."""
+        if expected_version is None:
+            return
+        current = await self.get(board_id, entry_id)
+        if current is not None:
+            raise VersionConflict(current)
+
+    async def update(self, board_id, entry_id, changes, expected_version=None):
+        stored = dict(changes)
+        if "x" in changes:
+            stored["cell"] = spatial.cell_of(changes["x"], changes["y"])
+        old = await self.db.entries.find_one_and_update(
+            self._filter(board_id, entry_id, expected_version),
+            {"$set": stored, "$inc": {"version": 1}},
+            projection=ENTRY_PROJECTION, return_document=ReturnDocument.BEFORE,
+        )
+        if old is None:
+            await self._missing_or_conflict(board_id, entry_id, expected_version)
+            return None
+        new = {**old, **changes, "version": old.get("version", 0) + 1}
+        if any(field in changes for field in SEARCHED_FIELDS):
+            # Only the whole entry tells its terms. Guarded on the text they
+            # come from: a concurrent text change sets its own terms after.
+            await self.db.entries.update_one(
+                {"board_id": board_id, "id": entry_id,
+                 **{field: new.get(field) for field in SEARCHED_FIELDS}},
+                {"$set": {"search_terms": search.entry_terms(new)}},
+            )
+        await clusters.record_tile_changes(self.db, board_id, old, new)
+        return new
+
+    async def delete(self, board_id, entry_id, expected_version=None):
+        old = await self.db.entries.find_one_and_delete(
+            self._filter(board_id, entry_id, expected_version),
+            projection=ENTRY_PROJECTION,
+        )
+        if old is None:
+            await self._missing_or_conflict(board_id, entry_id, expected_version)
+            return False
+        await clusters.record_tile_changes(self.db, board_id, old, None)
+        return True
+
+    async def owned_by(self, user_id, limit):
+        docs = (
+            await self.db.entries.find(
+                {"user_id": user_id}, {"_id": 0, "board_id": 1, "id": 1}
+            )
+            .limit(limit)
+            .to_list(limit)
+        )
+        return [(doc["board_id"], doc["id"]) for doc in docs]
+
+    def find_in_bbox(self, board_id: str, viewport: BBox):
+        """The Motor cursor behind viewport queries, for query-plan tests."""
+        anchors = anchor_bbox(viewport)
+        query = {
+            # One index range scan per covering range
+            "$or": [{"board_id": board_id, "cell": {"$gte": start, "$lt": stop}}
+                    for start, stop in spatial.covering(anchors)],
+            "x": {"$gte": anchors.x0, "$lte": anchors.x1},
+            "y": {"$gte": anchors.y0, "$lte": anchors.y1},
+        }
+        return self.db.entries.find(query, ENTRY_PROJECTION)
+
+    async def in_bbox(self, board_id, viewport):
+        return await self.find_in_bbox(board_id, viewport).to_list(None)
+
+    async def edge_z_key(self, board_id, top):
+        direction = DESCENDING if top else ASCENDING
+        doc = await self.db.entries.find_one(
+            {"board_id": board_id},
+            {"_id": 0, "z_key": 1},
+            sort=[("z_key", direction), ("id", direction)],
+        )
+        return doc["z_key"] if doc is not None else None
+
+    async def next_z_key(self, board_id, z_key, above):
+        doc = await self.db.entries.find_one(
+            {"board_id": board_id, "z_key": {"$gt" if above else "$lt": z_key}},
+            {"_id": 0, "z_key": 1},
+            sort=[("z_key", ASCENDING if above else DESCENDING)],
+        )
+        return doc["z_key"] if doc is not None else None
+
+    async def z_order(self, board_id):
+        cursor = self.db.entries.find(
+            {"board_id": board_id},
+            {"_id": 0, "id": 1, "z_key": 1},
+            sort=[("z_key", ASCENDING), ("id", ASCENDING)],
+        )
+        return [(doc["id"], doc["z_key"]) async for doc in cursor]
+
+    async def stacked(self, board_id):
+        return await self.db.entries.find(
+            {"board_id": board_id},
+            ENTRY_PROJECTION,
+            sort=[("z_key", ASCENDING), ("id", ASCENDING)],
+        ).to_list(None)
+
+    async def rekey(self, board_id, moves):
+        rekeyed = []
+        # Ordered, and one document at a time: every prefix of the moves
+        # leaves a valid stack
+        for entry_id, old, new in moves:
+            doc = await self.db.entries.find_one_and_update(
+                {"board_id": board_id, "id": entry_id, "z_key": old},
+                {"$set": {"z_key": new}},
+                projection={"_id": 0, "id": 1, "x": 1, "y": 1},
+            )
+            if doc is not None:
+                rekeyed.append(entry_id)
+                await clusters.rekey_representative(self.db, board_id, doc, new)
+        return rekeyed
+
+    async def tiles(self, board_id, level, codes):
+        return await self.db.entry_tiles.find(
+            {
+                "board_id": board_id,
+                "level": level,
+                "tile": {"$in": list(codes)},
+                "count": {"$gt": 0},
+            },
+            {"_id": 0, "tile": 1, "count": 1, "colors": 1, "rep": 1},
+        ).to_list(None)
+
+    def find_matching(self, user_id: str, prefixes: List[str]):
+        """The Motor cursor behind searches; exposed for query-plan tests."""
+        query = {
+            "user_id": user_id,
+            "$and": [
+                {"search_terms": {"$regex": search.prefix_pattern(prefix)}}
+                for prefix in prefixes
+            ],
+        }
+        return self.db.entries.find(query, ENTRY_PROJECTION).sort(
+            [("created_at", DESCENDING), ("id", DESCENDING)]
+        )
+
+    async def search(self, user_id, prefixes, limit):
+        if not prefixes:
+            return []
+        return (
+            await self.find_matching(user_id, prefixes).limit(limit).to_list(None)
+        )
+
+
+class InMemoryEntryRepository(EntryRepository):
+    """Process-local engine: entries by (board, id), plus each board's sorted
+    (cell, id) keys.
+
+    Stacking order is each board's sorted (z_key, id) keys, cluster tiles
+    are plain dicts keyed by (board, level, tile) and search terms are a
+    ``TermIndex`` per user.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], dict] = {}
+        self._cells: Dict[str, List[Tuple[int, str]]] = defaultdict(list)
+        self._stacks: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        self._tiles: Dict[Tuple[str, int, int], dict] = {}
+        self._terms: Dict[str, search.TermIndex] = defaultdict(search.TermIndex)
+
+    def _record_tile_changes(
+        self, board_id: str, old: Optional[dict], new: Optional[dict]
+    ) -> None:
+        for change in clusters.tile_changes(old, new):
+            key = (board_id, change.level, change.tile)
+            tile = self._tiles.setdefault(key, {"tile": change.tile, "count": 0,
+                                                "colors": Counter(), "rep": None})
+            if change.removed is not None:
+                tile["count"] -= 1
+                tile["colors"][change.removed["color"]] -= 1
+            if change.added is not None:
+                tile["count"] += 1
+                tile["colors"][change.added["color"]] += 1
+                rep = tile["rep"]
+                if (
+                    rep is None
+                    or rep["id"] == change.added["id"]
+                    or rep["z_key"] < change.added["z_key"]
+                ):
+                    tile["rep"] = clusters.representative(change.added)
+            if tile["count"] <= 0:
+                del self._tiles[key]
+            elif (
+                clusters.needs_new_representative(change)
+                and tile["rep"]["id"] == change.removed["id"]
+            ):
+                shift = 2 * (spatial.DEPTH - change.level)
+                cells = self._cells[board_id]
+                low = bisect.bisect_left(cells, (change.tile << shift, ""))
+                high = bisect.bisect_left(cells, ((change.tile + 1) << shift, ""))
+                top = max(
+                    (
+                        self._entries[(board_id, entry_id)]
+                        for _, entry_id in cells[low:high]
+                    ),
+                    key=lambda doc: doc["z_key"],
+                )
+                tile["rep"] = clusters.representative(top)
+
+    def _index(self, doc: dict) -> None:
+        bisect.insort(
+            self._cells[doc["board_id"]],
+            (spatial.cell_of(doc["x"], doc["y"]), doc["id"]),
+        )
+        bisect.insort(self._stacks[doc["board_id"]], (doc["z_key"], doc["id"]))
+
+    def _unindex(self, doc: dict) -> None:
+        cells = self._cells[doc["board_id"]]
+        del cells[
+            bisect.bisect_left(
+                cells, (spatial.cell_of(doc["x"], doc["y"]), doc["id"])
+            )
+        ]
+        stack = self._stacks[doc["board_id"]]
+        del stack[bisect.bisect_left(stack, (doc["z_key"], doc["id"]))]
+
+    async def insert(self, doc):
+        key = (doc["board_id"], doc["id"])
+        if key in self._entries:
+            raise KeyError(f"duplicate key: id {doc['id']!r}")
+        self._entries[key] = dict(doc)
+        self._index(doc)
+        self._terms[doc["user_id"]].add(
+            key, search.entry_terms(doc), (doc["created_at"], doc["id"])
+        )
+        self._record_tile_changes(doc["board_id"], None, doc)
+
+    async def get(self, board_id, entry_id):
+        return self._entries.get((board_id, entry_id))
+
+    def _current(
+        self, board_id: str, entry_id: str, expected_version: Optional[int]
+    ) -> Optional[dict]:
+        doc = self._entries.get((board_id, entry_id))
+        if (
+            doc is not None
+            and expected_version is not None
+            and doc["version"] != expected_version
+        ):
+            raise VersionConflict(dict(doc))
+        return doc
+
+    async def update(self, board_id, entry_id, changes, expected_version=None):
+        doc = self._current(board_id, entry_id, expected_version)
+        if doc is None:
+            return None
+        old = dict(doc)
+        moved = "x" in changes or "z_key" in changes
+        if moved:
+            self._unindex(doc)
+        doc.update(changes, version=doc["version"] + 1)
+        if moved:
+            self._index(doc)
+        if any(field in changes for field in SEARCHED_FIELDS):
+            self._terms[doc["user_id"]].add(
+                (board_id, entry_id),
+                search.entry_terms(doc),
+                (doc["created_at"], doc["id"]),
+            )
+        self._record_tile_changes(board_id, old, doc)
+        return doc
+
+    async def delete(self, board_id, entry_id, expected_version=None):
+        if self._current(board_id, entry_id, expected_version) is None:
+            return False
+        doc = self._entries.pop((board_id, entry_id))
+        self._unindex(doc)
+        self._terms[doc["user_id"]].remove((board_id, entry_id))
+        self._record_tile_changes(board_id, doc, None)
+        return True
+
+    async def owned_by(self, user_id, limit):
+        owned = (
+            key for key, doc in self._entries.items() if doc["user_id"] == user_id
+        )
+        return list(itertools.islice(owned, limit))
+
+    async def in_bbox(self, board_id, viewport):
+        cells = self._cells.get(board_id, [])
+        found = []
+        for start, stop in spatial.covering(anchor_bbox(viewport)):
+            low = bisect.bisect_left(cells, (start, ""))
+            high = bisect.bisect_left(cells, (stop, ""))
+            for _, entry_id in cells[low:high]:
+                doc = self._entries[(board_id, entry_id)]
+                if footprint(doc).intersects(viewport):
+                    found.append(doc)
+        return found
+
+    async def edge_z_key(self, board_id, top):
+        stack = self._stacks.get(board_id)
+        return stack[-1 if top else 0][0] if stack else None
+
+    async def next_z_key(self, board_id, z_key, above):
+        stack = self._stacks.get(board_id, [])
+        if above:
+            position = bisect.bisect_right(stack, (z_key, "\U0010ffff"))
+            return stack[position][0] if position < len(stack) else None
+        position = bisect.bisect_left(stack, (z_key, ""))
+        return stack[position - 1][0] if position else None
+
+    async def z_order(self, board_id):
+        return [
+            (entry_id, z_key) for z_key, entry_id in self._stacks.get(board_id, [])
+        ]
+
+    async def stacked(self, board_id):
+        # Copies: exports lay these out in a thread while writes carry on
+        return [dict(self._entries[(board_id, entry_id)])
+                for _, entry_id in self._stacks.get(board_id, [])]
+
+    async def rekey(self, board_id, moves):
+        rekeyed = []
+        for entry_id, old, new in moves:
+            doc = self._entries.get((board_id, entry_id))
+            if doc is None or doc["z_key"] != old:
+                continue
+            self._unindex(doc)
+            doc["z_key"] = new
+            self._index(doc)
+            for level in clusters.CLUSTER_LEVELS:
+                tile = self._tiles.get(
+                    (board_id, level, clusters.tile_of(doc, level))
+                )
+                if tile is not None and tile["rep"]["id"] == entry_id:
+                    tile["rep"] = clusters.representative(doc)
+            rekeyed.append(entry_id)
+        return rekeyed
+
+    async def tiles(self, board_id, level, codes):
+        found = []
+        for code in codes:
+            tile = self._tiles.get((board_id, level, code))
+            if tile is not None:
+                colors = {
+                    color: count
+                    for color, count in tile["colors"].items()
+                    if count
+                }
+                found.append({**tile, "colors": colors})
+        return found
+
+    async def search(self, user_id, prefixes, limit):
+        index = self._terms.get(user_id)
+        if index is None:
+            return []
+        return [self._entries[key] for key in index.search(prefixes, limit)]
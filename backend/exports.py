@@ -0,0 +1,332 @@
+"""
+Board export jobs: whole boards rendered to PNG or PDF for print.
+
+Submitting a job returns at once. The render runs in the background. Its
+bands are filled and compressed in a process pool, so the event loop only
+ever writes finished bands to disk. ``EXPORT_WORKERS`` bounds how many bands
+render at a time across all jobs, and so how many cores exports can take
+from request handling. At most ``max_jobs`` jobs are queued or running per
+server process; beyond that ``ExportQueueFull`` is raised.
+
+Job records (status, progress, size) live in the ``export_jobs`` collection
+or in memory, following ``STORAGE_ENGINE``. Files are written to
+``EXPORT_DIR`` as ``<id>.<format>.part`` and renamed when complete. A job
+runs in the process that accepted it, and a process that dies mid-render
+leaves its jobs as "running". Jobs cut short by a shutdown are marked failed.
+
+Every job expires ``ttl`` seconds after it was submitted. Each process sweeps
+for expired jobs every few minutes and removes their records and files,
+whichever process wrote them.
+"""
+import abc
+import asyncio
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+from pymongo import ASCENDING, IndexModel
+
+import render
+
+logger = logging.getLogger(__name__)
+
+EXPORT_JOB_INDEXES = [
+    IndexModel(
+        [("board_id", ASCENDING), ("created_at", ASCENDING)],
+        name="board_id_created_at",
+    ),
+    # The sweep that removes expired exports
+    IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+]
+
+# How often each process looks for expired exports, at most
+SWEEP_SECONDS = 300
+
+
+class ExportQueueFull(Exception):
+    """This process already has as many export jobs as it takes."""
+
+
+class ExportJobRepository(abc.ABC):
+    async def setup(self) -> None:
+        """Index jobs by board and creation time, and by expiry for the sweep."""
+
+    async def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def create(self, job: dict) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def get(self, job_id: str) -> Optional[dict]:
+        ...
+
+    @abc.abstractmethod
+    async def update(self, job_id: str, changes: dict) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def delete(self, job_id: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def expired(self, now: datetime) -> List[dict]:
+        """Jobs whose ``expires_at`` is before ``now``."""
+
+
+class MongoExportJobRepository(ExportJobRepository):
+    def __init__(self, db):
+        self.db = db
+
+    async def setup(self):
+        await self.db.export_jobs.create_indexes(EXPORT_JOB_INDEXES)
+
+    async def create(self, job):
+        await self.db.export_jobs.insert_one({**job, "_id": job["id"]})
+
+    async def get(self, job_id):
+        return await self.db.export_jobs.find_one({"_id": job_id}, {"_id": 0})
+
+    async def update(self, job_id, changes):
+        await self.db.export_jobs.update_one({"_id": job_id}, {"$set": changes})
+
+    async def delete(self, job_id):
+        await self.db.export_jobs.delete_one({"_id": job_id})
+
+    async def expired(self, now):
+        return await self.db.export_jobs.find(
+            {"expires_at": {"$lt": now}}, {"_id": 0, "id": 1, "format": 1},
+        ).to_list(None)
+
+
+class InMemoryExportJobRepository(ExportJobRepository):
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+
+    async def create(self, job):
+        self._jobs[job["id"]] = dict(job)
+
+    async def get(self, job_id):
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def update(self, job_id, changes):
+        self._jobs[job_id].update(changes)
+
+    async def delete(self, job_id):
+        self._jobs.pop(job_id, None)
+
+    async def expired(self, now):
+        return [dict(job) for job in self._jobs.values()
+                if job["expires_at"] < now]
+
+
+def export_path(directory: Path, job: dict) -> Path:
+    return directory / f"{job['id']}.{job['format']}"
+
+
+def part_path(directory: Path, job: dict) -> Path:
+    """Where ``job`` is written until it is complete."""
+    return directory / f"{job['id']}.{job['format']}.part"
+
+
+class ExportRunner:
+    def __init__(self, jobs: ExportJobRepository, directory: Path, workers: int,
+                 max_jobs: int, ttl: float = 24 * 3600):
+        self.jobs = jobs
+        self.directory = directory
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        # Bands rendering right now, across all jobs
+        self._slots = asyncio.Semaphore(workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @property
+    def active(self) -> int:
+        return len(self._running)
+
+    def start(self) -> None:
+        # Spawned, not forked: workers import render.py only, and inherit
+        # neither the event loop nor the Mongo client's threads. Workers
+        # start on the first job.
+        self._executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    def expires_at(self, created_at: datetime) -> datetime:
+        """When a job submitted at ``created_at`` and its file are removed."""
+        return created_at + timedelta(seconds=self.ttl)
+
+    async def remove_expired(self) -> int:
+        """Remove the records and files of expired jobs; returns how many."""
+        removed = 0
+        for job in await self.jobs.expired(datetime.now(timezone.utc)):
+            # Still rendering here; a later sweep takes it
+            if job["id"] in self._running:
+                continue
+            # The record first, so no download starts on a file about to go
+            await self.jobs.delete(job["id"])
+            for path in (export_path(self.directory, job),
+                         part_path(self.directory, job)):
+                await asyncio.to_thread(path.unlink, missing_ok=True)
+            removed += 1
+        return removed
+
+    async def _sweep(self) -> None:
+        while True:
+            try:
+                removed = await self.remove_expired()
+                if removed:
+                    logger.info("Removed %d expired exports", removed)
+            except Exception:
+                logger.exception("Removing expired exports failed")
+            await asyncio.sleep(min(self.ttl, SWEEP_SECONDS))
+
+    def submit(self, job: dict, entries: List[dict]) -> None:
+        """Render ``entries`` (bottom to top) for ``job``, stored as queued."""
+        if len(self._running) >= self.max_jobs:
+            raise ExportQueueFull()
+        self._running[job["id"]] = asyncio.get_running_loop().create_task(
+            self._run(job, entries)
+        )
+
+    async def wait(self) -> None:
+        """Wait for every job in progress."""
+        while self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    async def _run(self, job: dict, entries: List[dict]) -> None:
+        part = part_path(self.directory, job)
+        try:
+            size = await self._render(job, entries, part)
+            await asyncio.to_thread(
+                os.replace, part, export_path(self.directory, job)
+            )
+            await self.jobs.update(
+                job["id"],
+                {
+                    "status": "done",
+                    "progress": 1.0,
+                    "size": size,
+                    "finished_at": datetime.now(timezone.utc),
+                },
+            )
+        except asyncio.CancelledError:
+            # Shutting down
+            await asyncio.to_thread(part.unlink, missing_ok=True)
+            await self.jobs.update(
+                job["id"],
+                {
+                    "status": "failed",
+                    "error": "Server shut down",
+                    "finished_at": datetime.now(timezone.utc),
+                },
+            )
+            raise
+        except Exception as exc:
+            logger.exception(
+                "Export %s of board %s failed", job["id"], job["board_id"]
+            )
+            await asyncio.to_thread(part.unlink, missing_ok=True)
+            await self.jobs.update(
+                job["id"],
+                {
+                    "status": "failed",
+                    "error": str(exc) or type(exc).__name__,
+                    "finished_at": datetime.now(timezone.utc),
+                },
+            )
+        finally:
+            del self._running[job["id"]]
+
+    async def _render_band(self, *args) -> tuple:
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, render.render_band, *args
+            )
+
+    async def _render(self, job: dict, entries: List[dict], part: Path) -> int:
+        scale = job["scale"]
+        # Planning walks every entry, so it runs off the event loop too
+        width, height, cards = await asyncio.to_thread(
+            render.layout, entries, scale
+        )
+        rows = render.band_rows(width)
+        bands = await asyncio.to_thread(render.split_bands, cards, height, rows)
+        await self.jobs.update(
+            job["id"], {"status": "running", "width": width, "height": height}
+        )
+
+        encoder = render.ENCODERS[job["format"]](width, height, scale)
+        adler, written = 1, 0
+        in_flight: Deque[asyncio.Future] = deque()
+        await asyncio.to_thread(self.directory.mkdir, parents=True, exist_ok=True)
+        output = await asyncio.to_thread(open, part, "wb")
+        try:
+            async def write(data: bytes) -> None:
+                nonlocal written
+                await asyncio.to_thread(output.write, data)
+                written += len(data)
+
+            async def write_next() -> None:
+                nonlocal adler
+                data, band_adler, length = await in_flight.popleft()
+                adler = render.adler32_combine(adler, band_adler, length)
+                await write(encoder.segment(data))
+                done = len(bands) - len(remaining) - len(in_flight)
+                await self.jobs.update(
+                    job["id"], {"progress": round(done / len(bands), 3)}
+                )
+
+            await write(encoder.head())
+            remaining = deque(enumerate(bands))
+            while remaining or in_flight:
+                # A few bands ahead of the writer, so workers stay busy and
+                # finished bands wait in memory for their turn only briefly
+                while remaining and len(in_flight) < self.workers + 1:
+                    index, band = remaining.popleft()
+                    top = index * rows
+                    in_flight.append(
+                        asyncio.ensure_future(
+                            self._render_band(
+                                band,
+                                width,
+                                top,
+                                min(rows, height - top),
+                                scale,
+                                index == len(bands) - 1,
+                            )
+                        )
+                    )
+                await write_next()
+            await write(encoder.tail(adler))
+        finally:
+            for future in in_flight:
+                future.cancel()
+            await asyncio.to_thread(output.close)
+        return written
+
+    async def close(self) -> None:
+        tasks = list(self._running.values())
+        if self._sweeper is not None:
+            tasks.append(self._sweeper)
+            self._sweeper = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._executor is not None:
+            await asyncio.to_thread(
+                self._executor.shutdown, wait=True, cancel_futures=True
+            )
+            self._executor = None
@@ -0,0 +1,192 @@
+"""
+Image metadata: which content-addressed blobs exist and who uploaded them.
+
+One record per digest, whoever uploads it, with the set of users that own a
+copy. A blob can be deleted once its last owner lets go of it, which is what
+an account wipe does for every image the account uploaded.
+
+Letting go is atomic: the owner is pulled and, if it was the last one, the
+record is marked ``deleting`` by that user in the same write. A marked record
+is invisible to lookups and cannot gain owners, so an upload racing the wipe
+either lands before the mark (and keeps the image) or is turned away. The
+bytes are deleted only after the mark, and the record only after the bytes.
+"""
+import abc
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+IMAGE_INDEXES = [
+    IndexModel([("owners", ASCENDING)], name="owners"),
+    # Only records being deleted have the field
+    IndexModel([("deleting", ASCENDING)], name="deleting", sparse=True),
+]
+
+
+class ImageBeingDeleted(Exception):
+    """The image's last owner let go of it and its bytes are being deleted."""
+
+    def __init__(self, digest: str):
+        super().__init__(f"image {digest} is being deleted")
+        self.digest = digest
+
+
+class ImageRepository(abc.ABC):
+    async def setup(self) -> None:
+        """Index image records by owner, for owner lookups and account wipes,
+        and the records being deleted."""
+
+    async def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def get(self, digest: str) -> Optional[dict]:
+        """The image's record: digest, size, content_type, owners, created_at.
+
+        None while the image is being deleted.
+        """
+
+    @abc.abstractmethod
+    async def add_owner(
+        self, digest: str, user_id: str, size: int, content_type: str
+    ) -> dict:
+        """Record that ``user_id`` holds the image, creating the record if new.
+
+        Raises ``ImageBeingDeleted`` if the record is marked for deletion.
+        """
+
+    @abc.abstractmethod
+    async def release(self, digest: str, user_id: str) -> bool:
+        """Drop ``user_id`` from the owners, marking the record as being deleted
+        by ``user_id`` if that left none. True if ``user_id`` now holds the mark,
+        and so must delete the bytes and then the record.
+        """
+
+    @abc.abstractmethod
+    async def delete(self, digest: str, user_id: str) -> bool:
+        """Delete the record if ``user_id`` holds its deletion mark."""
+
+    @abc.abstractmethod
+    async def owned_by(self, user_id: str, limit: int) -> List[str]:
+        """Up to ``limit`` digests ``user_id`` owns or is deleting."""
+
+
+def _record(digest: str, size: int, content_type: str) -> dict:
+    return {"digest": digest, "size": size, "content_type": content_type,
+            "created_at": datetime.now(timezone.utc)}
+
+
+class MongoImageRepository(ImageRepository):
+    def __init__(self, db):
+        self.db = db
+
+    async def setup(self):
+        await self.db.images.create_indexes(IMAGE_INDEXES)
+
+    async def get(self, digest):
+        return await self.db.images.find_one(
+            {"_id": digest, "deleting": {"$exists": False}}, {"_id": 0}
+        )
+
+    async def add_owner(self, digest, user_id, size, content_type):
+        try:
+            # A marked record does not match, and the upsert then collides
+            # with it on _id
+            return await self.db.images.find_one_and_update(
+                {"_id": digest, "deleting": {"$exists": False}},
+                {
+                    "$setOnInsert": _record(digest, size, content_type),
+                    "$addToSet": {"owners": user_id},
+                },
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            raise ImageBeingDeleted(digest)
+
+    async def release(self, digest, user_id):
+        owners = {
+            "$filter": {"input": "$owners", "cond": {"$ne": ["$$this", user_id]}}
+        }
+        record = await self.db.images.find_one_and_update(
+            {"_id": digest, "$or": [{"owners": user_id}, {"deleting": user_id}]},
+            [
+                {"$set": {"owners": owners}},
+                {
+                    "$set": {
+                        "deleting": {
+                            "$cond": [
+                                {"$eq": [{"$size": "$owners"}, 0]},
+                                user_id,
+                                "$$REMOVE",
+                            ]
+                        }
+                    }
+                },
+            ],
+            projection={"_id": 0, "deleting": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        return record is not None and record.get("deleting") == user_id
+
+    async def delete(self, digest, user_id):
+        result = await self.db.images.delete_one(
+            {"_id": digest, "deleting": user_id}
+        )
+        return result.deleted_count == 1
+
+    async def owned_by(self, user_id, limit):
+        docs = (
+            await self.db.images.find(
+                {"$or": [{"owners": user_id}, {"deleting": user_id}]}, {"_id": 1}
+            )
+            .limit(limit)
+            .to_list(limit)
+        )
+        return [doc["_id"] for doc in docs]
+
+
+class InMemoryImageRepository(ImageRepository):
+    def __init__(self):
+        self._images: Dict[str, dict] = {}
+
+    async def get(self, digest):
+        record = self._images.get(digest)
+        return None if record is None or "deleting" in record else record
+
+    async def add_owner(self, digest, user_id, size, content_type):
+        record = self._images.setdefault(
+            digest, {**_record(digest, size, content_type), "owners": []}
+        )
+        if "deleting" in record:
+            raise ImageBeingDeleted(digest)
+        if user_id not in record["owners"]:
+            record["owners"].append(user_id)
+        return record
+
+    async def release(self, digest, user_id):
+        record = self._images.get(digest)
+        if record is None:
+            return False
+        if user_id in record["owners"]:
+            record["owners"].remove(user_id)
+            if not record["owners"]:
+                record["deleting"] = user_id
+        return record.get("deleting") == user_id
+
+    async def delete(self, digest, user_id):
+        record = self._images.get(digest)
+        if record is None or record.get("deleting") != user_id:
+            return False
+        del self._images[digest]
+        return True
+
+    async def owned_by(self, user_id, limit):
+        return [
+            digest
+            for digest, record in self._images.items()
+            if user_id in record["owners"] or record.get("deleting") == user_id
+        ][:limit]
@@ -0,0 +1,344 @@
+"""
+Prometheus-style metrics for the API and its MongoDB client.
+
+A small in-process registry rendered in the Prometheus text exposition
+format by ``GET /metrics``. ``MetricsMiddleware`` times every request by
+route template; ``MongoCommandListener`` and ``MongoPoolListener`` are pymongo
+event listeners attached to the Motor client. pymongo invokes listeners on
+Motor's worker threads, so every metric takes a lock when it is updated.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return (
+        str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    )
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def items(self) -> List[Tuple[LabelValues, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} "
+            f"{_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def get(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def remove(self, *labels: str) -> None:
+        with self._lock:
+            self._values.pop(labels, None)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                    0,
+                ]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def totals(self, *labels: str) -> Tuple[int, float]:
+        """(observation count, sum) for one label set."""
+        with self._lock:
+            series = self._series.get(labels)
+            return (series[2], series[1]) if series else (0, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted(
+                (labels, ([*counts], total, count))
+                for labels, (counts, total, count) in self._series.items()
+            )
+        lines = self.header()
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.label_names + ("le",),
+                                               labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by method, route and status code.",
+    ("method", "route", "status")))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route.",
+    ("method", "route")))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served."))
+
+mongo_command_duration = registry.register(
+    Histogram(
+        "mongodb_command_duration_seconds",
+        "MongoDB command round-trip time by command.",
+        ("command",),
+    )
+)
+mongo_command_failures = registry.register(Counter(
+    "mongodb_command_failures_total", "MongoDB commands that failed, by command.",
+    ("command",)))
+mongo_pool_checkout_wait = registry.register(Histogram(
+    "mongodb_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the pool.", ("address",)))
+mongo_pool_checkout_failures = registry.register(
+    Counter(
+        "mongodb_pool_checkout_failures_total",
+        "Connection checkouts that failed, by reason.",
+        ("address", "reason"),
+    )
+)
+mongo_pool_connections = registry.register(Gauge(
+    "mongodb_pool_connections", "Open connections in the pool.", ("address",)))
+mongo_pool_checked_out = registry.register(
+    Gauge(
+        "mongodb_pool_checked_out_connections",
+        "Connections currently checked out.",
+        ("address",),
+    )
+)
+
+drag_events = registry.register(Counter(
+    "drag_events_total", "Drag positions received over board WebSockets."))
+drag_writes = registry.register(Counter(
+    "drag_writes_total", "Entry position writes made by drag ticks."))
+drag_connections = registry.register(Gauge(
+    "drag_connections", "Open board drag WebSockets."))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: request counts, latency and in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.dec()
+            # The route template, not the raw path, keeps label cardinality bounded
+            route = scope.get("route")
+            route_name = getattr(route, "path", None) or "unmatched"
+            http_requests.inc(scope["method"], route_name, status)
+            http_request_duration.observe(elapsed, scope["method"], route_name)
+
+
+def _address(address) -> str:
+    return "%s:%s" % address if isinstance(address, tuple) else str(address)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_command_duration.observe(
+            event.duration_micros / 1e6, event.command_name
+        )
+
+    def failed(self, event):
+        mongo_command_duration.observe(
+            event.duration_micros / 1e6, event.command_name
+        )
+        mongo_command_failures.inc(event.command_name)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Pool gauges and checkout wait times.
+
+    A checkout starts and completes on the same thread, so the start time is
+    kept thread-locally between the two events.
+
+    A closed pool's series are dropped rather than zeroed. The closed events
+    of its connections can arrive afterwards, and are ignored, so the gauges
+    never go negative or keep a client's pools after it is closed.
+    """
+
+    def __init__(self):
+        self._checkout = threading.local()
+        self._closed = set()
+
+    def pool_created(self, event):
+        # A server that left the topology and came back gets a new pool
+        self._closed.discard(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        self._closed.add(event.address)
+        address = _address(event.address)
+        mongo_pool_connections.remove(address)
+        mongo_pool_checked_out.remove(address)
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc(_address(event.address))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        if event.address not in self._closed:
+            mongo_pool_connections.dec(_address(event.address))
+
+    def connection_check_out_started(self, event):
+        self._checkout.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        address = _address(event.address)
+        self._observe_wait(address)
+        mongo_pool_checkout_failures.inc(address, str(event.reason))
+
+    def connection_checked_out(self, event):
+        address = _address(event.address)
+        self._observe_wait(address)
+        mongo_pool_checked_out.inc(address)
+
+    def connection_checked_in(self, event):
+        if event.address not in self._closed:
+            mongo_pool_checked_out.dec(_address(event.address))
+
+    def _observe_wait(self, address: str) -> None:
+        started = getattr(self._checkout, "started", None)
+        if started is not None:
+            mongo_pool_checkout_wait.observe(
+                time.perf_counter() - started, address
+            )
+            self._checkout.started = None
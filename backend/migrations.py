@@ -0,0 +1,302 @@
+"""
+Online data migrations for the thought stick backend.
+
+Run from the backend directory, e.g.:
+
+    python migrations.py backfill-status-timestamps --batch-size 1000
+
+Migrations work in small batches and checkpoint their position in the
+``migrations`` collection, so they can run against a live database and be
+interrupted and restarted at any point.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from clusters import TILE_INDEXES, tile_rebuild_pipeline
+from entries import ENTRY_INDEXES, SEARCHED_FIELDS, MongoEntryRepository
+from search import entry_terms
+from status_stats import ROLLUP_INDEXES, ROLLUP_UNITS, rollup_rebuild_pipeline
+from zorder import key_before, rebalance_plan
+
+logger = logging.getLogger(__name__)
+
+STATUS_TIMESTAMP_BACKFILL = "status_checks.timestamp_to_datetime"
+
+
+def parse_iso_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+async def backfill_status_timestamps(
+    db, batch_size: int = 1000, pause: float = 0.0
+) -> int:
+    """Convert ISO string ``timestamp`` fields in ``status_checks`` to BSON dates.
+
+    Documents are visited in ``_id`` order and the last converted ``_id`` is
+    checkpointed after every batch. Each update is guarded on the original
+    string value, so a document rewritten concurrently is left alone.
+
+    Run it online while the servers still write ISO strings, then stop them
+    and run it again to convert what was written meanwhile. Only then start
+    them with ``STATUS_TIMESTAMP_STORAGE=native``; they refuse to start while
+    string timestamps remain, since native filters would not match them.
+
+    Returns the number of documents converted by this run.
+    """
+    state = await db.migrations.find_one({"_id": STATUS_TIMESTAMP_BACKFILL}) or {}
+    # After a completed run, start over: rows written since may carry _ids
+    # below the checkpoint, since servers generate them on their own clocks
+    last_id = None if "completed_at" in state else state.get("last_id")
+    converted = 0
+
+    while True:
+        query = {"timestamp": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await (
+            db.status_checks.find(query, {"timestamp": 1})
+            .sort("_id", 1)
+            .limit(batch_size)
+            .to_list(batch_size)
+        )
+        if not batch:
+            break
+
+        updates = []
+        for doc in batch:
+            try:
+                timestamp = parse_iso_timestamp(doc["timestamp"])
+            except ValueError:
+                logger.warning(
+                    "Skipping %s: unparseable timestamp %r",
+                    doc["_id"],
+                    doc["timestamp"],
+                )
+                continue
+            updates.append(UpdateOne(
+                {"_id": doc["_id"], "timestamp": doc["timestamp"]},
+                {"$set": {"timestamp": timestamp}},
+            ))
+        modified = 0
+        if updates:
+            result = await db.status_checks.bulk_write(updates, ordered=False)
+            modified = result.modified_count
+            converted += modified
+
+        last_id = batch[-1]["_id"]
+        await db.migrations.update_one(
+            {"_id": STATUS_TIMESTAMP_BACKFILL},
+            {
+                "$set": {
+                    "last_id": last_id,
+                    "updated_at": datetime.now(timezone.utc),
+                },
+                "$unset": {"completed_at": ""},
+                "$inc": {"converted": modified},
+            },
+            upsert=True,
+        )
+        logger.info(
+            "Backfilled %d status check timestamps (last _id %s)",
+            converted,
+            last_id,
+        )
+        if pause:
+            # Leave room for foreground traffic between batches
+            await asyncio.sleep(pause)
+
+    await db.migrations.update_one(
+        {"_id": STATUS_TIMESTAMP_BACKFILL},
+        {"$set": {"completed_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    return converted
+
+
+async def backfill_status_rollups(db, **options) -> int:
+    """Rebuild ``status_check_rollups`` from every stored status check.
+
+    Each rollup unit is recomputed in one server-side aggregation that
+    replaces existing counters, so the rebuild can be rerun safely. Counters
+    for the minute in which it runs may miss checks inserted concurrently.
+    Takes no options; returns the number of rollup units rebuilt.
+    """
+    await db.status_check_rollups.create_indexes(ROLLUP_INDEXES)
+    for unit in ROLLUP_UNITS:
+        # $toDate accepts both legacy ISO strings and native dates
+        pipeline = rollup_rebuild_pipeline(unit, {"$toDate": "$timestamp"})
+        await db.status_checks.aggregate(pipeline, allowDiskUse=True).to_list(None)
+        logger.info("Rebuilt %s rollups", unit)
+    return len(ROLLUP_UNITS)
+
+
+async def backfill_entry_tiles(db, **options) -> int:
+    """Rebuild the ``entry_tiles`` clusters from every stored entry.
+
+    One aggregation recomputes every tile and replaces it; tiles it did not
+    produce (boards or areas that are now empty) are deleted afterwards. A
+    tile first created by a concurrent write during the run may be deleted
+    too, so rerun it if entries were being added. Takes no options; returns
+    the number of tiles deleted as empty.
+    """
+    await db.entry_tiles.create_indexes(TILE_INDEXES)
+    rebuilt_at = datetime.now(timezone.utc)
+    await db.entries.aggregate(
+        tile_rebuild_pipeline(rebuilt_at), allowDiskUse=True
+    ).to_list(None)
+    result = await db.entry_tiles.delete_many({"rebuilt_at": {"$ne": rebuilt_at}})
+    logger.info(
+        "Rebuilt entry tiles, deleted %d empty tiles", result.deleted_count
+    )
+    return result.deleted_count
+
+
+async def backfill_entry_versions(db, **options) -> int:
+    """Give entries created before per-entry versions ``version: 1``.
+
+    Until then such an entry never matches a conditional op and its first
+    update leaves it at version 1. Only entries without a version are
+    touched, so it can be rerun. Takes no options; returns the number of
+    entries updated.
+    """
+    result = await db.entries.update_many(
+        {"version": {"$exists": False}}, {"$set": {"version": 1}}
+    )
+    logger.info("Set the version of %d entries", result.modified_count)
+    return result.modified_count
+
+
+async def backfill_entry_z_keys(db, pause: float = 0.0, **options) -> int:
+    """Give entries from before fractional z-order a ``z_key``, keeping their
+    z_index order.
+
+    Per board, entries without a key are stacked below the keyed ones, in
+    (z_index, created_at) order. Then the board's keys are respaced. Boards are
+    done one at a time, ``pause`` seconds apart. Run backfill-entry-tiles
+    afterwards, so cluster representatives carry keys too. Returns the number of
+    entries keyed.
+    """
+    repo = MongoEntryRepository(db)
+    await db.entries.create_indexes(ENTRY_INDEXES)
+    keyed = 0
+    for board_id in await db.entries.distinct(
+        "board_id", {"z_key": {"$exists": False}}
+    ):
+        unkeyed = (
+            await db.entries.find(
+                {"board_id": board_id, "z_key": {"$exists": False}},
+                {"_id": 0, "id": 1},
+            )
+            .sort([("z_index", -1), ("created_at", -1), ("id", -1)])
+            .to_list(None)
+        )
+        # Top of the unkeyed entries first, each just below the one before
+        z_key, updates = await repo.edge_z_key(board_id, top=False), []
+        for doc in unkeyed:
+            z_key = key_before(z_key)
+            updates.append(
+                UpdateOne(
+                    {
+                        "board_id": board_id,
+                        "id": doc["id"],
+                        "z_key": {"$exists": False},
+                    },
+                    {"$set": {"z_key": z_key}},
+                )
+            )
+        await db.entries.bulk_write(updates, ordered=False)
+        await repo.rekey(board_id, rebalance_plan(await repo.z_order(board_id)))
+        keyed += len(updates)
+        logger.info("Keyed %d entries on board %s", len(updates), board_id)
+        if pause:
+            await asyncio.sleep(pause)
+    return keyed
+
+
+async def backfill_entry_search_terms(
+    db, batch_size: int = 1000, pause: float = 0.0
+) -> int:
+    """Give entries from before search their ``search_terms``.
+
+    Entries without terms are fetched ``batch_size`` at a time, so it resumes
+    where it stopped without a checkpoint. Each update is guarded on the text
+    the terms came from; an entry edited meanwhile got its terms from that
+    edit. Returns the number of entries updated.
+    """
+    await db.entries.create_indexes(ENTRY_INDEXES)
+    updated = 0
+    while True:
+        batch = (
+            await db.entries.find(
+                {"search_terms": {"$exists": False}},
+                {"_id": 1, **{field: 1 for field in SEARCHED_FIELDS}},
+            )
+            .limit(batch_size)
+            .to_list(None)
+        )
+        if not batch:
+            return updated
+        result = await db.entries.bulk_write(
+            [
+                UpdateOne(
+                    {
+                        "_id": doc["_id"],
+                        **{field: doc.get(field) for field in SEARCHED_FIELDS},
+                    },
+                    {"$set": {"search_terms": entry_terms(doc)}},
+                )
+                for doc in batch
+            ],
+            ordered=False,
+        )
+        updated += result.modified_count
+        logger.info("Indexed the search terms of %d entries", updated)
+        if pause:
+            await asyncio.sleep(pause)
+
+
+MIGRATIONS = {
+    "backfill-status-timestamps": backfill_status_timestamps,
+    "backfill-status-rollups": backfill_status_rollups,
+    "backfill-entry-tiles": backfill_entry_tiles,
+    "backfill-entry-versions": backfill_entry_versions,
+    "backfill-entry-z-keys": backfill_entry_z_keys,
+    "backfill-entry-search-terms": backfill_entry_search_terms,
+}
+
+
+async def main(name: str, batch_size: int, pause: float) -> None:
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        converted = await MIGRATIONS[name](
+            client[os.environ['DB_NAME']], batch_size=batch_size, pause=pause
+        )
+        logger.info("%s finished: %d converted", name, converted)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.0,
+                        help="seconds to sleep between batches")
+    args = parser.parse_args()
+    asyncio.run(main(args.migration, args.batch_size, args.pause))
@@ -0,0 +1,173 @@
+"""
+MongoDB connection pool settings, startup warm-up and live statistics.
+
+Pool sizing is per process: with N uvicorn workers the server sees up to
+N * MONGO_MAX_POOL_SIZE connections. ``pool_stats`` reports what each pool is
+actually using (from the listener-fed gauges in metrics.py) so the size can
+be tuned against real checkout waits.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Optional, Tuple
+
+from pymongo import monitoring
+from pymongo.errors import InvalidOperation
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _int_env(name: str, default=None):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def pool_options_from_env() -> dict:
+    """Keyword arguments for AsyncIOMotorClient, omitting pymongo defaults."""
+    options = {
+        "maxPoolSize": _int_env('MONGO_MAX_POOL_SIZE'),
+        "minPoolSize": _int_env('MONGO_MIN_POOL_SIZE'),
+        "waitQueueTimeoutMS": _int_env('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+        "serverSelectionTimeoutMS": _int_env('MONGO_SERVER_SELECTION_TIMEOUT_MS'),
+    }
+    return {name: value for name, value in options.items() if value is not None}
+
+
+class ConnectionCounter(monitoring.ConnectionPoolListener):
+    """Open connections per server address, for one client.
+
+    Warm-up counts with its own listener rather than the process-wide gauges,
+    which also hold other clients' pools (earlier lifespans, tests).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open: Counter = Counter()
+
+    def open(self, address: Optional[Tuple[str, int]]) -> int:
+        """Connections open to ``address``; with None, to the busiest server."""
+        with self._lock:
+            if address is None:
+                return max(self._open.values(), default=0)
+            return self._open[address]
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        # Its connections' closed events may follow; they are not counted
+        with self._lock:
+            self._open.pop(event.address, None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._open[event.address] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            if self._open.get(event.address):
+                self._open[event.address] -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+def _selected_address(client) -> Optional[Tuple[str, int]]:
+    """The standalone, primary or mongos requests go to; None when the client
+    balances over several mongoses."""
+    try:
+        return client.address
+    except InvalidOperation:
+        return None
+
+
+async def warm_up(client, connections: ConnectionCounter, min_pool_size: int,
+                  timeout: float = 10.0) -> int:
+    """Open ``min_pool_size`` connections before the app starts serving.
+
+    A ping connects the topology; pymongo's pool maintenance then opens
+    minPoolSize connections in the background, which this waits for (up to
+    ``timeout``) so the first requests after a deploy don't pay for them.
+    Only the pool of the server requests go to counts: on a replica set the
+    secondaries' pools fill too, and would otherwise end the wait early.
+    ``connections`` must be one of the client's event listeners. Returns the
+    number of connections open when it finished.
+    """
+    started = time.perf_counter()
+    await client.admin.command('ping')
+    # Selecting the primary is quick once connected, but may block briefly
+    address = await asyncio.to_thread(_selected_address, client)
+    deadline = started + timeout
+    while (connections.open(address) < min_pool_size
+           and time.perf_counter() < deadline):
+        await asyncio.sleep(0.01)
+    opened = connections.open(address)
+    if opened < min_pool_size:
+        logger.warning("Mongo pool warm-up timed out with %d/%d connections open",
+                       opened, min_pool_size)
+    else:
+        logger.info("Mongo pool warmed up: %d connections in %.0f ms",
+                    opened, (time.perf_counter() - started) * 1000)
+    return opened
+
+
+def pool_stats(client) -> dict:
+    options = client.options.pool_options
+    pools = {}
+    for (address,), connections in metrics.mongo_pool_connections.items():
+        checked_out = metrics.mongo_pool_checked_out.get(address)
+        wait_count, wait_sum = metrics.mongo_pool_checkout_wait.totals(address)
+        pools[address] = {
+            "open": int(connections),
+            "checked_out": int(checked_out),
+            "available": int(connections - checked_out),
+            "checkouts": wait_count,
+            "checkout_wait_mean_ms": (
+                round(wait_sum / wait_count * 1000, 3) if wait_count else 0.0
+            ),
+            "checkout_failures": int(
+                sum(
+                    value
+                    for (
+                        failed_address,
+                        _,
+                    ), value in metrics.mongo_pool_checkout_failures.items()
+                    if failed_address == address
+                )
+            ),
+        }
+    return {
+        "max_pool_size": options.max_pool_size,
+        "min_pool_size": options.min_pool_size,
+        "wait_queue_timeout_ms": (
+            options.wait_queue_timeout * 1000
+            if options.wait_queue_timeout is not None
+            else None
+        ),
+        "server_selection_timeout_ms": client.options.server_selection_timeout
+        * 1000,
+        "pools": pools,
+    }
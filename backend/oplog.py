@@ -0,0 +1,188 @@
+"""
+Per-board operation log for incremental sync.
+
+Clients send small batches of ops (move, recolor, z-order, delete) instead of
+rewriting the board. Each op that is applied to an entry is appended to the
+board's log under the next sequence number, its ``seq``. A client remembers the
+last ``seq`` it has seen, its sync position, and pulls only the ops after it.
+
+In Mongo, sequence numbers are reserved from a per-board counter in
+``board_oplog_heads`` before the ops are inserted into ``board_ops``. So a
+reader can briefly see a later op before an earlier one lands. Pulls stop at
+such a gap until it is ``gap_grace`` seconds old. After that, the missing op
+is taken to be lost (its writer died between reserving and inserting) and is
+skipped. Ops older than the retention period are deleted. A client whose
+position is older than what is kept has to reload the board.
+"""
+import abc
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+
+OPLOG_INDEXES = [
+    IndexModel(
+        [("board_id", ASCENDING), ("seq", ASCENDING)],
+        unique=True,
+        name="board_id_seq",
+    )
+]
+OP_PROJECTION = {"_id": 0, "board_id": 0}
+
+
+class OpLogTrimmed(Exception):
+    """The ops after the client's position are no longer kept."""
+
+
+def coalesce_moves(ops: List[dict]) -> List[Tuple[dict, List[int]]]:
+    """Collapse each run of moves of one entry into its last position.
+
+    A run ends at any other op on the same entry; ops on other entries in
+    between do not break it, since ops on different entries commute. Returns
+    the ops to apply, each with the positions in ``ops`` it stands for. A
+    coalesced move keeps the first move's ``base_version``, the version the
+    client saw before the drag began.
+    """
+    coalesced: List[Tuple[dict, List[int]]] = []
+    open_moves: Dict[str, int] = {}
+    for position, op in enumerate(ops):
+        run = open_moves.get(op["id"])
+        if op["op"] == "move" and run is not None:
+            move, positions = coalesced[run]
+            coalesced[run] = (
+                {**move, "x": op["x"], "y": op["y"]},
+                positions + [position],
+            )
+            continue
+        coalesced.append((op, [position]))
+        if op["op"] == "move":
+            open_moves[op["id"]] = len(coalesced) - 1
+        else:
+            open_moves.pop(op["id"], None)
+    return coalesced
+
+
+def contiguous(
+    ops: List[dict], position: int, now: datetime, gap_grace: float
+) -> List[dict]:
+    """The leading ops after ``position`` that can be handed out in order.
+
+    Stops at a gap in the sequence that is younger than ``gap_grace``
+    seconds, because its op may still be being written. Skips older gaps as
+    lost, except right after ``position``: there the missing op may have
+    expired, and the client cannot safely continue.
+    """
+    run, expected = [], position + 1
+    for op in ops:
+        if op["seq"] != expected:
+            if now - op["at"] < timedelta(seconds=gap_grace):
+                break
+            if not run:
+                raise OpLogTrimmed()
+        run.append(op)
+        expected = op["seq"] + 1
+    return run
+
+
+class OpLogRepository(abc.ABC):
+    async def setup(self) -> None:
+        """Create the (board_id, seq) index, and the TTL index that enforces
+        the retention."""
+
+    async def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def append(self, board_id: str, ops: List[dict]) -> List[dict]:
+        """Log ``ops`` in order; returns them with their ``seq`` and ``at``."""
+
+    @abc.abstractmethod
+    async def head(self, board_id: str) -> int:
+        """The board's latest sequence number, 0 before its first op."""
+
+    @abc.abstractmethod
+    async def since(
+        self, board_id: str, position: int, limit: int
+    ) -> Tuple[List[dict], bool]:
+        """Up to ``limit`` ops after ``position`` and whether more are ready.
+
+        Raises ``OpLogTrimmed`` if ops the client has not seen are gone, or if
+        ``position`` is past anything this log handed out.
+        """
+
+
+class MongoOpLogRepository(OpLogRepository):
+    def __init__(self, db, retention: timedelta, gap_grace: float = 5.0):
+        self.db = db
+        self.retention = retention
+        self.gap_grace = gap_grace
+
+    async def setup(self):
+        await self.db.board_ops.create_indexes([
+            *OPLOG_INDEXES,
+            # Changing the retention needs collMod or an index rebuild
+            IndexModel([("at", ASCENDING)], name="at_ttl",
+                       expireAfterSeconds=int(self.retention.total_seconds())),
+        ])
+
+    async def append(self, board_id, ops):
+        head = await self.db.board_oplog_heads.find_one_and_update(
+            {"_id": board_id}, {"$inc": {"seq": len(ops)}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        first, at = head["seq"] - len(ops) + 1, datetime.now(timezone.utc)
+        logged = [
+            {**op, "seq": first + offset, "at": at}
+            for offset, op in enumerate(ops)
+        ]
+        # Copies, so neither board_id nor _id leak into the returned ops
+        await self.db.board_ops.insert_many(
+            [{**op, "board_id": board_id} for op in logged]
+        )
+        return logged
+
+    async def head(self, board_id):
+        head = await self.db.board_oplog_heads.find_one({"_id": board_id})
+        return head["seq"] if head is not None else 0
+
+    async def since(self, board_id, position, limit):
+        ops = await self.db.board_ops.find(
+            {"board_id": board_id, "seq": {"$gt": position}}, OP_PROJECTION,
+        ).sort("seq", ASCENDING).limit(limit + 1).to_list(None)
+        if not ops and position and await self.head(board_id) != position:
+            raise OpLogTrimmed()
+        run = contiguous(ops, position, datetime.now(timezone.utc), self.gap_grace)
+        return run[:limit], len(run) > limit or len(run) < len(ops)
+
+
+class InMemoryOpLogRepository(OpLogRepository):
+    """Process-local engine: the last ``max_ops`` ops of each board, in order."""
+
+    def __init__(self, max_ops: int = 10000):
+        self.max_ops = max_ops
+        self._ops: Dict[str, List[dict]] = defaultdict(list)
+        self._heads: Dict[str, int] = defaultdict(int)
+
+    async def append(self, board_id, ops):
+        first, at = self._heads[board_id] + 1, datetime.now(timezone.utc)
+        logged = [
+            {**op, "seq": first + offset, "at": at}
+            for offset, op in enumerate(ops)
+        ]
+        self._heads[board_id] += len(ops)
+        kept = self._ops[board_id]
+        kept.extend(logged)
+        del kept[:-self.max_ops]
+        return logged
+
+    async def head(self, board_id):
+        return self._heads.get(board_id, 0)
+
+    async def since(self, board_id, position, limit):
+        head, kept = self._heads.get(board_id, 0), self._ops.get(board_id, [])
+        first = kept[0]["seq"] if kept else head + 1
+        if position > head or position < first - 1:
+            raise OpLogTrimmed()
+        start = position - first + 1
+        return kept[start:start + limit], start + limit < len(kept)
@@ -0,0 +1,262 @@
+"""
+Board rendering for print exports, with no imaging library.
+
+A board is drawn as one RGB raster in horizontal bands. Each band is filled
+and deflated on its own, in a worker process (see exports.py). Non-final
+bands end in a full flush, so their raw deflate streams concatenate into one
+zlib stream, and their Adler-32 checksums combine into its trailer. So bands
+render in parallel and are appended to the file in order, and no more than
+a few of them are ever in memory.
+
+The stream holds PNG-filtered rows (filter type 0 on every row). It is the
+IDAT data of a PNG, and also, unchanged, a PDF image's FlateDecode data with
+the PNG predictor.
+
+Each entry is drawn as a polaroid: a white card with a thin edge and a photo
+area in the entry's color. Rotation, photos and titles are not drawn.
+"""
+import math
+import struct
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+# The card as the board draws it, in board pixels from its (x, y)
+CARD_WIDTH, CARD_HEIGHT = 120, 140
+PHOTO_INSET, PHOTO_SIZE = 8, 104
+# Board pixels left around the outermost cards
+MARGIN = 40
+
+# The board palette, see design_guidelines.json
+BACKGROUND = (0xFD, 0xFB, 0xF7)
+CARD = (0xFF, 0xFF, 0xFF)
+CARD_EDGE = (0xD8, 0xD4, 0xCC)
+COLORS: Dict[str, Tuple[int, int, int]] = {
+    "butter": (0xF9, 0xE0, 0x7B),
+    "grass": (0x7B, 0xC4, 0x7F),
+    "mint": (0x98, 0xE8, 0xC1),
+    "sky": (0x87, 0xCE, 0xEB),
+}
+
+# A card in image pixels: x0, y0, x1, y1 and color, bottom of the stack first
+Card = Tuple[int, int, int, int, str]
+
+
+def board_bounds(entries: Iterable[dict]) -> Tuple[float, float, float, float]:
+    """The board area to draw: every card, plus the margin."""
+    entries = list(entries)
+    return (min(entry["x"] for entry in entries) - MARGIN,
+            min(entry["y"] for entry in entries) - MARGIN,
+            max(entry["x"] for entry in entries) + CARD_WIDTH + MARGIN,
+            max(entry["y"] for entry in entries) + CARD_HEIGHT + MARGIN)
+
+
+def image_size(
+    bounds: Tuple[float, float, float, float], scale: float
+) -> Tuple[int, int]:
+    x0, y0, x1, y1 = bounds
+    return math.ceil((x1 - x0) * scale), math.ceil((y1 - y0) * scale)
+
+
+def layout(entries: List[dict], scale: float) -> Tuple[int, int, List[Card]]:
+    """Image width, height and cards for ``entries`` (bottom to top) at ``scale``
+    image pixels per board pixel."""
+    bounds = board_bounds(entries)
+    x0, y0 = bounds[0], bounds[1]
+    cards = []
+    for entry in entries:
+        left, top = round((entry["x"] - x0) * scale), round(
+            (entry["y"] - y0) * scale
+        )
+        cards.append(
+            (
+                left,
+                top,
+                left + round(CARD_WIDTH * scale),
+                top + round(CARD_HEIGHT * scale),
+                entry["color"],
+            )
+        )
+    return (*image_size(bounds, scale), cards)
+
+
+def band_rows(width: int, target_bytes: int = 4 * 1024 * 1024) -> int:
+    """Rows per band, for about ``target_bytes`` of raw rows."""
+    return max(1, target_bytes // (1 + 3 * width))
+
+
+def split_bands(cards: List[Card], height: int, rows: int) -> List[List[Card]]:
+    """The cards that meet each band of ``rows`` rows, in stack order."""
+    bands: List[List[Card]] = [[] for _ in range(math.ceil(height / rows))]
+    for card in cards:
+        for band in range(
+            card[1] // rows, min(len(bands), math.ceil(card[3] / rows))
+        ):
+            bands[band].append(card)
+    return bands
+
+
+def render_band(cards: List[Card], width: int, top: int, rows: int, scale: float,
+                last: bool, level: int = 6) -> Tuple[bytes, int, int]:
+    """Raw deflate data, Adler-32 and length of the filtered rows ``top`` to
+    ``top + rows``. Runs in a worker process."""
+    stride = 1 + 3 * width
+    band = bytearray((b"\x00" + bytes(BACKGROUND) * width) * rows)
+
+    def fill(
+        x0: int, y0: int, x1: int, y1: int, color: Tuple[int, int, int]
+    ) -> None:
+        x0, x1 = max(x0, 0), min(x1, width)
+        if x0 >= x1:
+            return
+        span = bytes(color) * (x1 - x0)
+        for row in range(max(y0, top), min(y1, top + rows)):
+            start = (row - top) * stride + 1 + 3 * x0
+            band[start:start + len(span)] = span
+
+    edge, inset, photo = (
+        max(1, round(scale)),
+        round(PHOTO_INSET * scale),
+        round(PHOTO_SIZE * scale),
+    )
+    for x0, y0, x1, y1, color in cards:
+        fill(x0, y0, x1, y1, CARD_EDGE)
+        fill(x0 + edge, y0 + edge, x1 - edge, y1 - edge, CARD)
+        fill(
+            x0 + inset,
+            y0 + inset,
+            x1 - inset,
+            y0 + inset + photo,
+            COLORS.get(color, CARD_EDGE),
+        )
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    data = compressor.compress(band) + compressor.flush(
+        zlib.Z_FINISH if last else zlib.Z_FULL_FLUSH
+    )
+    return data, zlib.adler32(band), len(band)
+
+
+_ADLER_BASE = 65521
+
+
+def adler32_combine(first: int, second: int, second_length: int) -> int:
+    """The Adler-32 of two byte strings joined, from each one's checksum."""
+    remainder = second_length % _ADLER_BASE
+    low = ((first & 0xFFFF) + (second & 0xFFFF) + _ADLER_BASE - 1) % _ADLER_BASE
+    high = (remainder * (first & 0xFFFF) + (first >> 16) + (second >> 16)
+            + _ADLER_BASE - remainder) % _ADLER_BASE
+    return (high << 16) | low
+
+
+# zlib header: deflate, 32K window, default compression
+ZLIB_HEADER = b"\x78\x9c"
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+class PngEncoder:
+    """The file around the band data: ``head``, ``segment`` per band, ``tail``."""
+
+    media_type = "image/png"
+
+    def __init__(self, width: int, height: int, scale: float):
+        self.width, self.height = width, height
+
+    def head(self) -> bytes:
+        header = struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        return (
+            b"\x89PNG\r\n\x1a\n"
+            + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"IDAT", ZLIB_HEADER)
+        )
+
+    def segment(self, data: bytes) -> bytes:
+        return _png_chunk(b"IDAT", data)
+
+    def tail(self, adler: int) -> bytes:
+        return _png_chunk(b"IDAT", struct.pack(">I", adler)) + _png_chunk(
+            b"IEND", b""
+        )
+
+
+class PdfEncoder:
+    """A one-page PDF holding the raster at the board's size on screen (96 dpi)."""
+
+    media_type = "application/pdf"
+
+    def __init__(self, width: int, height: int, scale: float):
+        self.width, self.height = width, height
+        # Points per image pixel
+        self.unit = 72 / 96 / scale
+        self._offsets: List[int] = []
+        self._written = 0
+        self._stream_start = 0
+
+    def _objects(self, *objects: bytes) -> bytes:
+        out = b""
+        for body in objects:
+            self._offsets.append(self._written + len(out))
+            out += b"%d 0 obj\n" % len(self._offsets) + body + b"\nendobj\n"
+        return out
+
+    def head(self) -> bytes:
+        page_width, page_height = self.width * self.unit, self.height * self.unit
+        contents = b"q %.4f 0 0 %.4f 0 0 cm /Board Do Q" % (
+            page_width,
+            page_height,
+        )
+        out = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self._written = len(out)
+        out += self._objects(
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.4f %.4f]"
+            b" /Contents 4 0 R /Resources << /XObject << /Board 5 0 R >> >> >>"
+            % (page_width, page_height),
+            b"<< /Length %d >>\nstream\n" % len(contents)
+            + contents
+            + b"\nendstream",
+        )
+        # The image's length is only known at the end: object 6
+        self._offsets.append(len(out))
+        out += (
+            b"5 0 obj\n<< /Type /XObject /Subtype /Image /Width %d /Height %d"
+            b" /ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode"
+            b" /DecodeParms << /Predictor 15 /Colors 3 /BitsPerComponent 8"
+            b" /Columns %d >>"
+            b" /Length 6 0 R >>\nstream\n" % (self.width, self.height, self.width)
+        )
+        out += ZLIB_HEADER
+        self._stream_start = len(out) - len(ZLIB_HEADER)
+        self._written = len(out)
+        return out
+
+    def segment(self, data: bytes) -> bytes:
+        self._written += len(data)
+        return data
+
+    def tail(self, adler: int) -> bytes:
+        out = struct.pack(">I", adler)
+        length = self._written + len(out) - self._stream_start
+        out += b"\nendstream\nendobj\n"
+        self._written += len(out)
+        length_object = self._objects(b"%d" % length)
+        xref = self._written + len(length_object)
+        out += length_object
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(self._offsets) + 1)
+        out += b"".join(b"%010d 00000 n \n" % offset for offset in self._offsets)
+        out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(self._offsets) + 1,
+            xref,
+        )
+        return out
+
+
+ENCODERS = {"png": PngEncoder, "pdf": PdfEncoder}
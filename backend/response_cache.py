@@ -0,0 +1,75 @@
+"""
+In-process cache of serialized list responses, invalidated by a version counter.
+
+Every write bumps ``version``; cached bodies are only served while the version
+they were built at is current. The counter is per process, so with several
+workers a write seen by one worker is not seen by the others' caches: ``ttl``
+bounds how long such a stale body can be served.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional
+
+
+class CachedResponse(NamedTuple):
+    version: int
+    etag: str
+    body: bytes
+    headers: dict
+    expires_at: float
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return "*" in candidates or etag in {
+        tag.removeprefix("W/") for tag in candidates
+    }
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 256, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = 0
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+
+    def bump(self) -> None:
+        self.version += 1
+        # Nothing built at an older version can be served again
+        self._entries.clear()
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != self.version or entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(
+        self,
+        key: Hashable,
+        version: int,
+        body: bytes,
+        headers: Optional[dict] = None,
+    ) -> CachedResponse:
+        """Cache ``body`` as built at ``version`` (read before querying)."""
+        entry = CachedResponse(version, content_etag(body), body, headers or {},
+                               time.monotonic() + self.ttl)
+        # A write that landed while the body was being built makes it stale
+        if version == self.version:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
@@ -0,0 +1,143 @@
+"""
+Prefix search over entry titles and commentary.
+
+Text is split into terms: runs of word characters, case-folded and stripped
+of accents, so "Café" is found by "cafe". A query is split the same way, and
+each of its terms is a prefix. An entry matches when every query term starts
+one of its terms, so "tok ram" finds "Tokyo ramen" while it is being typed.
+
+Both engines keep an inverted index from terms to entries, updated with every
+write. In Mongo it is each entry's ``search_terms`` array, last in a multikey
+``(user_id, created_at, id, search_terms)`` index: the scan runs newest first
+and a prefix is an anchored regex, checked against the index keys. In memory
+it is a ``TermIndex`` per user.
+"""
+import bisect
+import heapq
+import re
+import unicodedata
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Optional, Set
+
+# Longer terms are cut to this, in entries and queries alike
+MAX_TERM_LENGTH = 32
+
+_WORD = re.compile(r"\w+")
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def terms(text: Optional[str]) -> List[str]:
+    """The distinct terms of ``text``, in order of appearance."""
+    if not text:
+        return []
+    return list(
+        dict.fromkeys(
+            term[:MAX_TERM_LENGTH] for term in _WORD.findall(_fold(text))
+        )
+    )
+
+
+def entry_terms(doc: dict) -> List[str]:
+    """What an entry is found by: the terms of its title and commentary."""
+    return list(dict.fromkeys(terms(doc["title"]) + terms(doc.get("commentary"))))
+
+
+def prefix_pattern(prefix: str) -> str:
+    """An anchored regex for terms starting with ``prefix``."""
+    return "^" + re.escape(prefix)
+
+
+class TermIndex:
+    """Terms to keys, with the terms kept sorted so a prefix is one bisect range.
+
+    Each key has a ``rank`` (for entries, when they were created), and
+    ``search`` returns the highest ranked matches first. Keys are also kept
+    in rank order. A query with many matches walks them from the top and
+    stops after ``limit``, instead of collecting and sorting every match.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[Hashable]] = {}
+        self._sorted: List[str] = []
+        self._terms_of: Dict[Hashable, FrozenSet[str]] = {}
+        self._rank_of: Dict[Hashable, tuple] = {}
+        self._ranked: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._terms_of)
+
+    def add(self, key: Hashable, terms: Iterable[str], rank: tuple) -> None:
+        self.remove(key)
+        self._terms_of[key] = frozenset(terms)
+        self._rank_of[key] = rank
+        bisect.insort(self._ranked, (rank, key))
+        for term in self._terms_of[key]:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = set()
+                bisect.insort(self._sorted, term)
+            postings.add(key)
+
+    def remove(self, key: Hashable) -> None:
+        if key not in self._terms_of:
+            return
+        rank = self._rank_of.pop(key)
+        del self._ranked[bisect.bisect_left(self._ranked, (rank, key))]
+        for term in self._terms_of.pop(key):
+            postings = self._postings[term]
+            postings.discard(key)
+            if not postings:
+                del self._postings[term]
+                del self._sorted[bisect.bisect_left(self._sorted, term)]
+
+    def _term_range(self, prefix: str) -> List[str]:
+        low = bisect.bisect_left(self._sorted, prefix)
+        high = bisect.bisect_left(self._sorted, prefix + "\U0010ffff", low)
+        return self._sorted[low:high]
+
+    def _matches(self, key: Hashable, prefixes: List[str]) -> bool:
+        terms = self._terms_of[key]
+        return all(
+            any(term.startswith(prefix) for term in terms) for prefix in prefixes
+        )
+
+    def search(self, prefixes: List[str], limit: int) -> List[Hashable]:
+        """Up to ``limit`` keys, highest rank first, with, for every prefix, a
+        term starting with it."""
+        if not prefixes:
+            return []
+        ranges = {prefix: self._term_range(prefix) for prefix in prefixes}
+        # The prefix with the fewest postings bounds the matches
+        sizes = {
+            prefix: sum(len(self._postings[term]) for term in terms)
+            for prefix, terms in ranges.items()
+        }
+        narrowest = min(prefixes, key=sizes.get)
+        if not sizes[narrowest]:
+            return []
+
+        # Matches are about sizes[narrowest] / len(self) of the keys, so the
+        # walk expects limit * len(self) / sizes[narrowest] steps. It gives
+        # up at the cost of collecting, so neither way costs much more.
+        found: List[Hashable] = []
+        for steps, (_, key) in enumerate(reversed(self._ranked)):
+            if steps >= sizes[narrowest]:
+                break
+            if self._matches(key, prefixes):
+                found.append(key)
+                if len(found) == limit:
+                    return found
+        else:
+            return found
+
+        candidates: Set[Hashable] = set()
+        for term in ranges[narrowest]:
+            candidates |= self._postings[term]
+        return heapq.nlargest(
+            limit,
+            (key for key in candidates if self._matches(key, prefixes)),
+            key=self._rank_of.__getitem__,
+        )
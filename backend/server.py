@@ -1,29 +1,333 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import (
+    FastAPI, APIRouter, Depends, Header, HTTPException, Query, Request, Response,
+    WebSocket, WebSocketDisconnect,
+)
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
+import base64
+import binascii
+import hmac
+import json
+import math
+from collections import defaultdict
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List
+from pydantic import (
+    BaseModel,
+    Field,
+    ConfigDict,
+    TypeAdapter,
+    ValidationError,
+    model_validator,
+)
+from typing import Annotated, Dict, List, Literal, Optional, Union
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+
+from serialization import (
+    dump_status_check_line,
+    dump_status_checks,
+    uses_fast_json,
+)
+import clusters
+import metrics
+import mongo_pool
+import render
+import search
+import status_stats
+from storage import (
+    STATUS_FIELDS,
+    InMemoryStatusCheckRepository,
+    MongoStatusCheckRepository,
+    StatusQuery,
+)
+from account_wipe import AccountWiper, InMemoryWipeRepository, MongoWipeRepository
+from blob_response import (
+    IMMUTABLE_CACHE_CONTROL,
+    BlobResponse,
+    RangeNotSatisfiable,
+    parse_range,
+)
+from blobs import DIGEST_PATTERN, BlobTooLarge, GridFSBlobStore, LocalBlobStore
+from broker import Broker
+from drag import DragCoalescer
+from entries import InMemoryEntryRepository, MongoEntryRepository, VersionConflict
+from exports import (
+    ExportQueueFull,
+    ExportRunner,
+    InMemoryExportJobRepository,
+    MongoExportJobRepository,
+    export_path,
+)
+from images import (
+    ImageBeingDeleted,
+    InMemoryImageRepository,
+    MongoImageRepository,
+)
+from oplog import (
+    InMemoryOpLogRepository,
+    MongoOpLogRepository,
+    OpLogTrimmed,
+    coalesce_moves,
+)
+from spatial import BBox
+from response_cache import ResponseCache, etag_matches
+from zorder import Rebalancer, key_after, key_before, key_between, rebalance_plan
+from write_behind import WriteBehindClosed, WriteBehindQueueFull, WriteBehindWriter
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Storage engine for status checks: "mongo" or "memory" (no database needed;
+# for benchmarks and single-process local deployments).
+STORAGE_ENGINE = os.environ.get('STORAGE_ENGINE', 'mongo')
+if STORAGE_ENGINE not in ('mongo', 'memory'):
+    raise RuntimeError(f"Unknown STORAGE_ENGINE: {STORAGE_ENGINE}")
+
+# How status check timestamps are stored: "iso" strings (legacy) or "native"
+# BSON datetimes. Run the backfill in migrations.py first: native filters miss
+# string timestamps, so startup fails while any are left.
+TIMESTAMP_STORAGE = os.environ.get('STATUS_TIMESTAMP_STORAGE', 'iso')
+if TIMESTAMP_STORAGE not in ('iso', 'native'):
+    raise RuntimeError(f"Unknown STATUS_TIMESTAMP_STORAGE: {TIMESTAMP_STORAGE}")
+NATIVE_TIMESTAMPS = TIMESTAMP_STORAGE == 'native'
+
+# Where uploaded image bytes go: "local" files under IMAGE_DIR, or "gridfs"
+# (MongoDB engine only). Image metadata follows STORAGE_ENGINE.
+IMAGE_STORAGE = os.environ.get('IMAGE_STORAGE', 'local')
+if IMAGE_STORAGE not in ('local', 'gridfs') or (
+    IMAGE_STORAGE == 'gridfs' and STORAGE_ENGINE != 'mongo'
+):
+    raise RuntimeError(
+        f"Unsupported IMAGE_STORAGE: {IMAGE_STORAGE} "
+        f"with STORAGE_ENGINE={STORAGE_ENGINE}"
+    )
+IMAGE_DIR = Path(os.environ.get('IMAGE_DIR', ROOT_DIR / 'images'))
+# The PRD caps photos at 10MB
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', str(10 * 1024 * 1024)))
+
+# Board exports for print, see exports.py. EXPORT_WORKERS processes render
+# at most; the default leaves half the cores to request handling.
+EXPORT_DIR = Path(os.environ.get('EXPORT_DIR', ROOT_DIR / 'exports'))
+EXPORT_WORKERS = int(
+    os.environ.get('EXPORT_WORKERS', str(max(1, (os.cpu_count() or 2) // 2)))
+)
+EXPORT_MAX_JOBS = int(os.environ.get('EXPORT_MAX_JOBS', '8'))
+# About 1.2GB of raw pixels; the file is written band by band, never held whole
+EXPORT_MAX_PIXELS = int(os.environ.get('EXPORT_MAX_PIXELS', str(400_000_000)))
+# Finished exports are downloadable for a day, then removed
+EXPORT_TTL_SECONDS = float(os.environ.get('EXPORT_TTL_SECONDS', str(24 * 3600)))
+
+# Account wipes delete ACCOUNT_WIPE_BATCH_SIZE items per batch and keep busy
+# at most ACCOUNT_WIPE_DUTY_CYCLE of the time, see account_wipe.py
+ACCOUNT_WIPE_BATCH_SIZE = int(os.environ.get('ACCOUNT_WIPE_BATCH_SIZE', '100'))
+ACCOUNT_WIPE_DUTY_CYCLE = float(os.environ.get('ACCOUNT_WIPE_DUTY_CYCLE', '0.2'))
+if not 0 < ACCOUNT_WIPE_DUTY_CYCLE <= 1:
+    raise RuntimeError(f"ACCOUNT_WIPE_DUTY_CYCLE must be over 0 and at most 1, "
+                       f"not {ACCOUNT_WIPE_DUTY_CYCLE}")
+ACCOUNT_WIPE_LEASE_SECONDS = float(
+    os.environ.get('ACCOUNT_WIPE_LEASE_SECONDS', '60')
+)
+# Account wipes need this as X-Admin-Token; while it is unset, no one can wipe
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Opt-in write-behind for POST /api/status: inserts are acknowledged once
+# queued and written in unordered insert_many batches. A check may therefore
+# not be visible to reads until its batch is flushed (flush interval at most).
+WRITE_BEHIND = os.environ.get('STATUS_WRITE_BEHIND', '0') == '1'
+
+STATUS_STREAM_KEEPALIVE_SECONDS = 15
+
+# Resources owned by the lifespan below. Importing this module creates none of
+# them, so a worker's import cost is code only; they exist between startup
+# and shutdown.
+client = None
+db = None
+status_checks = None
+board_entries = None
+# Per-board op log clients sync from, see oplog.py
+board_ops = None
+image_records = None
+image_blobs = None
+export_jobs = None
+export_runner = None
+account_wipes = None
+account_wiper = None
+status_writer = None
+# Serialized GET /api/status pages, invalidated by every status check write
+status_cache = None
+# Live feed of new status checks for GET /api/status/stream
+status_broker = None
+# Background z_key rebalances, one per board at a time
+z_rebalancer = None
+# Latest drag position per entry, persisted every DRAG_TICK_MS
+drag_coalescer = None
+
+
+def create_mongo_client(*listeners) -> AsyncIOMotorClient:
+    # tz_aware makes native BSON dates come back as aware UTC datetimes,
+    # matching what the models produce. Pool sizes and timeouts come from
+    # MONGO_* variables, see mongo_pool.py.
+    return AsyncIOMotorClient(
+        os.environ['MONGO_URL'],
+        tz_aware=True,
+        event_listeners=[
+            metrics.MongoCommandListener(),
+            metrics.MongoPoolListener(),
+            *listeners,
+        ],
+        **mongo_pool.pool_options_from_env(),
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db, status_checks, board_entries, board_ops
+    global image_records, image_blobs
+    global status_writer, status_cache, status_broker, z_rebalancer, drag_coalescer
+    global export_jobs, export_runner, account_wipes, account_wiper
+
+    pool_connections = None
+    if STORAGE_ENGINE == 'mongo':
+        pool_connections = mongo_pool.ConnectionCounter()
+        client = create_mongo_client(pool_connections)
+        db = client[os.environ['DB_NAME']]
+        status_checks = MongoStatusCheckRepository(db, NATIVE_TIMESTAMPS)
+        board_entries = MongoEntryRepository(db)
+        board_ops = MongoOpLogRepository(
+            db,
+            retention=timedelta(
+                days=float(os.environ.get('OPLOG_RETENTION_DAYS', '30'))
+            ),
+            gap_grace=float(os.environ.get('OPLOG_GAP_GRACE_SECONDS', '5')),
+        )
+        image_records = MongoImageRepository(db)
+        export_jobs = MongoExportJobRepository(db)
+        account_wipes = MongoWipeRepository(db)
+    else:
+        status_checks = InMemoryStatusCheckRepository()
+        board_entries = InMemoryEntryRepository()
+        board_ops = InMemoryOpLogRepository(
+            max_ops=int(os.environ.get('OPLOG_MEMORY_MAX_OPS', '10000'))
+        )
+        image_records = InMemoryImageRepository()
+        export_jobs = InMemoryExportJobRepository()
+        account_wipes = InMemoryWipeRepository()
+    image_blobs = (
+        GridFSBlobStore(db)
+        if IMAGE_STORAGE == 'gridfs'
+        else LocalBlobStore(IMAGE_DIR)
+    )
+    status_cache = ResponseCache(
+        max_entries=int(os.environ.get('STATUS_CACHE_MAX_ENTRIES', '256')),
+        ttl=float(os.environ.get('STATUS_CACHE_TTL_SECONDS', '30')),
+    )
+    # Each subscriber buffers at most STATUS_STREAM_BUFFER checks and drops
+    # the oldest beyond that
+    status_broker = Broker(
+        maxlen=int(os.environ.get('STATUS_STREAM_BUFFER', '100'))
+    )
+    z_rebalancer = Rebalancer(rebalance_z_keys)
+    export_runner = ExportRunner(export_jobs, EXPORT_DIR, workers=EXPORT_WORKERS,
+                                 max_jobs=EXPORT_MAX_JOBS, ttl=EXPORT_TTL_SECONDS)
+    account_wiper = AccountWiper(
+        account_wipes,
+        [("entries", wipe_entries), ("images", wipe_images)],
+        batch_size=ACCOUNT_WIPE_BATCH_SIZE,
+        duty_cycle=ACCOUNT_WIPE_DUTY_CYCLE,
+        lease=ACCOUNT_WIPE_LEASE_SECONDS,
+    )
+    drag_coalescer = DragCoalescer(
+        persist_drags, tick=float(os.environ.get('DRAG_TICK_MS', '100')) / 1000
+    )
+
+    try:
+        # Startup finishes before uvicorn accepts traffic, so the pool is
+        # full by the time the first request arrives
+        if client is not None and client.options.pool_options.min_pool_size:
+            await mongo_pool.warm_up(
+                client,
+                pool_connections,
+                client.options.pool_options.min_pool_size,
+                timeout=float(
+                    os.environ.get('MONGO_WARM_UP_TIMEOUT_SECONDS', '10')
+                ),
+            )
+        await status_checks.setup()
+        await board_entries.setup()
+        await board_ops.setup()
+        await image_records.setup()
+        await export_jobs.setup()
+        await account_wipes.setup()
+        if WRITE_BEHIND:
+            status_writer = WriteBehindWriter(
+                insert_status_check_batch,
+                max_queue=int(
+                    os.environ.get('STATUS_WRITE_BEHIND_MAX_QUEUE', '10000')
+                ),
+                batch_size=int(
+                    os.environ.get('STATUS_WRITE_BEHIND_BATCH_SIZE', '500')
+                ),
+                flush_interval=float(
+                    os.environ.get('STATUS_WRITE_BEHIND_FLUSH_MS', '50')
+                )
+                / 1000,
+                enqueue_timeout=float(
+                    os.environ.get('STATUS_WRITE_BEHIND_ENQUEUE_TIMEOUT_MS', '100')
+                )
+                / 1000,
+            )
+            status_writer.start()
+        drag_coalescer.start()
+        export_runner.start()
+        # Also picks up wipes left unfinished by a process that died
+        account_wiper.start()
+        yield
+    finally:
+        # Drain buffered status checks while the client can still write them
+        if status_writer is not None:
+            await status_writer.close()
+        status_broker.close()
+        # Last positions are written while the repositories are still open
+        await drag_coalescer.close()
+        await z_rebalancer.close()
+        await export_runner.close()
+        await account_wiper.close()
+        await status_checks.close()
+        await board_entries.close()
+        await board_ops.close()
+        await image_records.close()
+        await image_blobs.close()
+        await export_jobs.close()
+        await account_wipes.close()
+        if client is not None:
+            client.close()
+        client = db = status_checks = board_entries = board_ops = image_records = (
+            image_blobs
+        ) = None
+        status_writer = status_cache = status_broker = z_rebalancer = (
+            drag_coalescer
+        ) = None
+        export_jobs = export_runner = account_wipes = account_wiper = None
+
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
+# Board entries (polaroids), per the PRD's entries schema
+boards_router = APIRouter(prefix="/api/boards")
 
 
 # Define Models
@@ -37,6 +341,144 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+status_check_list = TypeAdapter(List[StatusCheck])
+
+class StatusStatsBucket(BaseModel):
+    bucket: datetime
+    client_name: str
+    count: int
+
+class BulkItemError(BaseModel):
+    index: int
+    error: str
+
+class StatusCheckBulkResult(BaseModel):
+    inserted: int
+    failed: List[BulkItemError]
+
+class ImageUpload(BaseModel):
+    digest: str
+    size: int
+    content_type: str
+    url: str
+    deduplicated: bool
+
+class ExportCreate(BaseModel):
+    format: Literal["png", "pdf"] = "png"
+    # Image pixels per board pixel: 1 is the board as seen on screen
+    scale: float = Field(2, gt=0, le=8)
+
+class ExportJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    id: str
+    board_id: str
+    format: Literal["png", "pdf"]
+    scale: float
+    status: Literal["queued", "running", "done", "failed"]
+    # Share of the image's bands written
+    progress: float = 0
+    width: Optional[int] = None
+    height: Optional[int] = None
+    # File size in bytes, once done
+    size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    # When the file and this job are removed
+    expires_at: Optional[datetime] = None
+    url: str
+
+class AccountWipe(BaseModel):
+    user_id: str
+    status: Literal["running", "done"]
+    # The phase in progress: "entries", then "images"
+    phase: Optional[str]
+    # Items deleted so far, per phase
+    deleted: Dict[str, int]
+    # The last batch's failure, retried when the wipe resumes
+    error: Optional[str] = None
+    started_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+EntryColor = Literal["butter", "grass", "mint", "sky"]
+Coordinate = Annotated[float, Field(allow_inf_nan=False)]
+
+class Entry(BaseModel):
+    model_config = ConfigDict(extra="ignore")  # Ignore MongoDB's _id field
+
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    board_id: str
+    user_id: str
+    title: str = Field(min_length=1)
+    commentary: Optional[str] = None
+    color: EntryColor = "butter"
+    image_path: Optional[str] = None
+    x: Coordinate
+    y: Coordinate
+    rotation: Coordinate = 0
+    # Stacking order, see zorder.py; compare as strings
+    z_key: str
+    # Bumped by every change; ops can be made conditional on it
+    version: int = 1
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+
+class EntryCreate(BaseModel):
+    user_id: str
+    title: str = Field(min_length=1)
+    commentary: Optional[str] = None
+    color: EntryColor = "butter"
+    image_path: Optional[str] = None
+    x: Coordinate
+    y: Coordinate
+    rotation: Coordinate = 0
+
+class EntryUpdate(BaseModel):
+    title: Optional[str] = Field(None, min_length=1)
+    commentary: Optional[str] = None
+    color: Optional[EntryColor] = None
+    image_path: Optional[str] = None
+    x: Optional[Coordinate] = None
+    y: Optional[Coordinate] = None
+    rotation: Optional[Coordinate] = None
+
+    @model_validator(mode="after")
+    def check_changes(self):
+        # Only commentary and image_path can be cleared
+        for field in ("title", "color", "x", "y", "rotation"):
+            if field in self.model_fields_set and getattr(self, field) is None:
+                raise ValueError(f"{field} cannot be null")
+        # The spatial index keys on the whole position
+        if ("x" in self.model_fields_set) != ("y" in self.model_fields_set):
+            raise ValueError("x and y must be updated together")
+        return self
+
+
+def status_check_to_doc(status_obj: StatusCheck) -> dict:
+    doc = status_obj.model_dump()
+    # BSON dates have millisecond precision; truncate up front so the object
+    # we return matches what every engine stores (and what cursors point at)
+    status_obj.timestamp = doc['timestamp'] = doc['timestamp'].replace(
+        microsecond=doc['timestamp'].microsecond // 1000 * 1000
+    )
+    return doc
+
+
+def status_checks_written(docs: List[dict]):
+    """Bookkeeping after status checks are stored: response cache, live feed."""
+    if not docs:
+        return
+    status_cache.bump()
+    if status_broker.subscriber_count:
+        for doc in docs:
+            # Encoded once here, shared by every subscriber
+            status_broker.publish((doc['client_name'], doc['id'],
+                                   dump_status_check_line(doc, True).rstrip()))
+
+
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
@@ -47,27 +489,1099 @@ async def create_status_check(input: StatusCheckCreate):
     status_dict = input.model_dump()
     status_obj = StatusCheck(**status_dict)
     
-    # Convert to dict and serialize datetime to ISO string for MongoDB
-    doc = status_obj.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
-    
-    _ = await db.status_checks.insert_one(doc)
+    doc = status_check_to_doc(status_obj)
+    if status_writer is not None:
+        try:
+            await status_writer.submit(doc)
+        except (WriteBehindQueueFull, WriteBehindClosed):
+            raise HTTPException(
+                status_code=503,
+                detail="Status check buffer is full, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+    else:
+        await status_checks.insert(doc)
+        status_checks_written([doc])
     return status_obj
 
+# Status check listings are keyset-paginated on (timestamp, id) so every page
+# is an index range scan, however deep into the history the client is.
+STATUS_PAGE_DEFAULT = 100
+STATUS_PAGE_MAX = 1000
+STATUS_STREAM_BATCH_SIZE = 500
+
+
+def encode_status_cursor(doc: dict) -> str:
+    """Opaque cursor pointing just past ``doc`` in (timestamp, id) order."""
+    timestamp = doc['timestamp']
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat()
+    raw = json.dumps([timestamp, doc['id']], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_status_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, check_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(timestamp, str) or not isinstance(check_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        timestamp = status_stats.as_datetime(timestamp)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return timestamp, check_id
+
+
+def status_check_from_doc(doc: dict) -> dict:
+    # Native timestamps are already datetimes; only legacy rows need parsing
+    if isinstance(doc['timestamp'], str):
+        doc['timestamp'] = datetime.fromisoformat(doc['timestamp'])
+    return doc
+
+
+def parse_status_fields(fields: Optional[str]) -> Optional[tuple]:
+    """``fields=id,timestamp`` as a tuple in model field order; None for all."""
+    if fields is None:
+        return None
+    requested = {field.strip() for field in fields.split(',') if field.strip()}
+    unknown = requested - set(STATUS_FIELDS)
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail="fields must be a comma-separated subset of "
+            + ", ".join(STATUS_FIELDS),
+        )
+    fields = tuple(field for field in STATUS_FIELDS if field in requested)
+    return None if fields == STATUS_FIELDS else fields
+
+
+def only_fields(doc: dict, fields: Optional[tuple]) -> dict:
+    # Repositories also return the keyset fields, which the cursor needs
+    return doc if fields is None else {field: doc[field] for field in fields}
+
+
+async def stream_status_checks(after: Optional[tuple], limit: Optional[int],
+                               query: StatusQuery, fields: Optional[tuple]):
+    fast_json = uses_fast_json("get_status_checks")
+    native = status_checks.native_timestamps
+    async for doc in status_checks.iter_range(
+        after, limit, STATUS_STREAM_BATCH_SIZE, query, fields
+    ):
+        if fast_json:
+            yield dump_status_check_line(only_fields(doc, fields), native)
+        else:
+            check = StatusCheck(**status_check_from_doc(doc))
+            yield check.model_dump_json(
+                include=set(fields) if fields else None
+            ) + "\n"
+
+
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    # Exclude MongoDB's _id field from the query results
-    status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
-    
-    # Convert ISO string timestamps back to datetime objects
-    for check in status_checks:
-        if isinstance(check['timestamp'], str):
-            check['timestamp'] = datetime.fromisoformat(check['timestamp'])
-    
-    return status_checks
+async def get_status_checks(
+    limit: Optional[int] = Query(None, ge=1, le=STATUS_PAGE_MAX),
+    after: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+    client_name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    order: Literal["asc", "desc"] = "asc",
+    if_none_match: Optional[str] = Header(None),
+):
+    position = decode_status_cursor(after) if after is not None else None
+    since = status_stats.as_datetime(since) if since else None
+    until = status_stats.as_datetime(until) if until else None
+    if since and until and since >= until:
+        raise HTTPException(
+            status_code=400, detail="'since' must be before 'until'"
+        )
+    # Filters, order and projection all run in the storage engine, on an index
+    query = StatusQuery(client_name, since, until, order == "desc")
+    fields = parse_status_fields(fields)
+
+    if format == "ndjson":
+        # Without an explicit limit the stream runs to the end of the history
+        return StreamingResponse(
+            stream_status_checks(position, limit, query, fields),
+            media_type="application/x-ndjson",
+        )
+
+    page_size = limit or STATUS_PAGE_DEFAULT
+    cache_key = (page_size, after, query, fields)
+    cached = status_cache.get(cache_key)
+    cache_status = "hit"
+    if cached is None:
+        cache_status = "miss"
+        version = status_cache.version
+        fast_json = uses_fast_json("get_status_checks")
+        # One extra row is fetched to learn whether another page follows.
+        # The validating path needs whole documents and filters on output.
+        checks = await status_checks.fetch_range(position, page_size + 1, query,
+                                                 fields if fast_json else None)
+
+        headers = {}
+        if len(checks) > page_size:
+            checks = checks[:page_size]
+            headers["X-Next-Cursor"] = encode_status_cursor(checks[-1])
+
+        if fast_json:
+            body = dump_status_checks(
+                [only_fields(check, fields) for check in checks],
+                status_checks.native_timestamps,
+            )
+        else:
+            checks = [status_check_from_doc(dict(check)) for check in checks]
+            body = status_check_list.dump_json(
+                status_check_list.validate_python(checks),
+                include={"__all__": set(fields)} if fields else None,
+            )
+        cached = status_cache.put(cache_key, version, body, headers)
+
+    # Clients revalidate every poll; unchanged pages cost neither a query
+    # nor a body
+    headers = {**cached.headers, "ETag": cached.etag, "Cache-Control": "no-cache",
+               # Lets load tests time the query path apart from cache hits
+               "X-Cache": cache_status}
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=cached.body, media_type="application/json", headers=headers
+    )
+
+
+# Bulk ingest validates and writes in chunks, so an NDJSON upload of any size
+# is held in memory one chunk at a time. A JSON array is parsed whole, so its
+# body is capped instead.
+STATUS_BULK_CHUNK_SIZE = 500
+STATUS_BULK_MAX_LINE = 64 * 1024
+STATUS_BULK_MAX_JSON_BYTES = int(
+    os.environ.get('STATUS_BULK_MAX_JSON_BYTES', str(8 * 1024 * 1024))
+)
+NDJSON_MEDIA_TYPES = (
+    "application/x-ndjson",
+    "application/ndjson",
+    "application/jsonl",
+)
+
+
+async def ndjson_lines(request: Request):
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > STATUS_BULK_MAX_LINE:
+            raise HTTPException(status_code=413, detail="NDJSON line too long")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def capped_body(request: Request, limit: int) -> bytes:
+    """The request body, or 413 once it passes ``limit`` bytes."""
+    detail = f"JSON bodies are limited to {limit} bytes; send NDJSON instead"
+    if int(request.headers.get("content-length") or 0) > limit:
+        raise HTTPException(status_code=413, detail=detail)
+    body = bytearray()
+    # Counted as it arrives: the header may be missing or understate the body
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail=detail)
+    return bytes(body)
+
+
+async def bulk_items(request: Request):
+    """Yield raw items from a JSON array or NDJSON request body."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_MEDIA_TYPES:
+        async for line in ndjson_lines(request):
+            yield line
+        return
+
+    try:
+        items = json.loads(await capped_body(request, STATUS_BULK_MAX_JSON_BYTES))
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="Request body is not valid JSON"
+        )
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=422, detail="Expected a JSON array of status checks"
+        )
+    for item in items:
+        yield item
+
+
+def validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'body'}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+async def insert_status_chunk(chunk: List[tuple]) -> tuple:
+    """Insert (index, doc) pairs; returns (written docs, per-item failures)."""
+    docs = [doc for _, doc in chunk]
+    failures = await status_checks.insert_many(docs)
+    failed_positions = {position for position, _ in failures}
+    failed = [
+        BulkItemError(index=chunk[position][0], error=error)
+        for position, error in failures
+    ]
+    written = [
+        doc
+        for position, doc in enumerate(docs)
+        if position not in failed_positions
+    ]
+    return written, failed
+
+
+@api_router.post("/status/bulk", response_model=StatusCheckBulkResult)
+async def create_status_checks_bulk(request: Request):
+    inserted, failed, chunk = 0, [], []
+
+    async def flush():
+        nonlocal inserted
+        written, chunk_failed = await insert_status_chunk(chunk)
+        status_checks_written(written)
+        inserted += len(written)
+        failed.extend(chunk_failed)
+        chunk.clear()
+
+    index = 0
+    async for item in bulk_items(request):
+        try:
+            if isinstance(item, bytes):
+                payload = StatusCheckCreate.model_validate_json(item)
+            else:
+                payload = StatusCheckCreate.model_validate(item)
+        except ValidationError as exc:
+            failed.append(
+                BulkItemError(index=index, error=validation_message(exc))
+            )
+        else:
+            chunk.append(
+                (index, status_check_to_doc(StatusCheck(**payload.model_dump())))
+            )
+            if len(chunk) >= STATUS_BULK_CHUNK_SIZE:
+                await flush()
+        index += 1
+    if chunk:
+        await flush()
+
+    return StatusCheckBulkResult(inserted=inserted, failed=failed)
+
+# Ranges up to this long are grouped from raw checks; longer ones are summed
+# from the minute/hour rollups, except for the partial units at their edges.
+STATUS_STATS_RAW_MAX = timedelta(
+    minutes=float(os.environ.get('STATUS_STATS_RAW_MAX_MINUTES', '60'))
+)
+STATUS_STATS_MAX_BUCKETS = 10000
+
 
-# Include the router in the main app
+@api_router.get("/status/stats", response_model=List[StatusStatsBucket])
+async def get_status_stats(
+    response: Response,
+    bucket: Literal[tuple(status_stats.BUCKETS)] = "1m",
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    client_name: Optional[str] = None,
+):
+    spec = status_stats.BUCKETS[bucket]
+    end = status_stats.as_datetime(to or datetime.now(timezone.utc))
+    start = status_stats.as_datetime(from_) if from_ else end - timedelta(hours=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if (end - start) / spec.width > STATUS_STATS_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400, detail="Too many buckets, use a wider bucket"
+        )
+
+    if end - start <= STATUS_STATS_RAW_MAX:
+        response.headers["X-Stats-Source"] = "raw"
+        return await status_checks.raw_bucket_counts(spec, start, end, client_name)
+    response.headers["X-Stats-Source"] = "rollup"
+    return await status_checks.rollup_bucket_counts(spec, start, end, client_name)
+
+async def status_events(client_name: Optional[str]):
+    subscription = status_broker.subscribe()
+    try:
+        dropped = 0
+        yield b"retry: 2000\n\n"
+        while True:
+            message = await subscription.get(
+                timeout=STATUS_STREAM_KEEPALIVE_SECONDS
+            )
+            if message is None:
+                if subscription.closed:
+                    return
+                # Comment line keeps proxies from timing out an idle stream
+                yield b": keepalive\n\n"
+                continue
+            if subscription.dropped != dropped:
+                yield b"event: dropped\ndata: %d\n\n" % (
+                    subscription.dropped - dropped
+                )
+                dropped = subscription.dropped
+            check_client, check_id, payload = message
+            if client_name is None or check_client == client_name:
+                yield b"id: " + check_id.encode() + b"\ndata: " + payload + b"\n\n"
+    finally:
+        subscription.close()
+
+
+@api_router.get("/status/stream")
+async def stream_status_events(client_name: Optional[str] = None):
+    return StreamingResponse(
+        status_events(client_name),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def image_upload(record: dict, deduplicated: bool) -> ImageUpload:
+    return ImageUpload(
+        digest=record['digest'],
+        size=record['size'],
+        content_type=record['content_type'],
+        url=f"/api/images/{record['digest']}",
+        deduplicated=deduplicated,
+    )
+
+
+@api_router.post("/images", response_model=ImageUpload, status_code=201)
+async def upload_image(
+    request: Request,
+    response: Response,
+    user_id: str,
+    x_content_sha256: Optional[str] = Header(None),
+):
+    """Store the raw request body (``Content-Type: image/*``) under its SHA-256.
+
+    The body is streamed to storage chunk by chunk, never held whole. A client
+    that sends the digest in ``X-Content-SHA256`` skips the transfer entirely
+    when the image is already stored; otherwise duplicates are detected once
+    hashed and the new copy is dropped. 201 for a new image, 200 for a known one,
+    503 while an account wipe is deleting it.
+    """
+    content_type = (
+        request.headers.get("content-type", "").split(";")[0].strip().lower()
+    )
+    if not content_type.startswith("image/"):
+        raise HTTPException(
+            status_code=415,
+            detail="Upload the image bytes with an image/* Content-Type",
+        )
+    if int(request.headers.get("content-length") or 0) > IMAGE_MAX_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Images are limited to {IMAGE_MAX_BYTES} bytes",
+        )
+
+    claimed = x_content_sha256.lower() if x_content_sha256 is not None else None
+    if claimed is not None:
+        if not DIGEST_PATTERN.match(claimed):
+            raise HTTPException(
+                status_code=400, detail="X-Content-SHA256 must be a hex SHA-256"
+            )
+        known = await image_records.get(claimed)
+        if known is not None and await image_blobs.exists(claimed):
+            # Answered without reading the body
+            record = await own_image(
+                claimed, user_id, known['size'], known['content_type']
+            )
+            response.status_code = 200
+            return image_upload(record, deduplicated=True)
+
+    try:
+        digest, size, created = await image_blobs.write(
+            request.stream(), IMAGE_MAX_BYTES
+        )
+    except BlobTooLarge:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Images are limited to {IMAGE_MAX_BYTES} bytes",
+        )
+    if size == 0 or (claimed is not None and digest != claimed):
+        if created:
+            await image_blobs.delete(digest)
+        detail = (
+            "Empty upload" if size == 0 else "Body does not match X-Content-SHA256"
+        )
+        raise HTTPException(status_code=400, detail=detail)
+
+    record = await own_image(digest, user_id, size, content_type)
+    if not created:
+        response.status_code = 200
+    return image_upload(record, deduplicated=not created)
+
+
+async def own_image(
+    digest: str, user_id: str, size: int, content_type: str
+) -> dict:
+    """Add ``user_id`` to the image's owners, or 503 if a wipe is deleting it.
+
+    A wipe may have deleted the bytes and then the record between the upload's
+    look at them and this write, leaving a fresh record over no bytes. So they
+    are checked again once the owner is recorded, which stops any new wipe.
+    """
+    try:
+        record = await image_records.add_owner(
+            digest, user_id, size, content_type
+        )
+        if await image_blobs.exists(digest):
+            return record
+        await release_image(digest, user_id)
+    except ImageBeingDeleted:
+        pass
+    raise HTTPException(
+        status_code=503,
+        detail="The image is being deleted, upload it again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def release_image(digest: str, user_id: str) -> None:
+    """Let go of the image; delete it if no one else holds it."""
+    if await image_records.release(digest, user_id):
+        # The mark stops new owners. Bytes before the record: a crash in
+        # between leaves the mark, so owned_by finds the image again
+        await image_blobs.delete(digest)
+        await image_records.delete(digest, user_id)
+
+
+async def wipe_images(user_id: str, limit: int) -> int:
+    """Let go of up to ``limit`` of the user's images; delete those no one else
+    holds."""
+    digests = await image_records.owned_by(user_id, limit)
+    for digest in digests:
+        await release_image(digest, user_id)
+    return len(digests)
+
+
+@api_router.api_route("/images/{digest}", methods=["GET", "HEAD"])
+async def get_image(
+    request: Request,
+    digest: str,
+    range_header: Optional[str] = Header(None, alias="range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Serve a stored image, whole or one byte range of it.
+
+    The content never changes under its digest, so the digest is the ETag and
+    caches may keep the image forever; revalidation is a 304 without touching
+    the blob store.
+    """
+    record = (
+        await image_records.get(digest) if DIGEST_PATTERN.match(digest) else None
+    )
+    if record is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    etag = f'"{digest}"'
+    headers = {"etag": etag, "cache-control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    size = await image_blobs.size(digest)
+    if size is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    try:
+        # If-Range with another validator asks for the whole image instead
+        byte_range = (
+            parse_range(range_header, size) if if_range in (None, etag) else None
+        )
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=416,
+            headers={**headers, "content-range": f"bytes */{size}"},
+        )
+    return BlobResponse(
+        image_blobs,
+        digest,
+        size,
+        record['content_type'],
+        byte_range,
+        headers=headers,
+        send_body=request.method != "HEAD",
+    )
+
+@api_router.get("/health/pool")
+async def get_pool_stats():
+    if client is None:
+        raise HTTPException(
+            status_code=404, detail="No MongoDB client with the memory engine"
+        )
+    return mongo_pool.pool_stats(client)
+
+class EntrySummary(BaseModel):
+    id: str
+    title: str
+    color: EntryColor
+    image_path: Optional[str] = None
+    z_key: str
+
+class BoardTile(BaseModel):
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    count: int
+    color: EntryColor
+    representative: EntrySummary
+
+class BoardView(BaseModel):
+    clustered: bool
+    tile_size: Optional[int] = None
+    tiles: List[BoardTile] = []
+    entries: List[Entry] = []
+
+
+# Below BOARD_CLUSTER_ZOOM the board view returns cluster tiles instead of
+# entries, picking the finest tile level whose tiles are at least
+# CLUSTER_TILE_SCREEN_PX wide on screen.
+BOARD_CLUSTER_ZOOM = float(os.environ.get('BOARD_CLUSTER_ZOOM', '0.35'))
+CLUSTER_TILE_SCREEN_PX = 192
+CLUSTER_MAX_TILES = 1024
+
+# A z_key longer than this schedules a rebalance of its board's keys
+Z_KEY_MAX_LENGTH = int(os.environ.get('Z_KEY_MAX_LENGTH', '16'))
+
+
+def parse_bbox(bbox: str) -> BBox:
+    try:
+        x0, y0, x1, y1 = (float(value) for value in bbox.split(','))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be x0,y0,x1,y1")
+    box = BBox(x0, y0, x1, y1)
+    if not all(map(math.isfinite, box)) or x0 > x1 or y0 > y1:
+        raise HTTPException(
+            status_code=400,
+            detail="bbox must be x0,y0,x1,y1 with x0 <= x1 and y0 <= y1",
+        )
+    return box
+
+
+def entry_to_doc(entry: Entry) -> dict:
+    doc = entry.model_dump()
+    # Millisecond precision, as for status checks
+    entry.created_at = doc['created_at'] = doc['created_at'].replace(
+        microsecond=doc['created_at'].microsecond // 1000 * 1000
+    )
+    return doc
+
+
+@boards_router.post("/{board_id}/entries", response_model=Entry)
+async def create_entry(board_id: str, input: EntryCreate):
+    # New entries go on top
+    z_key = key_after(await board_entries.edge_z_key(board_id, top=True))
+    if len(z_key) > Z_KEY_MAX_LENGTH:
+        z_rebalancer.schedule(board_id)
+    entry = Entry(board_id=board_id, z_key=z_key, **input.model_dump())
+    doc = entry_to_doc(entry)
+    await board_entries.insert(doc)
+    changes = {
+        field: value
+        for field, value in doc.items()
+        if field not in ("id", "board_id", "version")
+    }
+    await board_ops.append(
+        board_id, [logged_op("create", entry.id, entry.version, changes)]
+    )
+    return entry
+
+@boards_router.get("/{board_id}/entries", response_model=List[Entry])
+async def get_entries_in_viewport(board_id: str, bbox: str):
+    """Entries whose footprint intersects the viewport ``bbox=x0,y0,x1,y1``."""
+    return await board_entries.in_bbox(board_id, parse_bbox(bbox))
+
+
+@boards_router.get("/{board_id}/view", response_model=BoardView)
+async def get_board_view(
+    board_id: str, bbox: str, zoom: float = Query(..., gt=0, le=3)
+):
+    """What to draw for a viewport at ``zoom``: entries, or clusters zoomed out."""
+    viewport = parse_bbox(bbox)
+    if zoom >= BOARD_CLUSTER_ZOOM:
+        return BoardView(
+            clustered=False,
+            entries=await board_entries.in_bbox(board_id, viewport),
+        )
+
+    level = clusters.choose_level(
+        viewport, zoom, CLUSTER_TILE_SCREEN_PX, CLUSTER_MAX_TILES
+    )
+    if level is None:
+        raise HTTPException(
+            status_code=400, detail="bbox is too large for the coarsest tiles"
+        )
+    areas = clusters.tiles_in(viewport, level)
+    tiles = [
+        BoardTile(
+            **areas[tile["tile"]]._asdict(),
+            count=tile["count"],
+            color=clusters.dominant_color(tile["colors"]),
+            representative=tile["rep"],
+        )
+        for tile in await board_entries.tiles(board_id, level, areas)
+    ]
+    return BoardView(
+        clustered=True, tile_size=clusters.tile_size(level), tiles=tiles
+    )
+
+
+@boards_router.get("/{board_id}/entries/{entry_id}", response_model=Entry)
+async def get_entry(board_id: str, entry_id: str):
+    doc = await board_entries.get(board_id, entry_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    return doc
+
+@boards_router.patch("/{board_id}/entries/{entry_id}", response_model=Entry)
+async def update_entry(board_id: str, entry_id: str, input: EntryUpdate):
+    changes = input.model_dump(exclude_unset=True)
+    doc = await (board_entries.update(board_id, entry_id, changes) if changes
+                 else board_entries.get(board_id, entry_id))
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    if changes:
+        await board_ops.append(
+            board_id, [logged_op("update", entry_id, doc['version'], changes)]
+        )
+    return doc
+
+@boards_router.delete("/{board_id}/entries/{entry_id}", status_code=204)
+async def delete_entry(board_id: str, entry_id: str):
+    if not await board_entries.delete(board_id, entry_id):
+        raise HTTPException(status_code=404, detail="Entry not found")
+    await board_ops.append(board_id, [logged_op("delete", entry_id, None, {})])
+    return Response(status_code=204)
+
+
+@boards_router.post(
+    "/{board_id}/exports", response_model=ExportJob, status_code=202
+)
+async def create_export(board_id: str, input: ExportCreate):
+    """Start rendering the whole board to PNG or PDF; poll the job for progress.
+
+    The entries are read now, so later changes are not in the export.
+    """
+    entries = await board_entries.stacked(board_id)
+    if not entries:
+        raise HTTPException(status_code=400, detail="Board has no entries")
+    width, height = render.image_size(render.board_bounds(entries), input.scale)
+    if width * height > EXPORT_MAX_PIXELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{width}x{height} pixels is over {EXPORT_MAX_PIXELS}, "
+            "export at a lower scale",
+        )
+    job_id = str(uuid.uuid4())
+    created_at = datetime.now(timezone.utc)
+    job = {
+        "id": job_id,
+        "board_id": board_id,
+        **input.model_dump(),
+        "status": "queued",
+        "progress": 0,
+        "created_at": created_at,
+        "expires_at": export_runner.expires_at(created_at),
+        "url": f"/api/exports/{job_id}/download",
+    }
+    # Stored before its render starts, which updates it
+    await export_jobs.create(job)
+    try:
+        export_runner.submit(job, entries)
+    except ExportQueueFull:
+        await export_jobs.update(
+            job_id,
+            {
+                "status": "failed",
+                "error": "Too many exports in progress",
+                "finished_at": datetime.now(timezone.utc),
+            },
+        )
+        raise HTTPException(
+            status_code=503,
+            detail="Too many exports in progress, retry shortly",
+            headers={"Retry-After": "30"},
+        )
+    return job
+
+@api_router.get("/exports/{job_id}", response_model=ExportJob)
+async def get_export(job_id: str):
+    job = await export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+@api_router.get("/exports/{job_id}/download")
+async def download_export(job_id: str):
+    job = await export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if job['status'] != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+    return FileResponse(
+        export_path(EXPORT_DIR, job),
+        media_type=render.ENCODERS[job['format']].media_type,
+        filename=f"board-{job['board_id']}.{job['format']}",
+    )
+
+
+async def wipe_entries(user_id: str, limit: int) -> int:
+    """Delete up to ``limit`` of the user's entries, logging deletes for sync."""
+    deleted = defaultdict(list)
+    owned = await board_entries.owned_by(user_id, limit)
+    for board_id, entry_id in owned:
+        if await board_entries.delete(board_id, entry_id):
+            deleted[board_id].append(
+                logged_op("delete", entry_id, None, {}, "account_wipe")
+            )
+    for board_id, ops in deleted.items():
+        await board_ops.append(board_id, ops)
+    return len(owned)
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Let through only requests carrying ``ADMIN_TOKEN``."""
+    if x_admin_token is None:
+        raise HTTPException(status_code=401, detail="X-Admin-Token required")
+    if not ADMIN_TOKEN or not hmac.compare_digest(
+            x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@api_router.delete("/users/{user_id}", response_model=AccountWipe, status_code=202,
+                   dependencies=[Depends(require_admin)])
+async def wipe_account(user_id: str):
+    """Delete all of the user's entries and images, in the background.
+
+    Poll ``/api/users/{user_id}/wipe`` for progress. Asking again while a wipe
+    runs returns that wipe. The auth record is deleted with the auth provider.
+    """
+    return await account_wiper.request(user_id)
+
+@api_router.get("/users/{user_id}/wipe", response_model=AccountWipe,
+                dependencies=[Depends(require_admin)])
+async def get_account_wipe(user_id: str):
+    wipe = await account_wipes.get(user_id)
+    if wipe is None:
+        raise HTTPException(
+            status_code=404, detail="No wipe requested for this user"
+        )
+    return wipe
+
+
+# Query terms accepted per search; each is one index range to scan
+SEARCH_MAX_TERMS = 8
+
+@api_router.get("/search", response_model=List[Entry])
+async def search_entries(
+    user_id: str,
+    q: str = Query(..., max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """The user's entries whose title or commentary has a word starting with
+    each word of ``q``, newest first, on every board. Case and accents are
+    ignored, so partial input works for autocomplete."""
+    prefixes = search.terms(q)
+    if not prefixes:
+        raise HTTPException(status_code=400, detail="q must contain a word")
+    if len(prefixes) > SEARCH_MAX_TERMS:
+        raise HTTPException(
+            status_code=400, detail=f"q is limited to {SEARCH_MAX_TERMS} words"
+        )
+    return await board_entries.search(user_id, prefixes, limit)
+
+
+class MoveOp(BaseModel):
+    op: Literal["move"]
+    id: str
+    x: Coordinate
+    y: Coordinate
+    base_version: Optional[int] = None
+
+class RecolorOp(BaseModel):
+    op: Literal["recolor"]
+    id: str
+    color: EntryColor
+    base_version: Optional[int] = None
+
+class ZOrderOp(BaseModel):
+    """Raise or lower an entry: to the front or back, or next to another."""
+    op: Literal["z_order"]
+    id: str
+    to: Optional[Literal["front", "back"]] = None
+    above: Optional[str] = None
+    below: Optional[str] = None
+    base_version: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_placement(self):
+        if (
+            sum(place is not None for place in (self.to, self.above, self.below))
+            != 1
+        ):
+            raise ValueError("exactly one of to, above and below is required")
+        if self.id in (self.above, self.below):
+            raise ValueError("an entry cannot be placed relative to itself")
+        return self
+
+class DeleteOp(BaseModel):
+    op: Literal["delete"]
+    id: str
+    base_version: Optional[int] = None
+
+BoardOp = Annotated[
+    Union[MoveOp, RecolorOp, ZOrderOp, DeleteOp], Field(discriminator="op")
+]
+
+# Ops accepted per batch
+OPLOG_MAX_BATCH = 500
+
+class OpBatch(BaseModel):
+    # Echoed back as each logged op's origin, so a client can skip its own ops
+    client_id: Optional[str] = None
+    ops: List[BoardOp] = Field(min_length=1, max_length=OPLOG_MAX_BATCH)
+
+class OpResult(BaseModel):
+    status: Literal["applied", "conflict", "not_found"]
+    # The log position and entry version the op produced, when applied
+    seq: Optional[int] = None
+    version: Optional[int] = None
+    # The entry as it is now, on conflict
+    entry: Optional[Entry] = None
+
+class OpBatchResult(BaseModel):
+    # One per submitted op, in order; coalesced moves share their run's result
+    results: List[OpResult]
+
+class LoggedOp(BaseModel):
+    seq: int
+    op: Literal[
+        "create", "update", "move", "recolor", "z_order", "delete", "z_rebalance"
+    ]
+    # None for z_rebalance, whose changes are {"z_keys": {id: z_key}}
+    id: Optional[str]
+    # The entry's version after the op; None for deletes and z_rebalance
+    version: Optional[int]
+    changes: dict
+    origin: Optional[str] = None
+    at: datetime
+
+class OpLogPage(BaseModel):
+    ops: List[LoggedOp]
+    # Pass back as ``since`` to continue from here
+    position: int
+    more: bool
+
+
+def logged_op(
+    op: str,
+    entry_id: Optional[str],
+    version: Optional[int],
+    changes: dict,
+    origin: Optional[str] = None,
+) -> dict:
+    return {
+        "op": op,
+        "id": entry_id,
+        "version": version,
+        "changes": changes,
+        "origin": origin,
+    }
+
+
+async def z_key_for(board_id: str, op: dict) -> Optional[str]:
+    """The key that puts the op's entry where it asks; None if the entry it is
+    placed against does not exist. Two index lookups at most."""
+    if op['to'] is not None:
+        front = op['to'] == "front"
+        edge = await board_entries.edge_z_key(board_id, top=front)
+        return key_after(edge) if front else key_before(edge)
+    reference = await board_entries.get(board_id, op['above'] or op['below'])
+    if reference is None:
+        return None
+    above = op['above'] is not None
+    neighbour = await board_entries.next_z_key(
+        board_id, reference['z_key'], above=above
+    )
+    if above:
+        return key_between(reference['z_key'], neighbour)
+    return key_between(neighbour, reference['z_key'])
+
+
+async def op_changes(board_id: str, op: dict) -> Optional[dict]:
+    if op['op'] == "move":
+        return {"x": op['x'], "y": op['y']}
+    if op['op'] == "recolor":
+        return {"color": op['color']}
+    z_key = await z_key_for(board_id, op)
+    if z_key is None:
+        return None
+    if len(z_key) > Z_KEY_MAX_LENGTH:
+        z_rebalancer.schedule(board_id)
+    return {"z_key": z_key}
+
+
+async def rebalance_z_keys(board_id: str) -> None:
+    """Respace the board's z_keys and log the new keys as one op."""
+    moves = rebalance_plan(await board_entries.z_order(board_id))
+    rekeyed = set(await board_entries.rekey(board_id, moves))
+    if rekeyed:
+        keys = {entry_id: new for entry_id, _, new in moves if entry_id in rekeyed}
+        await board_ops.append(
+            board_id, [logged_op("z_rebalance", None, None, {"z_keys": keys})]
+        )
+        logger.info("Rebalanced %d z-order keys on board %s", len(keys), board_id)
+
+
+@boards_router.post("/{board_id}/ops", response_model=OpBatchResult)
+async def apply_ops(board_id: str, batch: OpBatch):
+    """Apply a batch of ops in order; append the applied ones to the op log.
+
+    Consecutive moves of an entry are coalesced first, so a drag's intermediate
+    positions cost neither entry writes nor log space. An op with
+    ``base_version`` applies only if the entry is still at that version;
+    otherwise it is reported as a conflict along with the current entry. Ops
+    are applied one by one, not as a transaction.
+    """
+    results: List[Optional[OpResult]] = [None] * len(batch.ops)
+    applied = []
+    for op, positions in coalesce_moves([op.model_dump() for op in batch.ops]):
+        try:
+            if op['op'] == "delete":
+                found = await board_entries.delete(
+                    board_id, op['id'], op['base_version']
+                )
+                doc, changes = None, {}
+            else:
+                changes = await op_changes(board_id, op)
+                doc = (
+                    await board_entries.update(
+                        board_id, op['id'], changes, op['base_version']
+                    )
+                    if changes is not None
+                    else None
+                )
+                found = doc is not None
+        except VersionConflict as conflict:
+            result = OpResult(status="conflict", entry=conflict.current)
+        else:
+            if found:
+                result = OpResult(
+                    status="applied", version=doc['version'] if doc else None
+                )
+                applied.append(
+                    (
+                        result,
+                        logged_op(
+                            op['op'],
+                            op['id'],
+                            result.version,
+                            changes,
+                            batch.client_id,
+                        ),
+                    )
+                )
+            else:
+                result = OpResult(status="not_found")
+        for position in positions:
+            results[position] = result
+
+    if applied:
+        logged = await board_ops.append(board_id, [op for _, op in applied])
+        for (result, _), op in zip(applied, logged):
+            result.seq = op['seq']
+    return OpBatchResult(results=results)
+
+
+@boards_router.get("/{board_id}/ops", response_model=OpLogPage)
+async def get_ops(
+    board_id: str,
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+):
+    """Ops logged after position ``since`` (0 for the beginning of the log).
+
+    410 when ops after ``since`` are no longer kept. The response's
+    ``position`` is the current head: the client reloads the board, then
+    syncs from there, skipping ops for entry versions it already has.
+    """
+    try:
+        ops, more = await board_ops.since(board_id, since, limit)
+    except OpLogTrimmed:
+        return JSONResponse(status_code=410, content={
+            "detail": "Sync position is too old, reload the board",
+            "position": await board_ops.head(board_id),
+        })
+    return OpLogPage(ops=ops, position=ops[-1]['seq'] if ops else since, more=more)
+
+
+class DragMove(BaseModel):
+    id: str
+    x: Coordinate
+    y: Coordinate
+
+# One move or a list of them per WebSocket message
+drag_message = TypeAdapter(Union[DragMove, List[DragMove]])
+
+
+async def persist_drags(board_id: str, positions: dict) -> int:
+    """Write one tick's drag positions and log them as one batch of move ops."""
+    logged = []
+    for entry_id, (x, y) in positions.items():
+        changes = {"x": x, "y": y}
+        doc = await board_entries.update(board_id, entry_id, changes)
+        # Entries deleted mid-drag, or ids that never existed, are dropped
+        if doc is not None:
+            logged.append(
+                logged_op("move", entry_id, doc['version'], changes, "drag")
+            )
+    if logged:
+        await board_ops.append(board_id, logged)
+    return len(logged)
+
+@boards_router.websocket("/{board_id}/drag")
+async def drag_updates(websocket: WebSocket, board_id: str):
+    """High-frequency drag positions: ``{"id", "x", "y"}``, or a list of them,
+    per message.
+
+    Nothing is written per message. Only the latest position per entry is
+    kept and persisted on the next tick, and appears in the op log as a
+    ``move`` with origin ``drag``. Malformed messages get an ``{"error"}``
+    reply and the connection stays open.
+    """
+    await websocket.accept()
+    metrics.drag_connections.inc()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                moves = drag_message.validate_json(message)
+            except ValidationError as exc:
+                await websocket.send_json({"error": validation_message(exc)})
+                continue
+            for move in moves if isinstance(moves, list) else (moves,):
+                drag_coalescer.move(board_id, move.id, move.x, move.y)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        metrics.drag_connections.dec()
+
+# Include the routers in the main app
 app.include_router(api_router)
+app.include_router(boards_router)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(
+        metrics.registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
 
 app.add_middleware(
     CORSMiddleware,
@@ -75,8 +1589,12 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# Added last so it is outermost and its timings include CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -84,6 +1602,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+async def insert_status_check_batch(docs: List[dict]):
+    failures = await status_checks.insert_many(docs)
+    if failures:
+        # Unordered: everything except the reported documents was written
+        logger.error(
+            "Dropped %d status checks in write-behind batch, first error: %s",
+            len(failures),
+            failures[0][1],
+        )
+        failed_positions = {position for position, _ in failures}
+        docs = [
+            doc
+            for position, doc in enumerate(docs)
+            if position not in failed_positions
+        ]
+    status_checks_written(docs)
@@ -0,0 +1,109 @@
+"""
+Quadtree cell keys for board positions.
+
+The canvas is divided into a quadtree over a fixed square world. Every
+position falls in one leaf cell, and leaves are numbered along a Morton
+(Z-order) curve, so each quadtree node at any level owns one contiguous range
+of leaf codes. A rectangle is answered by covering it with a few nodes and
+scanning their code ranges on an ordinary ``(board_id, cell)`` index. Both
+storage engines use this, so the index needs nothing Mongo-specific.
+"""
+from typing import List, NamedTuple, Tuple
+
+# World square, in canvas pixels. The PRD board is 5000x5000, but entries
+# can be dragged past its edge, so the world is far larger; positions outside
+# it are clamped into the border cells, which stays correct because matches
+# are always checked against real coordinates.
+WORLD_MIN = -(2 ** 20)
+WORLD_SIZE = 2 ** 21
+# Leaf level: 2**21 / 2**14 = 128 px cells, about one polaroid
+DEPTH = 14
+LEAF_SIZE = WORLD_SIZE >> DEPTH
+
+# Morton code range [start, stop)
+CellRange = Tuple[int, int]
+
+
+class BBox(NamedTuple):
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+    def intersects(self, other: "BBox") -> bool:
+        return (self.x0 <= other.x1 and other.x0 <= self.x1
+                and self.y0 <= other.y1 and other.y0 <= self.y1)
+
+
+def _spread(value: int) -> int:
+    """Put a zero bit between each of the low 16 bits of ``value``."""
+    value &= 0xFFFF
+    value = (value | (value << 8)) & 0x00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F
+    value = (value | (value << 2)) & 0x33333333
+    value = (value | (value << 1)) & 0x55555555
+    return value
+
+
+def morton(ix: int, iy: int) -> int:
+    return _spread(ix) | (_spread(iy) << 1)
+
+
+def node_index(coordinate: float, level: int = DEPTH) -> int:
+    """Column (or row) of the node on ``level`` containing ``coordinate``."""
+    index = int((coordinate - WORLD_MIN) // (WORLD_SIZE >> level))
+    return min(max(index, 0), (1 << level) - 1)
+
+
+def cell_of(x: float, y: float) -> int:
+    """Leaf cell code for a position."""
+    return morton(node_index(x), node_index(y))
+
+
+def node_range(level: int, ix: int, iy: int) -> CellRange:
+    """Leaf codes under the node at (ix, iy) on ``level``."""
+    shift = 2 * (DEPTH - level)
+    code = morton(ix, iy)
+    return code << shift, (code + 1) << shift
+
+
+def node_bbox(level: int, ix: int, iy: int) -> BBox:
+    size = WORLD_SIZE >> level
+    x0, y0 = WORLD_MIN + ix * size, WORLD_MIN + iy * size
+    return BBox(x0, y0, x0 + size, y0 + size)
+
+
+def covering(bbox: BBox, max_ranges: int = 32) -> List[CellRange]:
+    """Sorted, merged leaf code ranges covering every position in ``bbox``.
+
+    Descends level by level, keeping nodes that overlap the box. Once the
+    next level would need more than ``max_ranges`` nodes it stops refining,
+    trading a little over-coverage for fewer index scans.
+    """
+    # Leaf indexes the box spans; clamping also handles boxes outside the world
+    low_x, high_x = node_index(bbox.x0), node_index(bbox.x1)
+    low_y, high_y = node_index(bbox.y0), node_index(bbox.y1)
+
+    level, nodes = 0, [(0, 0)]
+    while level < DEPTH:
+        shift = DEPTH - level - 1
+        children = [
+            (cx, cy)
+            for ix, iy in nodes
+            for cx in (2 * ix, 2 * ix + 1)
+            if low_x >> shift <= cx <= high_x >> shift
+            for cy in (2 * iy, 2 * iy + 1)
+            if low_y >> shift <= cy <= high_y >> shift
+        ]
+        if len(children) > max_ranges:
+            break
+        level, nodes = level + 1, children
+
+    ranges = sorted(node_range(level, ix, iy) for ix, iy in nodes)
+    merged = [ranges[0]]
+    for start, stop in ranges[1:]:
+        if start == merged[-1][1]:
+            merged[-1] = (merged[-1][0], stop)
+        else:
+            merged.append((start, stop))
+    return merged
@@ -0,0 +1,178 @@
+"""
+Status check counts per client per time bucket.
+
+Short ranges are grouped straight from ``status_checks``. Longer ranges read
+``status_check_rollups``, which holds one counter per (unit, bucket,
+client_name) for minute and hour buckets and is incremented on every insert,
+so their cost depends on the number of buckets rather than the number of
+checks. Only the whole rollup units in a range are read that way; the partial
+units at its edges are counted from the checks, so both paths count exactly
+the checks in ``[from, to)``. ``migrations.py backfill-status-rollups`` builds
+the rollups for checks written before they existed.
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+
+class BucketSpec(NamedTuple):
+    unit: str  # $dateTrunc unit
+    bin_size: int
+    width: timedelta
+    rollup_unit: str  # rollup granularity the bucket is summed from
+
+
+BUCKETS = {
+    "1m": BucketSpec("minute", 1, timedelta(minutes=1), "minute"),
+    "5m": BucketSpec("minute", 5, timedelta(minutes=5), "minute"),
+    "15m": BucketSpec("minute", 15, timedelta(minutes=15), "minute"),
+    "1h": BucketSpec("hour", 1, timedelta(hours=1), "hour"),
+    "1d": BucketSpec("day", 1, timedelta(days=1), "hour"),
+}
+ROLLUP_UNITS = ("minute", "hour")
+ROLLUP_WIDTHS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1)}
+
+ROLLUP_INDEXES = [
+    IndexModel(
+        [("unit", ASCENDING), ("bucket", ASCENDING), ("client_name", ASCENDING)],
+        unique=True,
+        name="unit_bucket_client_name",
+    ),
+    IndexModel(
+        [("unit", ASCENDING), ("client_name", ASCENDING), ("bucket", ASCENDING)],
+        name="unit_client_name_bucket",
+    ),
+]
+
+
+def truncate(timestamp: datetime, unit: str) -> datetime:
+    if unit == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def whole_units(start: datetime, end: datetime,
+                unit: str) -> Tuple[datetime, datetime]:
+    """(low, high): the whole ``unit``s within ``[start, end)``, none if
+    low >= high."""
+    low = truncate(start, unit)
+    if low < start:
+        low += ROLLUP_WIDTHS[unit]
+    return low, truncate(end, unit)
+
+
+def merge_rows(parts: Iterable[List[dict]]) -> List[dict]:
+    """Sum bucket count rows from several sources, per bucket and client."""
+    counts = Counter()
+    for rows in parts:
+        for row in rows:
+            counts[(row["bucket"], row["client_name"])] += row["count"]
+    return [
+        {"bucket": bucket, "client_name": client_name, "count": count}
+        for (bucket, client_name), count in sorted(counts.items())
+    ]
+
+
+def as_datetime(timestamp) -> datetime:
+    """``timestamp`` (a datetime or ISO string) in UTC; naive means UTC.
+
+    Stored ISO strings are all UTC, so bounds only compare correctly as text in
+    UTC, and buckets only line up with the rollups when truncated in UTC.
+    """
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def rollup_updates(docs: Iterable[dict]) -> List[UpdateOne]:
+    """Coalesce inserted status check documents into rollup increments."""
+    counts = Counter()
+    for doc in docs:
+        timestamp = as_datetime(doc["timestamp"])
+        for unit in ROLLUP_UNITS:
+            counts[(unit, truncate(timestamp, unit), doc["client_name"])] += 1
+    return [
+        UpdateOne({"unit": unit, "bucket": bucket, "client_name": client_name},
+                  {"$inc": {"count": count}}, upsert=True)
+        for (unit, bucket, client_name), count in counts.items()
+    ]
+
+
+async def record_rollups(db, docs: Iterable[dict]) -> None:
+    updates = rollup_updates(docs)
+    if updates:
+        await db.status_check_rollups.bulk_write(updates, ordered=False)
+
+
+def _group_stages(date_expr, spec: BucketSpec, count_expr) -> list:
+    return [
+        {"$group": {
+            "_id": {
+                "bucket": {"$dateTrunc": {"date": date_expr, "unit": spec.unit,
+                                          "binSize": spec.bin_size}},
+                "client_name": "$client_name",
+            },
+            "count": {"$sum": count_expr},
+        }},
+        {"$sort": {"_id.bucket": 1, "_id.client_name": 1}},
+        {"$project": {"_id": 0, "bucket": "$_id.bucket",
+                      "client_name": "$_id.client_name", "count": 1}},
+    ]
+
+
+def raw_pipeline(spec: BucketSpec, start: datetime, end: datetime,
+                 client_name: Optional[str], native_timestamps: bool) -> list:
+    # Bounds must compare against the stored representation to use the index
+    bounds = (
+        (start, end) if native_timestamps else (start.isoformat(), end.isoformat())
+    )
+    match = {"timestamp": {"$gte": bounds[0], "$lt": bounds[1]}}
+    if client_name is not None:
+        match["client_name"] = client_name
+    date_expr = "$timestamp" if native_timestamps else {"$toDate": "$timestamp"}
+    return [{"$match": match}] + _group_stages(date_expr, spec, 1)
+
+
+def rollup_pipeline(spec: BucketSpec, start: datetime, end: datetime,
+                    client_name: Optional[str]) -> list:
+    # start and end fall on rollup unit boundaries, see whole_units
+    match = {"unit": spec.rollup_unit, "bucket": {"$gte": start, "$lt": end}}
+    if client_name is not None:
+        match["client_name"] = client_name
+    return [{"$match": match}] + _group_stages("$bucket", spec, "$count")
+
+
+def rollup_rebuild_pipeline(unit: str, date_expr) -> list:
+    """Recompute every rollup of ``unit`` from status_checks, via $merge."""
+    return [
+        {
+            "$group": {
+                "_id": {
+                    "bucket": {"$dateTrunc": {"date": date_expr, "unit": unit}},
+                    "client_name": "$client_name",
+                },
+                "count": {"$sum": 1},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "unit": {"$literal": unit},
+                "bucket": "$_id.bucket",
+                "client_name": "$_id.client_name",
+                "count": 1,
+            }
+        },
+        {
+            "$merge": {
+                "into": "status_check_rollups",
+                "on": ["unit", "bucket", "client_name"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
@@ -0,0 +1,471 @@
+"""
+Storage engines for status checks.
+
+Routes talk to a ``StatusCheckRepository`` instead of a Motor collection, so
+the API can run (and be profiled) against MongoDB or entirely in memory.
+``STORAGE_ENGINE`` selects the engine: ``mongo`` (default) or ``memory``.
+
+Documents passed in carry a timezone-aware ``timestamp`` datetime. Documents
+handed back are in the engine's stored form; ``native_timestamps`` says
+whether their timestamps are datetimes or legacy ISO strings.
+"""
+import abc
+import bisect
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import BulkWriteError
+
+import status_stats
+from serialization import STATUS_CHECK_PROJECTION
+
+# A keyset position: the (timestamp, id) of the last row a client has seen
+Position = Tuple[datetime, str]
+# (position in the inserted batch, error message)
+WriteFailure = Tuple[int, str]
+
+
+class StatusQuery(NamedTuple):
+    """Which status checks a listing covers, and in which direction."""
+    client_name: Optional[str] = None
+    start: Optional[datetime] = None  # inclusive
+    end: Optional[datetime] = None  # exclusive
+    descending: bool = False
+
+
+ALL_STATUS_CHECKS = StatusQuery()
+
+STATUS_FIELDS = ("id", "client_name", "timestamp")
+# Always read, whatever fields were asked for, so a page can name its cursor
+KEYSET_FIELDS = ("timestamp", "id")
+
+# Indexes every query on status_checks relies on. They are created at startup;
+# create_indexes is a no-op for indexes that already exist with the same spec.
+STATUS_CHECK_INDEXES = [
+    IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+    # Serves timestamp range queries and the (timestamp, id) keyset sort
+    IndexModel([("timestamp", ASCENDING), ("id", ASCENDING)], name="timestamp_id"),
+    # Serves one client's listings in keyset order, and its stats ranges
+    IndexModel(
+        [("client_name", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)],
+        name="client_name_timestamp_id",
+    ),
+]
+STATUS_SORT = [("timestamp", 1), ("id", 1)]
+STATUS_SORT_DESCENDING = [("timestamp", -1), ("id", -1)]
+
+
+class StatusCheckRepository(abc.ABC):
+    native_timestamps = True
+
+    async def setup(self) -> None:
+        """Create the indexes behind listings and stats, and the rollups' unique
+        key; the memory engine keeps its own sorted keys instead."""
+
+    async def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def insert(self, doc: dict) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def insert_many(self, docs: List[dict]) -> List[WriteFailure]:
+        """Unordered insert; returns (position, error) per document not written."""
+
+    @abc.abstractmethod
+    def iter_range(
+        self,
+        after: Optional[Position] = None,
+        limit: Optional[int] = None,
+        batch_size: int = 500,
+        query: StatusQuery = ALL_STATUS_CHECKS,
+        fields: Optional[Sequence[str]] = None,
+    ) -> AsyncIterator[dict]:
+        """Checks matching ``query`` in (timestamp, id) order, from just past
+        ``after``.
+
+        With ``fields``, documents hold those fields plus the keyset fields.
+        """
+
+    @abc.abstractmethod
+    async def fetch_range(self, after: Optional[Position], limit: int,
+                          query: StatusQuery = ALL_STATUS_CHECKS,
+                          fields: Optional[Sequence[str]] = None) -> List[dict]:
+        ...
+
+    @abc.abstractmethod
+    async def count(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        client_name: Optional[str] = None,
+    ) -> int:
+        ...
+
+    @abc.abstractmethod
+    async def raw_bucket_counts(
+        self,
+        spec: status_stats.BucketSpec,
+        start: datetime,
+        end: datetime,
+        client_name: Optional[str],
+    ) -> List[dict]:
+        """Per-bucket counts computed from the checks themselves."""
+
+    @abc.abstractmethod
+    async def summed_rollup_counts(
+        self,
+        spec: status_stats.BucketSpec,
+        start: datetime,
+        end: datetime,
+        client_name: Optional[str],
+    ) -> List[dict]:
+        """Per-bucket counts summed from the incrementally maintained rollups.
+
+        ``start`` and ``end`` fall on boundaries of ``spec.rollup_unit``.
+        """
+
+    async def rollup_bucket_counts(
+        self,
+        spec: status_stats.BucketSpec,
+        start: datetime,
+        end: datetime,
+        client_name: Optional[str],
+    ) -> List[dict]:
+        """Per-bucket counts from the rollups of the whole units in the range,
+        and from the checks themselves in the partial units at its edges."""
+        low, high = status_stats.whole_units(start, end, spec.rollup_unit)
+        if low >= high:
+            return await self.raw_bucket_counts(spec, start, end, client_name)
+        parts = [await self.summed_rollup_counts(spec, low, high, client_name)]
+        if start < low:
+            parts.append(
+                await self.raw_bucket_counts(spec, start, low, client_name)
+            )
+        if high < end:
+            parts.append(
+                await self.raw_bucket_counts(spec, high, end, client_name)
+            )
+        return status_stats.merge_rows(parts)
+
+
+def keyset_filter(after: Optional[Position], native_timestamps: bool,
+                  query: StatusQuery = ALL_STATUS_CHECKS) -> dict:
+    """Mongo filter for the checks in ``query`` that come after ``after``."""
+    def stored(timestamp: datetime):
+        return timestamp if native_timestamps else timestamp.isoformat()
+
+    filter_ = {}
+    bounds = {}
+    start, end = query.start, query.end
+    if after is not None:
+        timestamp, check_id = after
+        # The timestamp bound limits the index scan; the $or breaks timestamp ties
+        if query.descending:
+            tie_op = "$lt"
+            bounds["$lte"] = stored(timestamp)
+        else:
+            tie_op = "$gt"
+            start = timestamp if start is None else max(start, timestamp)
+        filter_["$or"] = [
+            {"timestamp": {tie_op: stored(timestamp)}},
+            {"timestamp": stored(timestamp), "id": {tie_op: check_id}},
+        ]
+    if start is not None:
+        bounds["$gte"] = stored(start)
+    if end is not None:
+        bounds["$lt"] = stored(end)
+    if bounds:
+        filter_["timestamp"] = bounds
+    if query.client_name is not None:
+        filter_["client_name"] = query.client_name
+    return filter_
+
+
+def status_projection(fields: Optional[Sequence[str]]) -> dict:
+    if fields is None:
+        return STATUS_CHECK_PROJECTION
+    return {"_id": 0, **{field: 1 for field in (*fields, *KEYSET_FIELDS)}}
+
+
+class MongoStatusCheckRepository(StatusCheckRepository):
+    def __init__(self, db, native_timestamps: bool):
+        self.db = db
+        self.native_timestamps = native_timestamps
+
+    async def setup(self) -> None:
+        await self.db.status_checks.create_indexes(STATUS_CHECK_INDEXES)
+        await self.db.status_check_rollups.create_indexes(
+            status_stats.ROLLUP_INDEXES
+        )
+        if self.native_timestamps:
+            await self._require_native_timestamps()
+
+    async def _require_native_timestamps(self) -> None:
+        # Filters compare datetimes, which no ISO string matches: leftover
+        # legacy rows would silently drop out of listings and stats. The
+        # timestamp index answers this without reading any documents.
+        legacy = await self.db.status_checks.find_one(
+            {"timestamp": {"$type": "string"}}, {"_id": 1}
+        )
+        if legacy is not None:
+            raise RuntimeError(
+                "status_checks still has ISO string timestamps; run "
+                "`python migrations.py backfill-status-timestamps` before "
+                "starting with STATUS_TIMESTAMP_STORAGE=native"
+            )
+
+    def _stored(self, doc: dict) -> dict:
+        # A copy, so the _id Motor adds on insert stays out of the caller's doc
+        stored = dict(doc)
+        if not self.native_timestamps:
+            # Serialize datetime to ISO string for MongoDB
+            stored['timestamp'] = stored['timestamp'].isoformat()
+        return stored
+
+    async def insert(self, doc: dict) -> None:
+        await self.db.status_checks.insert_one(self._stored(doc))
+        await status_stats.record_rollups(self.db, [doc])
+
+    async def insert_many(self, docs: List[dict]) -> List[WriteFailure]:
+        failures = []
+        try:
+            await self.db.status_checks.insert_many(
+                [self._stored(doc) for doc in docs], ordered=False
+            )
+        except BulkWriteError as exc:
+            failures = [(error['index'], error['errmsg'])
+                        for error in exc.details.get('writeErrors', [])]
+        failed_positions = {position for position, _ in failures}
+        await status_stats.record_rollups(
+            self.db,
+            (
+                doc
+                for position, doc in enumerate(docs)
+                if position not in failed_positions
+            ),
+        )
+        return failures
+
+    def find(
+        self,
+        after: Optional[Position] = None,
+        query: StatusQuery = ALL_STATUS_CHECKS,
+        fields: Optional[Sequence[str]] = None,
+    ):
+        """The Motor cursor behind every listing; exposed for query-plan tests."""
+        # Exclude MongoDB's _id field (and anything else not asked for)
+        return self.db.status_checks.find(
+            keyset_filter(after, self.native_timestamps, query),
+            status_projection(fields),
+        ).sort(STATUS_SORT_DESCENDING if query.descending else STATUS_SORT)
+
+    async def iter_range(self, after=None, limit=None, batch_size=500,
+                         query=ALL_STATUS_CHECKS, fields=None):
+        cursor = self.find(after, query, fields)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        # Motor fetches batch_size documents per round trip, so memory stays
+        # bounded by one batch no matter how many checks are iterated.
+        async for doc in cursor.batch_size(batch_size):
+            yield doc
+
+    async def fetch_range(
+        self, after, limit, query=ALL_STATUS_CHECKS, fields=None
+    ):
+        return await self.find(after, query, fields).to_list(limit)
+
+    def time_filter(self, start=None, end=None, client_name=None) -> dict:
+        query = {}
+        bounds = {}
+        if start is not None:
+            bounds["$gte"] = start if self.native_timestamps else start.isoformat()
+        if end is not None:
+            bounds["$lt"] = end if self.native_timestamps else end.isoformat()
+        if bounds:
+            query["timestamp"] = bounds
+        if client_name is not None:
+            query["client_name"] = client_name
+        return query
+
+    async def count(self, start=None, end=None, client_name=None):
+        return await self.db.status_checks.count_documents(
+            self.time_filter(start, end, client_name)
+        )
+
+    async def raw_bucket_counts(self, spec, start, end, client_name):
+        pipeline = status_stats.raw_pipeline(
+            spec, start, end, client_name, self.native_timestamps
+        )
+        return await self.db.status_checks.aggregate(pipeline).to_list(None)
+
+    async def summed_rollup_counts(self, spec, start, end, client_name):
+        pipeline = status_stats.rollup_pipeline(spec, start, end, client_name)
+        return await self.db.status_check_rollups.aggregate(pipeline).to_list(None)
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _bucket_start(timestamp: datetime, spec: status_stats.BucketSpec) -> datetime:
+    # Every bucket width divides a day, so flooring from the Unix epoch lines
+    # buckets up the same way $dateTrunc does
+    return timestamp - (timestamp - _EPOCH) % spec.width
+
+
+def _rows(counts: Counter) -> List[dict]:
+    return [
+        {"bucket": bucket, "client_name": client_name, "count": count}
+        for (bucket, client_name), count in sorted(counts.items())
+    ]
+
+
+class InMemoryStatusCheckRepository(StatusCheckRepository):
+    """Process-local engine for benchmarks, tests and single-node deployments.
+
+    Checks are kept in a dict by id plus sorted (timestamp, id) keys, overall
+    and per client, so keyset pages and time ranges are binary searches.
+    Rollups are plain counters per (bucket, client) for each rollup unit.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[str, dict] = {}
+        self._order: List[Position] = []
+        self._by_client: Dict[str, List[Position]] = defaultdict(list)
+        # unit -> bucket -> client_name -> count, plus each unit's sorted buckets
+        self._rollups: Dict[str, Dict[datetime, Counter]] = {
+            unit: defaultdict(Counter) for unit in status_stats.ROLLUP_UNITS
+        }
+        self._rollup_buckets: Dict[str, List[datetime]] = {
+            unit: [] for unit in status_stats.ROLLUP_UNITS
+        }
+
+    def _add(self, doc: dict) -> None:
+        if doc['id'] in self._by_id:
+            raise KeyError(f"duplicate key: id {doc['id']!r}")
+        doc = dict(doc)
+        key = (doc['timestamp'], doc['id'])
+        self._by_id[doc['id']] = doc
+        # Checks mostly arrive in timestamp order, so insort appends at the end
+        bisect.insort(self._order, key)
+        bisect.insort(self._by_client[doc['client_name']], key)
+        for unit in status_stats.ROLLUP_UNITS:
+            bucket = status_stats.truncate(doc['timestamp'], unit)
+            buckets = self._rollup_buckets[unit]
+            index = bisect.bisect_left(buckets, bucket)
+            if index == len(buckets) or buckets[index] != bucket:
+                buckets.insert(index, bucket)
+            self._rollups[unit][bucket][doc['client_name']] += 1
+
+    async def insert(self, doc: dict) -> None:
+        self._add(doc)
+
+    async def insert_many(self, docs: List[dict]) -> List[WriteFailure]:
+        failures = []
+        for position, doc in enumerate(docs):
+            try:
+                self._add(doc)
+            except KeyError as exc:
+                failures.append((position, exc.args[0]))
+        return failures
+
+    def _slice(self, query: StatusQuery, after: Optional[Position],
+               limit: Optional[int]) -> List[Position]:
+        keys = (
+            self._order
+            if query.client_name is None
+            else self._by_client.get(query.client_name, [])
+        )
+        low = (
+            0
+            if query.start is None
+            else bisect.bisect_left(keys, (query.start, ""))
+        )
+        high = (
+            len(keys)
+            if query.end is None
+            else bisect.bisect_left(keys, (query.end, ""))
+        )
+        if query.descending:
+            if after is not None:
+                high = min(high, bisect.bisect_left(keys, after))
+            if limit is not None:
+                low = max(low, high - limit)
+            return keys[low:high][::-1]
+        if after is not None:
+            low = max(low, bisect.bisect_right(keys, after))
+        if limit is not None:
+            high = min(high, low + limit)
+        return keys[low:high]
+
+    def _project(self, check_id: str, fields: Optional[Sequence[str]]) -> dict:
+        doc = self._by_id[check_id]
+        if fields is None:
+            return doc
+        return {field: doc[field] for field in (*fields, *KEYSET_FIELDS)}
+
+    async def iter_range(self, after=None, limit=None, batch_size=500,
+                         query=ALL_STATUS_CHECKS, fields=None):
+        while limit is None or limit > 0:
+            size = batch_size if limit is None else min(batch_size, limit)
+            keys = self._slice(query, after, size)
+            if not keys:
+                return
+            for _, check_id in keys:
+                yield self._project(check_id, fields)
+            after = keys[-1]
+            if limit is not None:
+                limit -= len(keys)
+
+    async def fetch_range(
+        self, after, limit, query=ALL_STATUS_CHECKS, fields=None
+    ):
+        return [
+            self._project(check_id, fields)
+            for _, check_id in self._slice(query, after, limit)
+        ]
+
+    def _time_slice(self, start, end, client_name) -> List[Position]:
+        keys = (
+            self._order
+            if client_name is None
+            else self._by_client.get(client_name, [])
+        )
+        low = 0 if start is None else bisect.bisect_left(keys, (start, ""))
+        high = len(keys) if end is None else bisect.bisect_left(keys, (end, ""))
+        return keys[low:high]
+
+    async def count(self, start=None, end=None, client_name=None):
+        return len(self._time_slice(start, end, client_name))
+
+    async def raw_bucket_counts(self, spec, start, end, client_name):
+        counts = Counter()
+        for timestamp, check_id in self._time_slice(start, end, client_name):
+            counts[
+                (
+                    _bucket_start(timestamp, spec),
+                    self._by_id[check_id]['client_name'],
+                )
+            ] += 1
+        return _rows(counts)
+
+    async def summed_rollup_counts(self, spec, start, end, client_name):
+        unit = spec.rollup_unit
+        buckets = self._rollup_buckets[unit]
+        low = bisect.bisect_left(buckets, start)
+        high = bisect.bisect_left(buckets, end)
+        counts = Counter()
+        for bucket in buckets[low:high]:
+            clients = self._rollups[unit][bucket]
+            if client_name is not None:
+                clients = (
+                    {client_name: clients[client_name]}
+                    if client_name in clients
+                    else {}
+                )
+            for name, count in clients.items():
+                counts[(_bucket_start(bucket, spec), name)] += count
+        return _rows(counts)
@@ -0,0 +1,116 @@
+"""
+In-process write-behind buffer that coalesces single-document inserts.
+
+Requests hand their document to ``WriteBehindWriter.submit`` and return as soon
+as it is queued; a background task groups queued documents into one
+``write_batch`` call per ``batch_size`` documents or per ``flush_interval``,
+whichever comes first. The queue is bounded: when it is full, ``submit`` waits
+up to ``enqueue_timeout`` for room and then raises ``WriteBehindQueueFull``.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindQueueFull(Exception):
+    """The buffer stayed full for longer than the enqueue timeout."""
+
+
+class WriteBehindClosed(Exception):
+    """The buffer is shutting down and no longer accepts documents."""
+
+
+class WriteBehindWriter:
+    def __init__(
+        self,
+        write_batch: Callable[[List[dict]], Awaitable[None]],
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        enqueue_timeout: float = 0.1,
+    ):
+        self._write_batch = write_batch
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._task = None
+        self._closed = False
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, doc: dict) -> None:
+        if self._closed:
+            raise WriteBehindClosed()
+        try:
+            self._queue.put_nowait(doc)
+        except asyncio.QueueFull:
+            # Backpressure: hold the caller briefly before giving up
+            try:
+                await asyncio.wait_for(self._queue.put(doc), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                raise WriteBehindQueueFull() from None
+
+    async def close(self) -> None:
+        """Stop accepting documents and flush everything already queued."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        # Submitters that were blocked on a full queue may have landed behind
+        # the stop marker; flush them too.
+        leftovers = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                leftovers.append(item)
+        if leftovers:
+            await self._flush(leftovers)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[dict]) -> None:
+        try:
+            await self._write_batch(batch)
+        except Exception:
+            # The callers were already answered; all we can do is report it
+            logger.exception(
+                "Write-behind flush of %d documents failed", len(batch)
+            )
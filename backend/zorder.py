@@ -0,0 +1,156 @@
+"""
+Fractional z-order keys for board entries.
+
+An entry's place in the stack is its ``z_key``: a string of base-62 digits
+read as a fraction (0.d1d2d3...). Strings compare in the same order as the
+fractions they stand for. There is always a key between any two others, so
+raising or lowering an entry is a single update that sets its key from its
+new neighbours. Nothing else is renumbered.
+
+Keys never end in "0", which keeps room below every key. Keys grow when an
+entry is placed between two close neighbours, or pushed to the front or back
+many times. Once a key passes ``Z_KEY_MAX_LENGTH`` characters, the board is
+rebalanced in the background: evenly spaced short keys, written one entry at
+a time in an order that keeps the stack valid after every write.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# In ASCII order, so string comparison is digit comparison
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+_VALUE = {digit: value for value, digit in enumerate(DIGITS)}
+
+# The first key on an empty board: the middle, with room on both sides
+FIRST_KEY = DIGITS[BASE // 2]
+
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    """A key strictly between ``a`` ("" for 0) and ``b`` (None for 1)."""
+    if b is not None:
+        common = 0
+        while (
+            common < len(b)
+            and (a[common] if common < len(a) else "0") == b[common]
+        ):
+            common += 1
+        if common:
+            return b[:common] + _midpoint(a[common:], b[common:])
+    low = _VALUE[a[0]] if a else 0
+    high = _VALUE[b[0]] if b is not None else BASE
+    if high - low > 1:
+        return DIGITS[(low + high + 1) // 2]
+    # Adjacent first digits
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[low] + _midpoint(a[1:], None)
+
+
+def key_after(a: Optional[str]) -> str:
+    """A short key above ``a``, for the top of the stack."""
+    if a is None:
+        return FIRST_KEY
+    for position, digit in enumerate(a):
+        if digit != DIGITS[-1]:
+            return a[:position] + DIGITS[_VALUE[digit] + 1]
+    # All "z": one digit longer, then 60 more keys at that length
+    return a + DIGITS[1]
+
+
+def key_before(b: Optional[str]) -> str:
+    """A short key below ``b``, for the bottom of the stack."""
+    if b is None:
+        return FIRST_KEY
+    for position, digit in enumerate(b):
+        if _VALUE[digit] > 1:
+            return b[:position] + DIGITS[_VALUE[digit] - 1]
+    # Only "0"s and a final "1": one digit longer, ending in "z"
+    return b[:-1] + DIGITS[0] + DIGITS[-1]
+
+
+def key_between(a: Optional[str], b: Optional[str]) -> str:
+    """A key strictly between ``a`` and ``b``; None is the bottom or top end."""
+    if a is None:
+        return key_before(b)
+    if b is None:
+        return key_after(a)
+    if a >= b:
+        raise ValueError(f"{a!r} is not below {b!r}")
+    return _midpoint(a, b)
+
+
+def spread_keys(count: int) -> List[str]:
+    """``count`` ascending keys of one short length, evenly spaced.
+
+    They start at "2" and stay below "z", so keys made at either end of the
+    stack while a rebalance runs still sort outside them.
+    """
+    length, space = 1, BASE - 3
+    while space < 2 * (count + 1):
+        length, space = length + 1, space * BASE
+    offset = 2 * BASE ** (length - 1)
+    keys = []
+    for rank in range(1, count + 1):
+        value = offset + rank * space // (count + 1)
+        digits = []
+        for _ in range(length):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        keys.append("".join(reversed(digits)).rstrip("0"))
+    return keys
+
+
+def rebalance_plan(stack: List[Tuple[str, str]]) -> List[Tuple[str, str, str]]:
+    """(id, old key, new key) writes that respace ``stack``, bottom to top.
+
+    Entries moving down are written bottom-up, then entries moving up
+    top-down. After every single write the keys are still in stack order. So
+    the plan can run as independent updates, stop halfway, or race reads.
+    """
+    moves = [
+        (entry_id, old, new)
+        for (entry_id, old), new in zip(stack, spread_keys(len(stack)))
+        if old != new
+    ]
+    down = [move for move in moves if move[2] < move[1]]
+    up = [move for move in moves if move[2] > move[1]]
+    return down + up[::-1]
+
+
+class Rebalancer:
+    """Runs ``rebalance(board_id)`` in the background, once at a time per board."""
+
+    def __init__(self, rebalance: Callable[[str], Awaitable[None]]):
+        self._rebalance = rebalance
+        self._running: Dict[str, asyncio.Task] = {}
+
+    def schedule(self, board_id: str) -> None:
+        if board_id not in self._running:
+            self._running[board_id] = asyncio.get_running_loop().create_task(
+                self._run(board_id)
+            )
+
+    async def _run(self, board_id: str) -> None:
+        try:
+            await self._rebalance(board_id)
+        except Exception:
+            # The next over-long key schedules it again
+            logger.exception(
+                "Rebalancing z-order keys of board %s failed", board_id
+            )
+        finally:
+            del self._running[board_id]
+
+    async def wait(self) -> None:
+        """Wait for every rebalance in progress."""
+        while self._running:
+            await asyncio.gather(*self._running.values())
+
+    async def close(self) -> None:
+        # Safe to stop at any point, see rebalance_plan
+        for task in self._running.values():
+            task.cancel()
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
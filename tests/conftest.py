@@ -0,0 +1,157 @@
+import os
+import sys
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# server.py is imported the way uvicorn loads it (`server:app` from backend/)
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "thought_stick_test")
+# Tests that need MongoDB swap a Mongo repository in through status_repo
+os.environ.setdefault("STORAGE_ENGINE", "memory")
+
+import pytest  # noqa: E402
+from pymongo import MongoClient  # noqa: E402
+from pymongo.errors import PyMongoError  # noqa: E402
+
+
+def _mongo_available() -> bool:
+    probe = MongoClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=500)
+    try:
+        probe.admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        probe.close()
+
+
+requires_mongo = pytest.mark.skipif(
+    not _mongo_available(), reason="MongoDB is not reachable at MONGO_URL"
+)
+
+
+# Session scope keeps one event loop for every test, which a session-scoped
+# Motor client is bound to after its first operation.
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def api():
+    import httpx
+    import server
+
+    # ASGITransport does not send lifespan events, so run the app's lifespan here
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            yield client
+
+
+@pytest.fixture(scope="session")
+async def mongo_db():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True)
+    yield client[os.environ["DB_NAME"]]
+    client.close()
+
+
+ENGINES = ["memory", pytest.param("mongo", marks=requires_mongo)]
+
+
+@asynccontextmanager
+async def swapped(request, monkeypatch, collections, **engines):
+    """Fresh engines for one test, swapped in for the app's own.
+
+    ``engines`` maps server globals to a (memory factory, Mongo factory)
+    pair; the Mongo factory takes the database. The Mongo run, picked by the
+    fixture param, drops ``collections`` before and after the test and sets
+    the engines up. Yields the engines in the order given.
+    """
+    import server
+
+    mongo_db = None
+    if request.param in ("mongo", "gridfs"):
+        mongo_db = request.getfixturevalue("mongo_db")
+        for name in collections:
+            await mongo_db.drop_collection(name)
+    try:
+        built = []
+        for name, (memory, mongo) in engines.items():
+            engine = memory() if mongo_db is None else mongo(mongo_db)
+            if mongo_db is not None and hasattr(engine, "setup"):
+                await engine.setup()
+            monkeypatch.setattr(server, name, engine)
+            built.append(engine)
+        yield tuple(built)
+    finally:
+        if mongo_db is not None:
+            for name in collections:
+                await mongo_db.drop_collection(name)
+
+
+@pytest.fixture(params=ENGINES)
+async def status_repo(request, api, monkeypatch):
+    """An empty status check repository."""
+    import server
+    from storage import InMemoryStatusCheckRepository, MongoStatusCheckRepository
+
+    def mongo(db):
+        return MongoStatusCheckRepository(db, server.NATIVE_TIMESTAMPS)
+
+    async with swapped(
+        request,
+        monkeypatch,
+        ("status_checks", "status_check_rollups"),
+        status_checks=(InMemoryStatusCheckRepository, mongo),
+    ) as (repo,):
+        # Pages cached for the app's own repository must not leak in, or out
+        server.status_cache.bump()
+        yield repo
+        server.status_cache.bump()
+
+
+@pytest.fixture(params=ENGINES)
+async def entry_repo(request, api, monkeypatch):
+    """An empty board entry repository."""
+    from entries import InMemoryEntryRepository, MongoEntryRepository
+
+    async with swapped(request, monkeypatch, ("entries", "entry_tiles"),
+                       board_entries=(InMemoryEntryRepository,
+                                      MongoEntryRepository)) as (repo,):
+        yield repo
+
+
+@pytest.fixture(params=ENGINES)
+async def op_log(request, api, monkeypatch):
+    """An empty board op log."""
+    from oplog import InMemoryOpLogRepository, MongoOpLogRepository
+
+    def mongo(db):
+        return MongoOpLogRepository(db, retention=timedelta(days=1))
+
+    async with swapped(request, monkeypatch, ("board_ops", "board_oplog_heads"),
+                       board_ops=(InMemoryOpLogRepository, mongo)) as (repo,):
+        yield repo
+
+
+@pytest.fixture(params=["local", pytest.param("gridfs", marks=requires_mongo)])
+async def image_store(request, api, monkeypatch, tmp_path):
+    """Empty image blob and metadata stores."""
+    from blobs import GridFSBlobStore, LocalBlobStore
+    from images import InMemoryImageRepository, MongoImageRepository
+
+    async with swapped(
+        request, monkeypatch, ("images", "images.files", "images.chunks"),
+        image_blobs=(lambda: LocalBlobStore(tmp_path / "images"), GridFSBlobStore),
+        image_records=(InMemoryImageRepository, MongoImageRepository),
+    ) as stores:
+        yield stores
@@ -0,0 +1,51 @@
+"""
+Query-plan assertions for backend tests.
+
+Every endpoint query should be answered from an index; a COLLSCAN anywhere in
+the winning plan means a query was added without the index it needs.
+"""
+
+
+def plan_stages(plan: dict):
+    """Yield every stage name in an explain() plan tree."""
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+async def assert_uses_index(cursor):
+    """Run explain() on a Motor cursor and fail if it scans the collection."""
+    explain = await cursor.explain()
+    planner = explain["queryPlanner"]
+    stages = list(plan_stages(planner["winningPlan"]))
+    assert "COLLSCAN" not in stages, (
+        f"query {planner.get('parsedQuery')} falls back to a collection scan: "
+        f"{stages}"
+    )
+    return stages
+
+
+def plan_indexes(plan: dict):
+    """Yield the name of every index an explain() plan tree scans."""
+    if "indexName" in plan:
+        yield plan["indexName"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from plan_indexes(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from plan_indexes(child)
+
+
+async def assert_uses_named_index(cursor, name: str):
+    """Run explain() on a Motor cursor and fail unless it scans index ``name``."""
+    explain = await cursor.explain()
+    planner = explain["queryPlanner"]
+    indexes = list(plan_indexes(planner["winningPlan"]))
+    assert name in indexes, (
+        f"query {planner.get('parsedQuery')} does not use {name}: {indexes}"
+    )
+    return indexes
@@ -0,0 +1,349 @@
+"""
+Account wipes: a user's entries and images deleted in checkpointed batches,
+with progress reported, shared images kept, and wipes resumed after a crash.
+"""
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from account_wipe import AccountWiper, InMemoryWipeRepository, MongoWipeRepository
+from .conftest import requires_mongo
+
+pytestmark = pytest.mark.anyio
+
+
+ADMIN = {"X-Admin-Token": "admin-secret"}
+
+
+@pytest.fixture
+def wiper(api, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", ADMIN["X-Admin-Token"])
+    # Small batches, so each phase takes several; no idling between them
+    monkeypatch.setattr(server.account_wiper, "batch_size", 2)
+    monkeypatch.setattr(server.account_wiper, "duty_cycle", 1.0)
+    return server.account_wiper
+
+
+async def create(api, board_id, user_id, title="t"):
+    response = await api.post(
+        f"/api/boards/{board_id}/entries",
+        json={"user_id": user_id, "title": title, "x": 0, "y": 0, "color": "sky"},
+    )
+    return response.json()
+
+
+async def upload(api, data, user_id):
+    response = await api.post(
+        "/api/images",
+        params={"user_id": user_id},
+        content=data,
+        headers={"content-type": "image/jpeg"},
+    )
+    return response.json()["digest"]
+
+
+async def test_wipe_deletes_the_users_data(
+    api, entry_repo, op_log, image_store, wiper
+):
+    blobs, records = image_store
+    for board_id in ("board-1", "board-2"):
+        for _ in range(3):
+            await create(api, board_id, "user-1")
+    kept = await create(api, "board-1", "user-2")
+    own = [await upload(api, b"\xff\xd8 own %d" % i, "user-1") for i in range(3)]
+    shared = await upload(api, b"\xff\xd8 shared", "user-1")
+    await upload(api, b"\xff\xd8 shared", "user-2")
+
+    response = await api.delete("/api/users/user-1", headers=ADMIN)
+    assert response.status_code == 202
+    assert (
+        response.json()["status"] == "running"
+        and response.json()["phase"] == "entries"
+    )
+    await wiper.wait()
+
+    wipe = (await api.get("/api/users/user-1/wipe", headers=ADMIN)).json()
+    assert (
+        wipe["status"] == "done"
+        and wipe["phase"] is None
+        and wipe["error"] is None
+    )
+    assert wipe["deleted"] == {"entries": 6, "images": 4}
+    assert wipe["finished_at"] is not None
+
+    assert await entry_repo.owned_by("user-1", 10) == []
+    assert await entry_repo.get("board-1", kept["id"]) is not None
+    ops, _ = await op_log.since("board-2", 0, 10)
+    assert [op["op"] for op in ops] == ["create"] * 3 + ["delete"] * 3
+    assert {op["origin"] for op in ops[3:]} == {"account_wipe"}
+
+    for digest in own:
+        assert (
+            await records.get(digest) is None and await blobs.size(digest) is None
+        )
+    assert (await records.get(shared))["owners"] == ["user-2"]
+    assert await blobs.size(shared) is not None
+
+
+async def test_uploads_racing_a_wipe_never_leave_an_image_without_bytes(
+    api, image_store, monkeypatch
+):
+    blobs, records = image_store
+    data = b"\xff\xd8 raced"
+    digest = hashlib.sha256(data).hexdigest()
+
+    async def dedup_upload(known_digest):
+        headers = {"content-type": "image/jpeg"}
+        if known_digest:
+            headers["x-content-sha256"] = digest
+        return await api.post("/api/images", params={"user_id": "user-2"},
+                              content=data, headers=headers)
+
+    async def served():
+        return (await api.get(f"/api/images/{digest}")).status_code == 200
+
+    # Between the wipe's mark and its deleting the bytes: turned away
+    delete = blobs.delete
+    answers = []
+
+    async def delete_after_uploads(target):
+        for known_digest in (True, False):
+            answers.append((await dedup_upload(known_digest)).status_code)
+        await delete(target)
+
+    await upload(api, data, "user-1")
+    monkeypatch.setattr(blobs, "delete", delete_after_uploads)
+    await server.wipe_images("user-1", 10)
+    assert answers == [503, 503]
+    assert await records.get(digest) is None and await blobs.size(digest) is None
+    monkeypatch.setattr(blobs, "delete", delete)
+    assert (await dedup_upload(True)).status_code == 201 and await served()
+    await server.wipe_images("user-2", 10)
+
+    # Before the mark: the other owner keeps the image
+    release = records.release
+
+    async def release_after_upload(target, user_id):
+        answers.append((await dedup_upload(True)).status_code)
+        return await release(target, user_id)
+
+    await upload(api, data, "user-1")
+    monkeypatch.setattr(records, "release", release_after_upload)
+    await server.wipe_images("user-1", 10)
+    assert answers[-1] == 200
+    assert (await records.get(digest))["owners"] == ["user-2"] and await served()
+    monkeypatch.setattr(records, "release", release)
+    await server.wipe_images("user-2", 10)
+
+    # After the upload saw the bytes, the whole wipe: no record over no bytes
+    add_owner = records.add_owner
+
+    async def add_owner_after_wipe(*args):
+        await server.wipe_images("user-1", 10)
+        return await add_owner(*args)
+
+    await upload(api, data, "user-1")
+    monkeypatch.setattr(records, "add_owner", add_owner_after_wipe)
+    assert (await dedup_upload(True)).status_code == 503
+    assert await records.get(digest) is None
+    monkeypatch.setattr(records, "add_owner", add_owner)
+    assert (await dedup_upload(True)).status_code == 201 and await served()
+
+
+async def test_wipe_requests(api, entry_repo, op_log, image_store, wiper):
+    async def wipe():
+        return (await api.delete("/api/users/user-1", headers=ADMIN)).json()
+
+    async def progress():
+        return await api.get("/api/users/user-1/wipe", headers=ADMIN)
+
+    assert (await progress()).status_code == 404
+    first = await wipe()
+    # Asking again while it runs reports the same wipe
+    assert (await wipe())["started_at"] == first["started_at"]
+    await wiper.wait()
+    assert (await progress()).json()["deleted"] == {}
+
+    # A finished wipe starts over, for whatever was stored since
+    await create(api, "board-1", "user-1")
+    again = await wipe()
+    assert (
+        again["status"] == "running" and again["started_at"] > first["started_at"]
+    )
+    await wiper.wait()
+    assert (await progress()).json()["deleted"] == {"entries": 1}
+
+
+async def test_wipes_need_the_admin_token(api, entry_repo, op_log, image_store,
+                                          wiper, monkeypatch):
+    wrong = {"X-Admin-Token": "guess"}
+    for method, path in ((api.delete, "/api/users/user-1"),
+                         (api.get, "/api/users/user-1/wipe")):
+        assert (await method(path)).status_code == 401
+        assert (await method(path, headers=wrong)).status_code == 403
+    response = await api.get("/api/users/user-1/wipe", headers=ADMIN)
+    assert response.status_code == 404
+
+    # Unset, it lets no one through
+    monkeypatch.setattr(server, "ADMIN_TOKEN", None)
+    response = await api.delete("/api/users/user-1", headers=ADMIN)
+    assert response.status_code == 403
+
+
+def counting_step(items, seen):
+    async def step(user_id, limit):
+        batch = items[:limit]
+        del items[:limit]
+        seen.append(len(batch))
+        return len(batch)
+    return step
+
+
+async def test_wipe_resumes_from_its_checkpoint():
+    wipes = InMemoryWipeRepository()
+    first, second, seen = list(range(5)), list(range(3)), []
+    phases = [
+        ("first", counting_step(first, seen)),
+        ("second", counting_step(second, seen)),
+    ]
+
+    # A process that died after the first phase: its lease has run out
+    await wipes.start("user-1", "first")
+    lapsed = datetime.now(timezone.utc) - timedelta(seconds=1)
+    await wipes.claim("user-1", "dead", lapsed)
+    await wipes.checkpoint(
+        "user-1", "dead", {"phase": "second"}, {"first": 5}, lapsed
+    )
+    first.clear()
+
+    wiper = AccountWiper(wipes, phases, batch_size=2, duty_cycle=1.0)
+    assert await wiper.resume() == 1
+    await wiper.wait()
+    assert seen == [2, 1, 0]
+    wipe = await wipes.get("user-1")
+    assert wipe["status"] == "done" and wipe["deleted"] == {
+        "first": 5,
+        "second": 3,
+    }
+    assert await wiper.resume() == 0
+
+
+async def test_wipe_under_a_live_lease_is_left_alone():
+    wipes = InMemoryWipeRepository()
+    items, seen = list(range(5)), []
+    await wipes.start("user-1", "only")
+    await wipes.claim(
+        "user-1", "other", datetime.now(timezone.utc) + timedelta(minutes=1)
+    )
+
+    wiper = AccountWiper(
+        wipes, [("only", counting_step(items, seen))], batch_size=2, duty_cycle=1.0
+    )
+    assert await wiper.resume() == 0
+    await wiper.request("user-1")
+    await wiper.wait()
+    assert seen == [] and (await wipes.get("user-1"))["status"] == "running"
+
+
+async def test_failed_batch_is_recorded_and_retried():
+    wipes = InMemoryWipeRepository()
+    items, seen = list(range(3)), []
+    step = counting_step(items, seen)
+    failures = [OSError("disk gone")]
+
+    async def flaky(user_id, limit):
+        if failures:
+            raise failures.pop()
+        return await step(user_id, limit)
+
+    wiper = AccountWiper(wipes, [("only", flaky)], batch_size=2, duty_cycle=1.0)
+    await wiper.request("user-1")
+    await wiper.wait()
+    wipe = await wipes.get("user-1")
+    assert wipe["status"] == "running" and wipe["error"] == "disk gone"
+
+    # The lease was released with the failure, so the next sweep retries
+    assert await wiper.resume() == 1
+    await wiper.wait()
+    wipe = await wipes.get("user-1")
+    assert (
+        wipe["status"] == "done"
+        and wipe["error"] is None
+        and wipe["deleted"] == {"only": 3}
+    )
+
+
+async def test_duty_cycle_idles_between_batches(monkeypatch):
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    clock = iter(range(100))
+    monkeypatch.setattr("account_wipe.time.monotonic", lambda: next(clock))
+    items = list(range(4))
+    wiper = AccountWiper(
+        InMemoryWipeRepository(),
+        [("only", counting_step(items, []))],
+        batch_size=2,
+        duty_cycle=0.25,
+    )
+    await wiper.request("user-1")
+    await wiper.wait()
+    # Each batch "took" one second, so three seconds idle after each
+    assert sleeps == [3.0, 3.0]
+
+
+async def test_duty_cycle_pauses_stay_within_the_lease(monkeypatch):
+    wipes = InMemoryWipeRepository()
+    sleeps = []
+
+    async def sleep(seconds):
+        # The lease was renewed just before, so no one else can take the wipe
+        later = datetime.now(timezone.utc) + timedelta(minutes=1)
+        assert await wipes.claim("user-1", "other", later) is None
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    clock = iter(range(100))
+    monkeypatch.setattr("account_wipe.time.monotonic", lambda: next(clock))
+    wiper = AccountWiper(wipes, [("only", counting_step(list(range(4)), []))],
+                         batch_size=2, duty_cycle=0.01, lease=10)
+    await wiper.request("user-1")
+    await wiper.wait()
+    # 99 seconds idle per busy second, cut to half the lease
+    assert sleeps == [5.0, 5.0]
+
+
+@pytest.mark.parametrize("duty_cycle", [0, -0.5, 1.5])
+def test_duty_cycle_must_be_a_share_of_the_time(duty_cycle):
+    with pytest.raises(ValueError):
+        AccountWiper(InMemoryWipeRepository(), [], duty_cycle=duty_cycle)
+
+
+@requires_mongo
+async def test_mongo_wipe_repository(mongo_db):
+    await mongo_db.account_wipes.drop()
+    wipes = MongoWipeRepository(mongo_db)
+    await wipes.setup()
+    try:
+        started = await wipes.start("user-1", "entries")
+        assert started["status"] == "running" and "holder" not in started
+        assert await wipes.claim(
+            "user-1", "a", datetime.now(timezone.utc) + timedelta(minutes=1)
+        )
+        assert await wipes.claim("user-1", "b", datetime.now(timezone.utc)) is None
+        assert await wipes.checkpoint(
+            "user-1", "a", {"phase": "images"}, {"entries": 2}, None
+        )
+        assert not await wipes.checkpoint("user-1", "b", {}, {}, None)
+        assert await wipes.unfinished(
+            datetime.now(timezone.utc) + timedelta(seconds=1)
+        ) == ["user-1"]
+        assert (await wipes.get("user-1"))["deleted"] == {"entries": 2}
+    finally:
+        await mongo_db.account_wipes.drop()
@@ -0,0 +1,45 @@
+"""
+Tests for the in-process publish/subscribe broker behind the live status feed.
+"""
+import pytest
+
+from broker import Broker
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_every_subscriber_receives_published_messages():
+    broker = Broker()
+    first, second = broker.subscribe(), broker.subscribe()
+    broker.publish("hello")
+
+    assert await first.get(timeout=0.1) == "hello"
+    assert await second.get(timeout=0.1) == "hello"
+
+
+async def test_slow_subscriber_drops_oldest_messages():
+    broker = Broker(maxlen=3)
+    subscription = broker.subscribe()
+    for i in range(10):
+        broker.publish(i)
+
+    assert subscription.dropped == 7
+    assert [await subscription.get(timeout=0.1) for _ in range(3)] == [7, 8, 9]
+    assert await subscription.get(timeout=0.01) is None
+
+
+async def test_closed_subscription_stops_receiving():
+    broker = Broker()
+    with broker.subscribe() as subscription:
+        assert broker.subscriber_count == 1
+    assert broker.subscriber_count == 0
+    broker.publish("ignored")
+    assert await subscription.get(timeout=0.01) is None
+
+
+async def test_broker_close_wakes_waiting_subscribers():
+    broker = Broker()
+    subscription = broker.subscribe()
+    broker.close()
+    assert await subscription.get() is None
+    assert subscription.closed
@@ -0,0 +1,147 @@
+"""
+Cluster tiles are maintained incrementally; after any sequence of entry
+writes they must match tiles recomputed from scratch.
+"""
+import random
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+import pytest
+
+import clusters
+import zorder
+from spatial import BBox
+
+pytestmark = pytest.mark.anyio
+
+BOARD = "board-1"
+
+
+def random_key(rng):
+    return "".join(rng.choice(zorder.DIGITS[1:]) for _ in range(3))
+
+
+def entry(entry_id, rng):
+    return {
+        "id": entry_id,
+        "board_id": BOARD,
+        "user_id": "user-1",
+        "title": entry_id,
+        "commentary": None,
+        "color": rng.choice(clusters.COLORS),
+        "image_path": None,
+        "x": rng.uniform(0, 5000),
+        "y": rng.uniform(0, 5000),
+        "rotation": 0.0,
+        "z_key": random_key(rng),
+        "version": 1,
+        "created_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+    }
+
+
+def expected_tiles(docs, level):
+    tiles = defaultdict(list)
+    for doc in docs:
+        tiles[clusters.tile_of(doc, level)].append(doc)
+    return tiles
+
+
+async def assert_tiles_match(repo, docs):
+    for level in clusters.CLUSTER_LEVELS:
+        expected = expected_tiles(docs, level)
+        # Drags can carry entries a little past the board edge
+        areas = clusters.tiles_in(BBox(-5000, -5000, 10000, 10000), level)
+        found = {
+            tile["tile"]: tile for tile in await repo.tiles(BOARD, level, areas)
+        }
+        assert set(found) == set(expected)
+        for code, members in expected.items():
+            tile = found[code]
+            assert tile["count"] == len(members)
+            colors = Counter(doc["color"] for doc in members)
+            assert {color: n for color, n in tile["colors"].items() if n} == colors
+            assert tile["rep"]["z_key"] == max(doc["z_key"] for doc in members)
+
+
+async def test_tiles_follow_inserts_moves_edits_and_deletes(entry_repo):
+    rng = random.Random(3)
+    docs = {}
+    for i in range(200):
+        doc = entry(str(i), rng)
+        docs[doc["id"]] = doc
+        await entry_repo.insert(doc)
+    await assert_tiles_match(entry_repo, docs.values())
+
+    for _ in range(300):
+        entry_id = rng.choice(sorted(docs))
+        action = rng.random()
+        if action < 0.1:
+            await entry_repo.delete(BOARD, entry_id)
+            del docs[entry_id]
+            continue
+        if action < 0.5:
+            changes = {"x": rng.uniform(0, 5000), "y": rng.uniform(0, 5000)}
+        elif action < 0.7:
+            # Short drags mostly stay within a tile
+            changes = {
+                "x": docs[entry_id]["x"] + 20,
+                "y": docs[entry_id]["y"] - 20,
+            }
+        elif action < 0.85:
+            changes = {"color": rng.choice(clusters.COLORS)}
+        else:
+            changes = {"z_key": random_key(rng)}
+        await entry_repo.update(BOARD, entry_id, changes)
+        docs[entry_id].update(changes)
+
+    await assert_tiles_match(entry_repo, docs.values())
+
+    # Rekeying keeps representatives, and their keys, current
+    moves = zorder.rebalance_plan(await entry_repo.z_order(BOARD))
+    assert len(await entry_repo.rekey(BOARD, moves)) == len(moves)
+    for entry_id, _, new in moves:
+        docs[entry_id]["z_key"] = new
+    await assert_tiles_match(entry_repo, docs.values())
+
+
+def test_level_choice_keeps_tiles_on_screen_sized_and_bounded():
+    board = BBox(0, 0, 5000, 5000)
+    level = clusters.choose_level(board, 0.05, 192, 1024)
+    assert clusters.tile_size(level) * 0.05 >= 192 or level == min(
+        clusters.CLUSTER_LEVELS
+    )
+
+    # Finer tiles as the user zooms in
+    assert clusters.choose_level(board, 0.3, 192, 1024) > level
+    assert clusters.choose_level(BBox(0, 0, 10**7, 10**7), 0.05, 192, 1024) is None
+
+
+async def test_board_view_clusters_below_threshold(api, entry_repo):
+    for i in range(20):
+        await api.post(
+            f"/api/boards/{BOARD}/entries",
+            json={
+                "user_id": "user-1",
+                "title": f"e{i}",
+                "x": 100 + i * 200,
+                "y": 2500,
+            },
+        )
+
+    zoomed_in = (
+        await api.get(
+            f"/api/boards/{BOARD}/view",
+            params={"bbox": "0,2000,1000,3000", "zoom": 1},
+        )
+    ).json()
+    assert not zoomed_in["clustered"] and len(zoomed_in["entries"]) == 5
+
+    zoomed_out = (
+        await api.get(
+            f"/api/boards/{BOARD}/view",
+            params={"bbox": "0,0,5000,5000", "zoom": 0.05},
+        )
+    ).json()
+    assert zoomed_out["clustered"] and zoomed_out["entries"] == []
+    assert sum(tile["count"] for tile in zoomed_out["tiles"]) == 20
+    assert all(tile["color"] == "butter" for tile in zoomed_out["tiles"])
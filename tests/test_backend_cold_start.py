@@ -0,0 +1,53 @@
+"""
+Cold-start budget: a fresh worker must import, start up and serve its first
+request within COLD_START_BUDGET_SECONDS (memory engine, so MongoDB latency
+is not part of the budget).
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import server
+from benchmarks import cold_start
+
+COLD_START_BUDGET_SECONDS = float(os.environ.get("COLD_START_BUDGET_SECONDS", "3"))
+
+
+def test_cold_start_within_budget():
+    timings = cold_start.measure_in_process()
+
+    serving = timings["import"] + timings["startup"] + timings["first_request"]
+    assert serving <= COLD_START_BUDGET_SECONDS, (
+        f"cold start took {serving:.2f}s (import {timings['import']:.2f}s, "
+        f"startup {timings['startup']:.2f}s, "
+        f"first request {timings['first_request']:.2f}s), "
+        f"budget {COLD_START_BUDGET_SECONDS}s"
+    )
+
+
+def test_import_creates_no_resources():
+    # The Mongo engine would construct a client at import time if any
+    # resource escaped the lifespan
+    env = {**cold_start.child_env(), "STORAGE_ENGINE": "mongo"}
+    subprocess.run(
+        [sys.executable, "-c",
+         "import server; "
+         "assert server.client is None and server.status_checks is None"],
+        cwd=cold_start.BACKEND_DIR,
+        env=env,
+        check=True,
+    )
+
+
+@pytest.mark.anyio
+async def test_lifespan_creates_and_releases_resources():
+    async with server.app.router.lifespan_context(server.app):
+        assert server.status_checks is not None
+        assert server.status_cache is not None
+        broker = server.status_broker
+        subscription = broker.subscribe()
+
+    assert subscription.closed
+    assert server.status_checks is None and server.status_broker is None
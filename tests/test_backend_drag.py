@@ -0,0 +1,92 @@
+"""
+Drag updates over the board WebSocket: events are coalesced in memory and
+persisted per tick, so writes follow entries moved rather than event rate.
+"""
+import asyncio
+
+import pytest
+from starlette.testclient import TestClient
+
+import server
+from drag import DragCoalescer
+
+BOARD = "board-1"
+
+
+@pytest.mark.anyio
+async def test_writes_are_bounded_by_entries_moved_per_tick():
+    writes = []
+
+    async def persist(board_id, positions):
+        writes.append((board_id, dict(positions)))
+        return len(positions)
+
+    coalescer = DragCoalescer(persist, tick=0.02)
+    coalescer.start()
+    events = 0
+    for step in range(100):
+        for entry_id in ("a", "b", "c"):
+            coalescer.move(BOARD, entry_id, step, step)
+            events += 1
+        await asyncio.sleep(0.002)
+    await coalescer.close()
+
+    written = sum(len(positions) for _, positions in writes)
+    assert written <= 3 * len(writes) < events
+    assert writes[-1][1] == {"a": (99, 99), "b": (99, 99), "c": (99, 99)}
+    assert coalescer.pending == 0
+
+
+@pytest.mark.anyio
+async def test_failed_tick_is_retried_with_newer_positions_winning():
+    attempts = []
+
+    async def persist(board_id, positions):
+        attempts.append(dict(positions))
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+        return len(positions)
+
+    coalescer = DragCoalescer(persist, tick=60)
+    coalescer.move(BOARD, "a", 1, 1)
+    coalescer.move(BOARD, "b", 1, 1)
+    await coalescer.flush()
+    coalescer.move(BOARD, "a", 2, 2)
+    await coalescer.close()
+
+    assert attempts == [{"a": (1, 1), "b": (1, 1)}, {"a": (2, 2), "b": (1, 1)}]
+
+
+def test_drag_socket_coalesces_moves_into_one_write_per_entry(monkeypatch):
+    # A tick longer than the test: everything lands in the shutdown flush
+    monkeypatch.setenv("DRAG_TICK_MS", "60000")
+    with TestClient(server.app) as client:
+        entries, ops = server.board_entries, server.board_ops
+        ids = [
+            client.post(
+                f"/api/boards/{BOARD}/entries",
+                json={"user_id": "u", "title": title, "x": 0, "y": 0},
+            ).json()["id"]
+            for title in "ab"
+        ]
+        with client.websocket_connect(f"/api/boards/{BOARD}/drag") as socket:
+            for step in range(1, 201):
+                socket.send_json(
+                    [{"id": entry_id, "x": step, "y": -step} for entry_id in ids]
+                )
+            socket.send_json({"id": "missing", "x": 1, "y": 1})
+            socket.send_text('{"id": "a", "x": "left"}')
+            # The reply also shows every earlier message was taken in
+            assert "error" in socket.receive_json()
+
+    async def stored():
+        return ([await entries.get(BOARD, entry_id) for entry_id in ids],
+                (await ops.since(BOARD, 2, 100))[0])
+
+    docs, moves = asyncio.run(stored())
+    assert [(doc["x"], doc["y"], doc["version"]) for doc in docs] == [
+        (200, -200, 2)
+    ] * 2
+    assert [(op["op"], op["id"], op["origin"]) for op in moves] == [
+        ("move", entry_id, "drag") for entry_id in ids
+    ]
@@ -0,0 +1,160 @@
+"""
+Board entries: the viewport query must return exactly the entries whose
+footprint meets the box, on every storage engine, as entries move.
+"""
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from entries import VersionConflict, footprint
+from spatial import BBox
+
+pytestmark = pytest.mark.anyio
+
+BOARD = "board-1"
+
+
+def entry(entry_id, x, y, board_id=BOARD):
+    return {
+        "id": entry_id,
+        "board_id": board_id,
+        "user_id": "user-1",
+        "title": entry_id,
+        "commentary": None,
+        "color": "butter",
+        "image_path": None,
+        "x": x,
+        "y": y,
+        "rotation": 0.0,
+        "z_key": "V",
+        "version": 1,
+        "created_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+    }
+
+
+async def test_viewport_query_matches_brute_force(entry_repo):
+    rng = random.Random(7)
+    docs = [
+        entry(str(i), rng.uniform(0, 5000), rng.uniform(0, 5000))
+        for i in range(500)
+    ]
+    for doc in docs:
+        await entry_repo.insert(doc)
+    await entry_repo.insert(entry("other-board", 100, 100, board_id="board-2"))
+
+    for _ in range(20):
+        x0, y0 = rng.uniform(-200, 5000), rng.uniform(-200, 5000)
+        viewport = BBox(
+            x0, y0, x0 + rng.uniform(10, 2000), y0 + rng.uniform(10, 2000)
+        )
+        found = {doc["id"] for doc in await entry_repo.in_bbox(BOARD, viewport)}
+        assert found == {
+            doc["id"] for doc in docs if footprint(doc).intersects(viewport)
+        }
+
+
+async def test_moved_entry_is_found_at_its_new_position(entry_repo):
+    await entry_repo.insert(entry("a", 100, 100))
+    moved = await entry_repo.update(BOARD, "a", {"x": 4000.0, "y": 4000.0})
+
+    assert (moved["x"], moved["y"]) == (4000.0, 4000.0)
+    assert await entry_repo.in_bbox(BOARD, BBox(0, 0, 500, 500)) == []
+    assert [
+        doc["id"]
+        for doc in await entry_repo.in_bbox(BOARD, BBox(3900, 3900, 4100, 4100))
+    ] == ["a"]
+
+
+async def test_deleted_entry_leaves_the_index(entry_repo):
+    await entry_repo.insert(entry("a", 100, 100))
+
+    assert await entry_repo.delete(BOARD, "a")
+    assert not await entry_repo.delete(BOARD, "a")
+    assert await entry_repo.in_bbox(BOARD, BBox(0, 0, 500, 500)) == []
+
+
+async def test_stacked_entries_are_unaffected_by_later_writes(entry_repo):
+    await entry_repo.insert(entry("a", 100, 100))
+    stacked = await entry_repo.stacked(BOARD)
+    await entry_repo.update(BOARD, "a", {"x": 4000.0, "title": "moved"})
+
+    assert (stacked[0]["x"], stacked[0]["title"]) == (100, "a")
+
+
+async def test_entries_api_round_trip(api, entry_repo):
+    response = await api.post(
+        f"/api/boards/{BOARD}/entries",
+        json={"user_id": "user-1", "title": "ramen", "x": 2500, "y": 2500},
+    )
+    assert response.status_code == 200
+    created = response.json()
+    assert created["board_id"] == BOARD and created["color"] == "butter"
+
+    response = await api.get(
+        f"/api/boards/{BOARD}/entries", params={"bbox": "2400,2400,2600,2600"}
+    )
+    assert [row["id"] for row in response.json()] == [created["id"]]
+    response = await api.get(
+        f"/api/boards/{BOARD}/entries", params={"bbox": "0,0,1000,1000"}
+    )
+    assert response.json() == []
+
+    url = f"/api/boards/{BOARD}/entries/{created['id']}"
+    response = await api.patch(
+        url, json={"x": 100, "y": 200, "commentary": "late night"}
+    )
+    assert (response.json()["x"], response.json()["commentary"]) == (
+        100,
+        "late night",
+    )
+    assert (await api.get(url)).json()["y"] == 200
+
+    assert (await api.delete(url)).status_code == 204
+    assert (await api.get(url)).status_code == 404
+
+
+async def test_entries_api_rejects_bad_input(api, entry_repo):
+    for bbox in ("1,2,3", "a,b,c,d", "10,0,0,10", "0,0,inf,10"):
+        response = await api.get(
+            f"/api/boards/{BOARD}/entries", params={"bbox": bbox}
+        )
+        assert response.status_code == 400, bbox
+
+    response = await api.post(
+        f"/api/boards/{BOARD}/entries",
+        json={"user_id": "user-1", "title": "x", "x": 0, "y": 0},
+    )
+    url = f"/api/boards/{BOARD}/entries/{response.json()['id']}"
+    assert (await api.patch(url, json={"x": 10})).status_code == 422
+    assert (await api.patch(url, json={"title": None})).status_code == 422
+    assert (
+        await api.patch(
+            f"/api/boards/{BOARD}/entries/missing", json={"rotation": 3}
+        )
+    ).status_code == 404
+
+
+async def test_conditional_writes_check_the_version(entry_repo):
+    await entry_repo.insert(entry("a", 100, 100))
+
+    updated = await entry_repo.update(
+        BOARD, "a", {"color": "sky"}, expected_version=1
+    )
+    assert updated["version"] == 2
+    with pytest.raises(VersionConflict) as conflict:
+        await entry_repo.update(BOARD, "a", {"color": "mint"}, expected_version=1)
+    assert (
+        conflict.value.current["version"],
+        conflict.value.current["color"],
+    ) == (2, "sky")
+    with pytest.raises(VersionConflict):
+        await entry_repo.delete(BOARD, "a", expected_version=1)
+
+    assert (
+        await entry_repo.update(
+            BOARD, "missing", {"color": "sky"}, expected_version=1
+        )
+        is None
+    )
+    assert await entry_repo.delete(BOARD, "a", expected_version=2)
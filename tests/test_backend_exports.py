@@ -0,0 +1,212 @@
+"""
+Board exports: bands render in worker processes and join into one valid PNG
+or PDF, and jobs report their progress and stay within their limits.
+"""
+import re
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+import pytest
+
+import render
+import server
+
+pytestmark = pytest.mark.anyio
+
+BOARD = "board-1"
+
+
+def png_pixels(data: bytes):
+    """Width, height and the raw filtered rows of a PNG written by render.py."""
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    position, idat, header = 8, b"", None
+    while position < len(data):
+        length, kind = struct.unpack(">I4s", data[position:position + 8])
+        chunk = data[position + 8:position + 8 + length]
+        end = position + 8 + length
+        crc, = struct.unpack(">I", data[end:end + 4])
+        assert crc == zlib.crc32(kind + chunk)
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif kind == b"IDAT":
+            idat += chunk
+        position += 12 + length
+    width, height = header[:2]
+    # Checks the combined Adler-32 too
+    return width, height, zlib.decompress(idat)
+
+
+def pixel(raw: bytes, width: int, x: int, y: int):
+    start = y * (1 + 3 * width) + 1 + 3 * x
+    return tuple(raw[start:start + 3])
+
+
+def test_adler32_combine_matches_zlib():
+    first, second = b"polaroid " * 1000, b"board" * 77
+    combined = render.adler32_combine(
+        zlib.adler32(first), zlib.adler32(second), len(second)
+    )
+    assert combined == zlib.adler32(first + second)
+    assert render.adler32_combine(
+        1, zlib.adler32(first), len(first)
+    ) == zlib.adler32(first)
+
+
+@pytest.mark.parametrize("rows", [7, 64, 10_000])
+def test_bands_join_into_one_image(rows):
+    entries = [
+        {"x": 0, "y": 0, "color": "sky"},
+        {"x": 60, "y": 100, "color": "butter"},
+    ]
+    width, height, cards = render.layout(entries, scale=1)
+    assert (width, height) == (260, 320)
+    bands = render.split_bands(cards, height, rows)
+
+    encoder = render.PngEncoder(width, height, 1)
+    data, adler = encoder.head(), 1
+    for index, band in enumerate(bands):
+        top = index * rows
+        chunk, band_adler, length = render.render_band(
+            band, width, top, min(rows, height - top), 1, index == len(bands) - 1
+        )
+        adler = render.adler32_combine(adler, band_adler, length)
+        data += encoder.segment(chunk)
+    data += encoder.tail(adler)
+
+    assert png_pixels(data)[:2] == (width, height)
+    raw = png_pixels(data)[2]
+    assert len(raw) == height * (1 + 3 * width)
+    assert pixel(raw, width, 0, 0) == render.BACKGROUND
+    # The sky card's photo, its white frame, and the butter card on top of it
+    assert pixel(raw, width, 40 + 20, 40 + 20) == render.COLORS["sky"]
+    assert pixel(raw, width, 40 + 4, 40 + 4) == render.CARD
+    assert pixel(raw, width, 100 + 20, 140 + 20) == render.COLORS["butter"]
+
+
+def check_pdf(data: bytes, width: int, height: int):
+    assert data.startswith(b"%PDF-1.4") and data.endswith(b"%%EOF\n")
+    xref = int(re.search(rb"startxref\n(\d+)", data).group(1))
+    assert data[xref:xref + 4] == b"xref"
+    offsets = [
+        int(offset) for offset in re.findall(rb"(\d{10}) 00000 n", data[xref:])
+    ]
+    for number, offset in enumerate(offsets, 1):
+        assert data[offset:].startswith(b"%d 0 obj" % number)
+    length = int(re.search(rb"6 0 obj\n(\d+)", data).group(1))
+    start = data.index(b"stream\n", offsets[4]) + len(b"stream\n")
+    assert data[start + length:].startswith(b"\nendstream")
+    raw = zlib.decompress(data[start:start + length])
+    assert len(raw) == height * (1 + 3 * width)
+
+
+@pytest.fixture
+def export_dir(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "EXPORT_DIR", tmp_path)
+    monkeypatch.setattr(server.export_runner, "directory", tmp_path)
+    return tmp_path
+
+
+async def create(api, x, y, color):
+    response = await api.post(
+        f"/api/boards/{BOARD}/entries",
+        json={"user_id": "user-1", "title": "t", "x": x, "y": y, "color": color},
+    )
+    return response.json()
+
+
+@pytest.mark.parametrize("format", ["png", "pdf"])
+async def test_export_renders_the_board(
+    api, entry_repo, op_log, export_dir, monkeypatch, format
+):
+    # Small bands, so the job has several
+    monkeypatch.setattr(render, "band_rows", lambda width: 50)
+    await create(api, 1000, 1000, "grass")
+    await create(api, 1500, 1200, "mint")
+
+    response = await api.post(
+        f"/api/boards/{BOARD}/exports", json={"format": format, "scale": 0.5}
+    )
+    assert response.status_code == 202
+    job = response.json()
+    assert (
+        job["status"] == "queued"
+        and job["url"] == f"/api/exports/{job['id']}/download"
+    )
+    await server.export_runner.wait()
+
+    job = (await api.get(f"/api/exports/{job['id']}")).json()
+    assert job["status"] == "done" and job["progress"] == 1
+    assert (job["width"], job["height"]) == (350, 210)
+    download = await api.get(job["url"])
+    assert download.status_code == 200 and len(download.content) == job["size"]
+    assert download.headers["content-type"] == render.ENCODERS[format].media_type
+    assert f"board-{BOARD}.{format}" in download.headers["content-disposition"]
+    if format == "png":
+        width, height, raw = png_pixels(download.content)
+        assert pixel(raw, width, 20 + 10, 20 + 10) == render.COLORS["grass"]
+    else:
+        check_pdf(download.content, 350, 210)
+    assert [path.name for path in export_dir.iterdir()] == [
+        f"{job['id']}.{format}"
+    ]
+
+
+async def test_export_limits(api, entry_repo, op_log, export_dir, monkeypatch):
+    assert (
+        await api.post(f"/api/boards/{BOARD}/exports", json={})
+    ).status_code == 400
+    await create(api, 0, 0, "sky")
+    await create(api, 5000, 5000, "sky")
+    response = await api.post(f"/api/boards/{BOARD}/exports", json={"scale": 8})
+    assert (
+        response.status_code == 400 and "lower scale" in response.json()["detail"]
+    )
+
+    monkeypatch.setattr(server.export_runner, "max_jobs", 0)
+    response = await api.post(f"/api/boards/{BOARD}/exports", json={"scale": 0.1})
+    assert response.status_code == 503 and "retry-after" in response.headers
+
+    assert (await api.get("/api/exports/missing")).status_code == 404
+    assert (await api.get("/api/exports/missing/download")).status_code == 404
+
+
+async def test_failed_export_is_reported(
+    api, entry_repo, op_log, export_dir, monkeypatch
+):
+    async def broken(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(server.export_runner, "_render_band", broken)
+    await create(api, 0, 0, "sky")
+    job = (
+        await api.post(f"/api/boards/{BOARD}/exports", json={"scale": 1})
+    ).json()
+    await server.export_runner.wait()
+
+    job = (await api.get(f"/api/exports/{job['id']}")).json()
+    assert job["status"] == "failed" and job["error"] == "disk full"
+    assert (await api.get(job["url"])).status_code == 409
+    assert list(export_dir.iterdir()) == []
+
+
+async def test_expired_export_is_removed(api, entry_repo, op_log, export_dir,
+                                         monkeypatch):
+    monkeypatch.setattr(server.export_runner, "ttl", 60)
+    await create(api, 0, 0, "sky")
+    response = await api.post(f"/api/boards/{BOARD}/exports", json={"scale": 1})
+    job = response.json()
+    await server.export_runner.wait()
+    created = datetime.fromisoformat(job["created_at"])
+    expires_at = datetime.fromisoformat(job["expires_at"])
+    assert expires_at - created == timedelta(seconds=60)
+
+    # Not yet due
+    assert await server.export_runner.remove_expired() == 0
+    assert (await api.get(job["url"])).status_code == 200
+
+    await server.export_jobs.update(job["id"], {"expires_at": created})
+    assert await server.export_runner.remove_expired() == 1
+    assert (await api.get(f"/api/exports/{job['id']}")).status_code == 404
+    assert (await api.get(job["url"])).status_code == 404
+    assert list(export_dir.iterdir()) == []
@@ -0,0 +1,195 @@
+"""
+Image uploads (streamed, hashed and stored once per distinct content) and
+image serving (byte ranges, digest ETags, zero-copy sends).
+"""
+import hashlib
+import os
+
+import pytest
+
+import server
+from blob_response import BlobResponse, RangeNotSatisfiable, parse_range
+from blobs import CHUNK_SIZE, LocalBlobStore, fixed_chunks
+
+pytestmark = pytest.mark.anyio
+
+JPEG = b"\xff\xd8\xff\xe0" + os.urandom(3 * CHUNK_SIZE + 123)
+DIGEST = hashlib.sha256(JPEG).hexdigest()
+
+
+async def pieces(data, size=10_000):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def upload(api, data, user_id="user-1", **headers):
+    return await api.post(
+        "/api/images",
+        params={"user_id": user_id},
+        content=pieces(data),
+        headers={"content-type": "image/jpeg", **headers},
+    )
+
+
+async def test_fixed_chunks_rechunks_a_stream():
+    chunks = [chunk async for chunk in fixed_chunks(pieces(JPEG, 7_777))]
+    assert b"".join(chunks) == JPEG
+    assert all(len(chunk) == CHUNK_SIZE for chunk in chunks[:-1])
+
+
+async def test_upload_is_stored_once_by_digest(api, image_store):
+    blobs, records = image_store
+    first = await upload(api, JPEG)
+    assert first.status_code == 201
+    assert first.json() == {
+        "digest": DIGEST,
+        "size": len(JPEG),
+        "content_type": "image/jpeg",
+        "url": f"/api/images/{DIGEST}",
+        "deduplicated": False,
+    }
+
+    again = await upload(api, JPEG, user_id="user-2")
+    assert again.status_code == 200 and again.json()["deduplicated"]
+    assert sorted((await records.get(DIGEST))["owners"]) == ["user-1", "user-2"]
+    if hasattr(blobs, "path"):
+        stored = [path for path in blobs.root.rglob("*") if path.is_file()]
+        assert stored == [blobs.path(DIGEST)]
+        assert blobs.path(DIGEST).read_bytes() == JPEG
+
+
+async def test_known_digest_skips_the_transfer(api, image_store):
+    await upload(api, JPEG)
+
+    async def unread():
+        raise AssertionError("body was read")
+        yield b""
+
+    response = await api.post(
+        "/api/images",
+        params={"user_id": "user-2"},
+        content=unread(),
+        headers={"content-type": "image/jpeg", "x-content-sha256": DIGEST},
+    )
+    assert response.status_code == 200 and response.json()["deduplicated"]
+
+
+async def test_rejected_uploads_leave_nothing_behind(
+    api, image_store, monkeypatch
+):
+    blobs, records = image_store
+    wrong = await upload(api, JPEG, **{"x-content-sha256": "0" * 64})
+    assert wrong.status_code == 400
+    assert not await blobs.exists(DIGEST) and await records.get(DIGEST) is None
+
+    monkeypatch.setattr(server, "IMAGE_MAX_BYTES", CHUNK_SIZE)
+    assert (await upload(api, JPEG)).status_code == 413
+    assert not await blobs.exists(DIGEST)
+    if hasattr(blobs, "staging"):
+        assert list(blobs.staging.iterdir()) == []
+
+    response = await api.post(
+        "/api/images",
+        params={"user_id": "user-1"},
+        content=b"text",
+        headers={"content-type": "text/plain"},
+    )
+    assert response.status_code == 415
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 100)),
+    ("bytes=100-", (100, 1000)),
+    ("bytes=-10", (990, 1000)),
+    ("bytes=-5000", (0, 1000)),
+    ("bytes=900-5000", (900, 1000)),
+    ("bytes=0-1,5-9", None),
+    ("bytes=9-5", None),
+    ("items=0-9", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000)
+
+
+async def test_image_is_served_whole_and_cacheable(api, image_store):
+    await upload(api, JPEG)
+    response = await api.get(f"/api/images/{DIGEST}")
+    assert response.status_code == 200
+    assert response.content == JPEG
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["content-length"] == str(len(JPEG))
+    assert response.headers["etag"] == f'"{DIGEST}"'
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["accept-ranges"] == "bytes"
+
+    head = await api.head(f"/api/images/{DIGEST}")
+    assert head.status_code == 200 and head.content == b""
+    assert head.headers["content-length"] == str(len(JPEG))
+
+    revalidated = await api.get(
+        f"/api/images/{DIGEST}", headers={"if-none-match": f'"{DIGEST}"'}
+    )
+    assert (
+        revalidated.status_code == 304
+        and revalidated.headers["etag"] == f'"{DIGEST}"'
+    )
+
+
+async def test_image_byte_ranges(api, image_store):
+    await upload(api, JPEG)
+    # Spans a chunk boundary
+    start, stop = CHUNK_SIZE - 10, CHUNK_SIZE + 20
+    response = await api.get(
+        f"/api/images/{DIGEST}", headers={"range": f"bytes={start}-{stop - 1}"}
+    )
+    assert response.status_code == 206
+    assert response.content == JPEG[start:stop]
+    assert (
+        response.headers["content-range"]
+        == f"bytes {start}-{stop - 1}/{len(JPEG)}"
+    )
+
+    tail = await api.get(f"/api/images/{DIGEST}", headers={"range": "bytes=-100"})
+    assert tail.status_code == 206 and tail.content == JPEG[-100:]
+
+    stale = await api.get(
+        f"/api/images/{DIGEST}",
+        headers={"range": "bytes=0-9", "if-range": '"other"'},
+    )
+    assert stale.status_code == 200 and stale.content == JPEG
+
+    past_end = await api.get(
+        f"/api/images/{DIGEST}", headers={"range": f"bytes={len(JPEG)}-"}
+    )
+    assert past_end.status_code == 416
+    assert past_end.headers["content-range"] == f"bytes */{len(JPEG)}"
+
+
+async def test_unknown_image_is_404(api, image_store):
+    assert (await api.get(f"/api/images/{DIGEST}")).status_code == 404
+    assert (await api.get("/api/images/not-a-digest")).status_code == 404
+
+
+async def test_blob_response_streams_chunks(tmp_path):
+    store = LocalBlobStore(tmp_path)
+    digest, size, _ = await store.write(pieces(JPEG), len(JPEG))
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    byte_range = (10, 2 * CHUNK_SIZE + 20)
+    await BlobResponse(store, digest, size, "image/jpeg", byte_range)(
+        {"type": "http"}, None, send
+    )
+    bodies = [message["body"] for message in sent[1:]]
+    assert [len(body) for body in bodies] == [CHUNK_SIZE, CHUNK_SIZE, 10, 0]
+    assert b"".join(bodies) == JPEG[10:2 * CHUNK_SIZE + 20]
+    assert sent[-1].get("more_body", False) is False
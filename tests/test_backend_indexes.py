@@ -0,0 +1,144 @@
+"""
+Index and query-plan tests: each endpoint query must be served by an index.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+import status_stats
+import storage
+from .conftest import requires_mongo
+from .query_plans import assert_uses_index, assert_uses_named_index
+
+pytestmark = [pytest.mark.anyio, requires_mongo]
+
+
+@pytest.fixture(scope="module")
+async def indexed_status_checks(mongo_db):
+    repo = storage.MongoStatusCheckRepository(mongo_db, server.NATIVE_TIMESTAMPS)
+    await mongo_db.status_checks.drop()
+    await mongo_db.status_check_rollups.drop()
+    await repo.setup()
+    yield repo
+    await mongo_db.status_checks.drop()
+    await mongo_db.status_check_rollups.drop()
+
+
+async def test_setup_is_idempotent(indexed_status_checks, mongo_db):
+    await indexed_status_checks.setup()
+    names = set((await mongo_db.status_checks.index_information()).keys())
+    assert {
+        index.document["name"] for index in storage.STATUS_CHECK_INDEXES
+    } <= names
+
+
+async def test_status_list_query_uses_index(indexed_status_checks):
+    await assert_uses_index(indexed_status_checks.find())
+
+
+async def test_status_page_query_uses_index(indexed_status_checks):
+    after = (datetime(2026, 1, 1, tzinfo=timezone.utc), "x")
+    await assert_uses_index(indexed_status_checks.find(after))
+
+
+@pytest.mark.parametrize("client_name", [None, "agent"])
+async def test_status_count_query_uses_index(
+    indexed_status_checks, mongo_db, client_name
+):
+    end = datetime.now(timezone.utc)
+    query = indexed_status_checks.time_filter(
+        end - timedelta(hours=1), end, client_name
+    )
+    await assert_uses_index(mongo_db.status_checks.find(query))
+
+
+@pytest.mark.parametrize("client_name", [None, "agent"])
+async def test_status_stats_queries_use_index(
+    indexed_status_checks, mongo_db, client_name
+):
+    end = datetime.now(timezone.utc)
+    spec = status_stats.BUCKETS["5m"]
+    raw = status_stats.raw_pipeline(
+        spec, end - timedelta(hours=1), end, client_name, server.NATIVE_TIMESTAMPS
+    )
+    await assert_uses_index(mongo_db.status_checks.find(raw[0]["$match"]))
+
+    low, high = status_stats.whole_units(
+        end - timedelta(days=7), end, spec.rollup_unit
+    )
+    rollup = status_stats.rollup_pipeline(spec, low, high, client_name)
+    await assert_uses_index(
+        mongo_db.status_check_rollups.find(rollup[0]["$match"])
+    )
+
+
+@pytest.mark.parametrize("descending", [False, True])
+async def test_filtered_status_page_uses_index_without_sort(
+    indexed_status_checks, descending
+):
+    end = datetime.now(timezone.utc)
+    query = storage.StatusQuery("agent", end - timedelta(hours=1), end, descending)
+    after = (end - timedelta(minutes=30), "x")
+
+    stages = await assert_uses_index(
+        indexed_status_checks.find(after, query, ("client_name",))
+    )
+    # client_name_timestamp_id returns rows already in keyset order
+    assert "SORT" not in stages
+
+
+async def test_viewport_query_uses_spatial_index(mongo_db):
+    from entries import MongoEntryRepository
+    from spatial import BBox
+
+    repo = MongoEntryRepository(mongo_db)
+    await mongo_db.entries.drop()
+    await repo.setup()
+    try:
+        stages = await assert_uses_index(
+            repo.find_in_bbox("board", BBox(100, 100, 1500, 900))
+        )
+        assert "IXSCAN" in stages
+    finally:
+        await mongo_db.entries.drop()
+
+
+async def test_search_query_walks_term_index_without_sort(mongo_db):
+    from entries import MongoEntryRepository, RETIRED_ENTRY_INDEXES
+    from search import entry_terms
+
+    repo = MongoEntryRepository(mongo_db)
+    await mongo_db.entries.drop()
+    await mongo_db.entries.create_index("user_id", name="user_id")
+    await repo.setup()
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    docs = [
+        {
+            "id": f"e{i:04d}",
+            "board_id": f"board-{i % 10}",
+            "user_id": f"user-{i % 4}",
+            "title": ["Tokyo ramen", "Tokyo tower", "Kyoto ramen"][i % 3],
+            "commentary": f"note {i}",
+            "created_at": start + timedelta(seconds=i),
+        }
+        for i in range(2000)
+    ]
+    await mongo_db.entries.insert_many(
+        [{**doc, "search_terms": entry_terms(doc)} for doc in docs]
+    )
+    try:
+        names = set((await mongo_db.entries.index_information()).keys())
+        assert not names & set(RETIRED_ENTRY_INDEXES)
+
+        for prefixes in (["tok"], ["tok", "ram"], ["zzz"]):
+            cursor = repo.find_matching("user-1", prefixes).limit(20)
+            stages = await assert_uses_index(cursor)
+            # The index order is the result order: no in-memory sort
+            assert "IXSCAN" in stages and "SORT" not in stages
+            await assert_uses_named_index(
+                repo.find_matching("user-1", prefixes).limit(20),
+                "user_id_created_at_search_terms",
+            )
+    finally:
+        await mongo_db.entries.drop()
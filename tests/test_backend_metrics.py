@@ -0,0 +1,69 @@
+"""
+Tests for the /metrics endpoint and the metric types behind it.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram(
+        "demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0)
+    )
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "/x")
+
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/x",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{route="/x"} 3' in lines
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("demo_total", "Demo.", ("path",))
+    counter.inc('a"b\\c')
+    assert 'demo_total{path="a\\"b\\\\c"} 1' in counter.render()
+
+
+@pytest.mark.anyio
+async def test_requests_are_counted_by_route_template(api, status_repo):
+    await api.post("/api/status", json={"client_name": "agent"})
+    await api.get("/api/nowhere")
+    response = await api.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert (
+        'http_requests_total{method="POST",route="/api/status",status="200"}'
+        in body
+    )
+    assert 'route="unmatched",status="404"' in body
+    assert ('http_request_duration_seconds_bucket'
+            '{method="POST",route="/api/status",le="+Inf"}') in body
+    assert "http_requests_in_flight 1" in body  # the /metrics request itself
+
+
+def test_closed_pool_series_are_dropped():
+    listener, event = metrics.MongoPoolListener(), SimpleNamespace(
+        address=("db", 1)
+    )
+    for _ in range(2):
+        listener.connection_created(event)
+    listener.connection_checked_out(event)
+    assert metrics.mongo_pool_connections.get("db:1") == 2
+
+    listener.pool_closed(event)
+    # Closing the pool closes its connections afterwards
+    listener.connection_checked_in(event)
+    listener.connection_closed(event)
+    listener.connection_closed(event)
+    assert ("db:1",) not in dict(metrics.mongo_pool_connections.items())
+    assert ("db:1",) not in dict(metrics.mongo_pool_checked_out.items())
+
+    listener.pool_created(event)
+    listener.connection_created(event)
+    assert metrics.mongo_pool_connections.get("db:1") == 1
+    listener.pool_closed(event)
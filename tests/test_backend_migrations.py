@@ -0,0 +1,177 @@
+"""
+Backend tests for the online migrations in backend/migrations.py.
+"""
+from datetime import datetime
+
+import pytest
+
+import migrations
+from .conftest import requires_mongo
+
+pytestmark = [pytest.mark.anyio, requires_mongo]
+
+
+@pytest.fixture
+async def legacy_status_checks(mongo_db):
+    await mongo_db.status_checks.delete_many({})
+    await mongo_db.migrations.delete_many({})
+    await mongo_db.status_checks.insert_many(
+        [
+            {
+                "id": str(i),
+                "client_name": "agent",
+                "timestamp": f"2026-01-01T00:00:0{i}+00:00",
+            }
+            for i in range(5)
+        ]
+    )
+    yield
+    await mongo_db.status_checks.delete_many({})
+    await mongo_db.migrations.delete_many({})
+
+
+async def test_backfill_converts_string_timestamps(legacy_status_checks, mongo_db):
+    converted = await migrations.backfill_status_timestamps(mongo_db, batch_size=2)
+
+    assert converted == 5
+    async for doc in mongo_db.status_checks.find({}):
+        assert isinstance(doc["timestamp"], datetime)
+    state = await mongo_db.migrations.find_one(
+        {"_id": migrations.STATUS_TIMESTAMP_BACKFILL}
+    )
+    assert state["converted"] == 5 and "completed_at" in state
+
+
+async def test_backfill_resumes_from_checkpoint(legacy_status_checks, mongo_db):
+    await migrations.backfill_status_timestamps(mongo_db, batch_size=2)
+    # A rerun finds nothing left to convert
+    assert await migrations.backfill_status_timestamps(mongo_db, batch_size=2) == 0
+
+
+async def test_native_startup_waits_for_the_backfill(
+    legacy_status_checks, mongo_db
+):
+    from bson import ObjectId
+    from storage import MongoStatusCheckRepository
+
+    repo = MongoStatusCheckRepository(mongo_db, native_timestamps=True)
+    with pytest.raises(RuntimeError, match="backfill-status-timestamps"):
+        await repo.setup()
+    await migrations.backfill_status_timestamps(mongo_db)
+    await repo.setup()
+
+    # Written after the backfill, below its checkpoint: the next run finds it
+    await mongo_db.status_checks.insert_one(
+        {
+            "_id": ObjectId("000000000000000000000000"),
+            "id": "late",
+            "client_name": "agent",
+            "timestamp": "2026-01-01T00:01:00+00:00",
+        }
+    )
+    with pytest.raises(RuntimeError):
+        await repo.setup()
+    assert await migrations.backfill_status_timestamps(mongo_db) == 1
+    await repo.setup()
+
+
+async def test_entry_tile_backfill_rebuilds_incremental_tiles(mongo_db):
+    from entries import MongoEntryRepository
+
+    repo = MongoEntryRepository(mongo_db)
+    await mongo_db.entries.drop()
+    await mongo_db.entry_tiles.drop()
+    await repo.setup()
+    try:
+        for i in range(30):
+            await repo.insert(
+                {
+                    "id": str(i),
+                    "board_id": "b",
+                    "user_id": "u",
+                    "title": str(i),
+                    "color": "mint" if i % 3 else "sky",
+                    "x": i * 150.0,
+                    "y": i * 90.0,
+                    "z_key": str(i % 7 + 1),
+                }
+            )
+        projection = {"_id": 0, "rebuilt_at": 0}
+        incremental = (
+            await mongo_db.entry_tiles.find({}, projection)
+            .sort("tile")
+            .to_list(None)
+        )
+        await mongo_db.entry_tiles.insert_one(
+            {"board_id": "gone", "level": 9, "tile": 0, "count": 1}
+        )
+
+        assert await migrations.backfill_entry_tiles(mongo_db) == 1
+        rebuilt = (
+            await mongo_db.entry_tiles.find({}, projection)
+            .sort("tile")
+            .to_list(None)
+        )
+        key = lambda tile: (tile["level"], tile["tile"])  # noqa: E731
+        assert sorted(rebuilt, key=key) == sorted(incremental, key=key)
+    finally:
+        await mongo_db.entries.drop()
+        await mongo_db.entry_tiles.drop()
+
+
+async def test_entry_version_backfill_only_touches_unversioned_entries(mongo_db):
+    await mongo_db.entries.drop()
+    try:
+        await mongo_db.entries.insert_many(
+            [
+                {"id": "old", "board_id": "b"},
+                {"id": "new", "board_id": "b", "version": 4},
+            ]
+        )
+
+        assert await migrations.backfill_entry_versions(mongo_db) == 1
+        assert await migrations.backfill_entry_versions(mongo_db) == 0
+        versions = {
+            doc["id"]: doc["version"] async for doc in mongo_db.entries.find()
+        }
+        assert versions == {"old": 1, "new": 4}
+    finally:
+        await mongo_db.entries.drop()
+
+
+async def test_entry_search_terms_backfill_indexes_unindexed_entries(mongo_db):
+    await mongo_db.entries.drop()
+    try:
+        await mongo_db.entries.insert_many(
+            [
+                {
+                    "id": "old",
+                    "board_id": "b",
+                    "title": "Tokyo ramen",
+                    "commentary": "Late night",
+                },
+                {"id": "bare", "board_id": "b", "title": "Café"},
+                {
+                    "id": "new",
+                    "board_id": "b",
+                    "title": "Kept",
+                    "search_terms": ["kept"],
+                },
+            ]
+        )
+
+        assert (
+            await migrations.backfill_entry_search_terms(mongo_db, batch_size=1)
+            == 2
+        )
+        assert await migrations.backfill_entry_search_terms(mongo_db) == 0
+        terms = {
+            doc["id"]: doc["search_terms"] async for doc in mongo_db.entries.find()
+        }
+        assert terms == {
+            "old": ["tokyo", "ramen", "late", "night"],
+            "bare": ["cafe"],
+            "new": ["kept"],
+        }
+    finally:
+        await mongo_db.entries.drop()
@@ -0,0 +1,86 @@
+"""
+Tests for Mongo connection pool configuration and statistics.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import mongo_pool
+from .conftest import requires_mongo
+
+
+def test_pool_options_from_env(monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "20")
+    monkeypatch.setenv("MONGO_MIN_POOL_SIZE", "4")
+    monkeypatch.setenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "250")
+    monkeypatch.delenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", raising=False)
+
+    assert mongo_pool.pool_options_from_env() == {
+        "maxPoolSize": 20, "minPoolSize": 4, "waitQueueTimeoutMS": 250,
+    }
+
+
+def test_pool_stats_report_configuration():
+    client = AsyncIOMotorClient(
+        "mongodb://localhost:1",
+        maxPoolSize=8,
+        minPoolSize=2,
+        waitQueueTimeoutMS=500,
+        serverSelectionTimeoutMS=1000,
+    )
+    try:
+        stats = mongo_pool.pool_stats(client)
+    finally:
+        client.close()
+
+    assert stats["max_pool_size"] == 8
+    assert stats["min_pool_size"] == 2
+    assert stats["wait_queue_timeout_ms"] == 500
+    assert stats["server_selection_timeout_ms"] == 1000
+
+
+@pytest.mark.anyio
+async def test_warm_up_waits_for_the_selected_servers_pool():
+    primary, secondary = ("primary", 27017), ("secondary", 27017)
+    connections = mongo_pool.ConnectionCounter()
+
+    def opened(address, count):
+        for _ in range(count):
+            connections.connection_created(SimpleNamespace(address=address))
+
+    async def ping(command):
+        pass
+
+    client = SimpleNamespace(admin=SimpleNamespace(command=ping), address=primary)
+    # The secondary's pool fills first; it must not end the wait
+    opened(secondary, 3)
+    opened(primary, 1)
+    assert await mongo_pool.warm_up(client, connections, 3, timeout=0.05) == 1
+
+    async def fill():
+        await asyncio.sleep(0.02)
+        opened(primary, 2)
+
+    filling = asyncio.create_task(fill())
+    assert await mongo_pool.warm_up(client, connections, 3, timeout=5) == 3
+    await filling
+
+    connections.pool_closed(SimpleNamespace(address=primary))
+    connections.connection_closed(SimpleNamespace(address=primary))
+    assert connections.open(primary) == 0 and connections.open(None) == 3
+
+
+@requires_mongo
+@pytest.mark.anyio
+async def test_warm_up_opens_min_pool_size_connections():
+    import os
+
+    connections = mongo_pool.ConnectionCounter()
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], minPoolSize=3,
+                                event_listeners=[connections])
+    try:
+        assert await mongo_pool.warm_up(client, connections, 3, timeout=5) >= 3
+    finally:
+        client.close()
@@ -0,0 +1,197 @@
+"""
+Board op log: batched ops with per-entry versions, coalesced drags and
+pulls from a sync position.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from oplog import InMemoryOpLogRepository, OpLogTrimmed, coalesce_moves, contiguous
+
+pytestmark = pytest.mark.anyio
+
+BOARD = "board-1"
+
+
+def move(entry_id, x, y, base_version=None):
+    return {
+        "op": "move",
+        "id": entry_id,
+        "x": x,
+        "y": y,
+        "base_version": base_version,
+    }
+
+
+def test_coalesce_moves_keeps_the_last_position_of_each_run():
+    ops = [
+        move("a", 1, 1, base_version=3),
+        move("b", 5, 5),
+        move("a", 2, 2),
+        {"op": "recolor", "id": "a", "color": "sky"},
+        move("a", 3, 3),
+        move("a", 4, 4),
+    ]
+
+    assert coalesce_moves(ops) == [
+        (move("a", 2, 2, base_version=3), [0, 2]),
+        (move("b", 5, 5), [1]),
+        ({"op": "recolor", "id": "a", "color": "sky"}, [3]),
+        (move("a", 4, 4), [4, 5]),
+    ]
+
+
+def test_contiguous_waits_for_young_gaps_and_skips_old_ones():
+    now = datetime.now(timezone.utc)
+    old, young = now - timedelta(seconds=60), now
+
+    def ops(*seqs, at):
+        return [{"seq": seq, "at": at} for seq in seqs]
+
+    assert [
+        op["seq"] for op in contiguous(ops(1, 2, 4, 5, at=young), 0, now, 5)
+    ] == [1, 2]
+    assert [
+        op["seq"] for op in contiguous(ops(1, 2, 4, 5, at=old), 0, now, 5)
+    ] == [1, 2, 4, 5]
+    assert contiguous(ops(2, 3, at=young), 0, now, 5) == []
+    with pytest.raises(OpLogTrimmed):
+        contiguous(ops(2, 3, at=old), 0, now, 5)
+
+
+async def test_pull_pages_through_the_log(op_log):
+    logged = await op_log.append(
+        BOARD,
+        [
+            {
+                "op": "delete",
+                "id": str(i),
+                "version": None,
+                "changes": {},
+                "origin": None,
+            }
+            for i in range(5)
+        ],
+    )
+    await op_log.append("board-2", [{"op": "delete", "id": "x", "version": None,
+                                     "changes": {}, "origin": None}])
+    assert [op["seq"] for op in logged] == [1, 2, 3, 4, 5]
+
+    ops, more = await op_log.since(BOARD, 0, 3)
+    assert [op["id"] for op in ops] == ["0", "1", "2"] and more
+    ops, more = await op_log.since(BOARD, 3, 3)
+    assert [op["seq"] for op in ops] == [4, 5] and not more
+    assert await op_log.since(BOARD, 5, 3) == ([], False)
+    assert await op_log.head(BOARD) == 5
+    with pytest.raises(OpLogTrimmed):
+        await op_log.since(BOARD, 9, 3)
+
+
+async def test_memory_log_keeps_the_latest_ops():
+    repo = InMemoryOpLogRepository(max_ops=3)
+    await repo.append(BOARD, [{"op": "delete", "id": str(i)} for i in range(5)])
+
+    assert [op["seq"] for op in (await repo.since(BOARD, 2, 10))[0]] == [3, 4, 5]
+    with pytest.raises(OpLogTrimmed):
+        await repo.since(BOARD, 1, 10)
+
+
+async def create(api, title, x=100, y=100):
+    response = await api.post(
+        f"/api/boards/{BOARD}/entries",
+        json={"user_id": "user-1", "title": title, "x": x, "y": y},
+    )
+    return response.json()
+
+
+async def test_drag_is_coalesced_into_one_write(api, entry_repo, op_log):
+    entry = await create(api, "ramen")
+    assert entry["version"] == 1
+
+    drag = [
+        {
+            "op": "move",
+            "id": entry["id"],
+            "x": 100 + step,
+            "y": 100,
+            "base_version": 1,
+        }
+        for step in range(1, 31)
+    ]
+    response = await api.post(
+        f"/api/boards/{BOARD}/ops", json={"client_id": "tab-1", "ops": drag}
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 30
+    assert {
+        (result["status"], result["version"], result["seq"]) for result in results
+    } == {("applied", 2, 2)}
+    assert (await api.get(f"/api/boards/{BOARD}/entries/{entry['id']}")).json()[
+        "x"
+    ] == 130
+
+    page = (await api.get(f"/api/boards/{BOARD}/ops", params={"since": 1})).json()
+    assert page["position"] == 2 and not page["more"]
+    assert [
+        (op["op"], op["version"], op["changes"], op["origin"])
+        for op in page["ops"]
+    ] == [("move", 2, {"x": 130, "y": 100}, "tab-1")]
+
+
+async def test_ops_report_conflicts_and_missing_entries(api, entry_repo, op_log):
+    entry = await create(api, "ramen")
+    ops = [
+        {"op": "recolor", "id": entry["id"], "color": "sky", "base_version": 1},
+        {"op": "z_order", "id": entry["id"], "to": "back", "base_version": 1},
+        {"op": "z_order", "id": entry["id"], "to": "back"},
+        {"op": "delete", "id": "missing"},
+    ]
+    results = (
+        await api.post(f"/api/boards/{BOARD}/ops", json={"ops": ops})
+    ).json()["results"]
+
+    assert [result["status"] for result in results] == [
+        "applied",
+        "conflict",
+        "applied",
+        "not_found",
+    ]
+    assert (results[1]["entry"]["version"], results[1]["entry"]["color"]) == (
+        2,
+        "sky",
+    )
+    assert results[2]["version"] == 3
+
+    page = (await api.get(f"/api/boards/{BOARD}/ops")).json()
+    assert [(op["op"], op["version"]) for op in page["ops"]] == [
+        ("create", 1),
+        ("recolor", 2),
+        ("z_order", 3),
+    ]
+
+    response = await api.post(
+        f"/api/boards/{BOARD}/ops",
+        json={"ops": [{"op": "delete", "id": entry["id"], "base_version": 3}]},
+    )
+    assert response.json()["results"][0] == {
+        "status": "applied",
+        "seq": 4,
+        "version": None,
+        "entry": None,
+    }
+
+
+async def test_stale_sync_position_is_410_with_the_head(api, entry_repo, op_log):
+    await create(api, "ramen")
+
+    response = await api.get(f"/api/boards/{BOARD}/ops", params={"since": 7})
+    assert response.status_code == 410
+    assert response.json()["position"] == 1
+
+
+async def test_rejects_malformed_batches(api, entry_repo, op_log):
+    for body in ({"ops": []}, {"ops": [{"op": "resize", "id": "a"}]},
+                 {"ops": [{"op": "move", "id": "a", "x": 1}]}):
+        response = await api.post(f"/api/boards/{BOARD}/ops", json=body)
+        assert response.status_code == 422, body
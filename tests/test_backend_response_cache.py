@@ -0,0 +1,49 @@
+"""
+Tests for the versioned response cache behind GET /api/status.
+"""
+from response_cache import ResponseCache, content_etag, etag_matches
+
+
+def test_cached_body_is_served_until_version_bump():
+    cache = ResponseCache()
+    cache.put(("page", None), cache.version, b"[]")
+    assert cache.get(("page", None)).body == b"[]"
+
+    cache.bump()
+    assert cache.get(("page", None)) is None
+
+
+def test_body_built_across_a_write_is_not_cached():
+    cache = ResponseCache()
+    version = cache.version
+    cache.bump()  # a write lands while the page is being queried
+    entry = cache.put("key", version, b"[1]")
+
+    assert entry.etag == content_etag(b"[1]")
+    assert cache.get("key") is None
+
+
+def test_entries_expire_after_ttl():
+    cache = ResponseCache(ttl=0)
+    cache.put("key", cache.version, b"[]")
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, cache.version, key.encode())
+    cache.get("a")
+    cache.put("c", cache.version, b"c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+
+def test_etag_matching():
+    etag = content_etag(b"[]")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
@@ -0,0 +1,121 @@
+"""
+Search over entry titles and commentary: terms are folded, every query word
+is a prefix, and the index follows entry writes.
+"""
+import pytest
+
+from search import TermIndex, terms
+
+pytestmark = pytest.mark.anyio
+
+
+def test_terms_are_folded_words():
+    assert terms("Tokyo RAMEN, tokyo-style Café!") == [
+        "tokyo",
+        "ramen",
+        "style",
+        "cafe",
+    ]
+    assert terms("  ...  ") == [] and terms(None) == []
+    assert terms("x" * 100) == ["x" * 32]
+
+
+def test_term_index_matches_every_prefix_newest_first():
+    index = TermIndex()
+    index.add("a", terms("Tokyo ramen"), (1,))
+    index.add("b", terms("Tokyo tower"), (2,))
+    index.add("c", terms("Kyoto ramen"), (3,))
+    assert index.search(["tok"], 10) == ["b", "a"]
+    assert index.search(["ram", "tok"], 10) == ["a"]
+    assert index.search(["r"], 1) == ["c"]
+    assert index.search(["tokyoo"], 10) == []
+
+    index.add("a", terms("Osaka"), (4,))
+    index.remove("b")
+    index.remove("b")
+    assert index.search(["tok"], 10) == [] and len(index) == 2
+    assert index.search(["osa"], 10) == ["a"]
+
+
+@pytest.mark.parametrize("common", [True, False])
+def test_term_index_walk_and_collect_agree(common):
+    # Common terms are found by walking the ranks, rare ones by collecting
+    index = TermIndex()
+    for i in range(1000):
+        words = (
+            ["every", f"word{i % 7}"] if common else [f"rare{i}x", f"word{i % 7}"]
+        )
+        index.add(i, words, (i % 13, i))
+    expected = sorted(
+        (i for i in range(1000) if i % 7 == 3),
+        key=lambda i: (i % 13, i),
+        reverse=True,
+    )
+    assert index.search(["word3"], 25) == expected[:25]
+    assert index.search(["rare3x", "word"], 5) == ([] if common else [3])
+
+
+async def create(api, board_id, title, commentary=None, user_id="user-1"):
+    response = await api.post(
+        f"/api/boards/{board_id}/entries",
+        json={
+            "user_id": user_id,
+            "title": title,
+            "commentary": commentary,
+            "x": 0,
+            "y": 0,
+        },
+    )
+    return response.json()
+
+
+async def titles(api, q, user_id="user-1", **params):
+    response = await api.get(
+        "/api/search", params={"q": q, "user_id": user_id, **params}
+    )
+    assert response.status_code == 200, response.text
+    return [entry["title"] for entry in response.json()]
+
+
+async def test_search_finds_prefixes_across_boards(api, entry_repo, op_log):
+    await create(api, "trip", "Tokyo ramen", "The tiny shop in Shinjuku")
+    await create(api, "trip", "Kyoto temples")
+    await create(api, "food", "Ramen night", "Not in Tokyo")
+    await create(api, "food", "Tokyo ramen", user_id="user-2")
+
+    assert await titles(api, "that tok RAM") == []
+    assert await titles(api, "tok ram") == ["Ramen night", "Tokyo ramen"]
+    assert await titles(api, "shinj") == ["Tokyo ramen"]
+    assert await titles(api, "ramen", limit=1) == ["Ramen night"]
+    assert await titles(api, "tok", user_id="user-2") == ["Tokyo ramen"]
+    assert await titles(api, "tok", user_id="user-3") == []
+
+
+async def test_search_follows_edits_and_deletes(api, entry_repo, op_log):
+    entry = await create(api, "trip", "Tokyo ramen", "Shinjuku")
+    await api.patch(
+        f"/api/boards/trip/entries/{entry['id']}", json={"commentary": None}
+    )
+    assert await titles(api, "shinjuku") == []
+    await api.patch(
+        f"/api/boards/trip/entries/{entry['id']}",
+        json={"title": "Osaka okonomiyaki"},
+    )
+    assert await titles(api, "tokyo") == []
+    assert await titles(api, "osaka") == ["Osaka okonomiyaki"]
+    # Moves leave the terms alone
+    await api.patch(
+        f"/api/boards/trip/entries/{entry['id']}", json={"x": 50, "y": 50}
+    )
+    assert await titles(api, "oko") == ["Osaka okonomiyaki"]
+
+    await api.delete(f"/api/boards/trip/entries/{entry['id']}")
+    assert await titles(api, "osaka") == []
+
+
+async def test_search_needs_a_word(api, entry_repo):
+    for q in ("", "?!", " ".join("abcdefghi")):
+        response = await api.get(
+            "/api/search", params={"q": q, "user_id": "user-1"}
+        )
+        assert response.status_code == 400, q
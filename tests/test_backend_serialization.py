@@ -0,0 +1,33 @@
+"""
+The orjson fast path must produce exactly what response-model validation does.
+"""
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+from serialization import dump_status_check_line, dump_status_checks
+
+TIMESTAMPS = [
+    datetime(2026, 1, 1, 12, 0, 0, tzinfo=timezone.utc),
+    datetime(2026, 1, 1, 12, 0, 0, 123000, tzinfo=timezone.utc),
+]
+
+
+@pytest.mark.parametrize("native", [False, True])
+def test_fast_path_matches_response_model(native):
+    docs = [
+        {"id": str(i), "client_name": "agent",
+         "timestamp": timestamp if native else timestamp.isoformat()}
+        for i, timestamp in enumerate(TIMESTAMPS)
+    ]
+    expected = server.status_check_list.dump_json(
+        server.status_check_list.validate_python([dict(doc) for doc in docs])
+    )
+
+    assert dump_status_checks([dict(doc) for doc in docs], native) == expected
+    lines = b"".join(dump_status_check_line(dict(doc), native) for doc in docs)
+    assert [json.loads(line) for line in lines.splitlines()] == json.loads(
+        expected
+    )
@@ -0,0 +1,43 @@
+"""
+The quadtree covering must contain the cell of every point in the box.
+"""
+import random
+
+import pytest
+
+import spatial
+from spatial import BBox
+
+
+@pytest.mark.parametrize("size", [1, 300, 5000, 200000])
+def test_covering_contains_every_point(size):
+    rng = random.Random(size)
+    for _ in range(50):
+        x0, y0 = rng.uniform(-5000, 10000), rng.uniform(-5000, 10000)
+        box = BBox(x0, y0, x0 + size * rng.random(), y0 + size * rng.random())
+        ranges = spatial.covering(box, max_ranges=16)
+
+        assert len(ranges) <= 16
+        assert ranges == sorted(ranges)
+        for _ in range(50):
+            cell = spatial.cell_of(
+                rng.uniform(box.x0, box.x1), rng.uniform(box.y0, box.y1)
+            )
+            assert any(start <= cell < stop for start, stop in ranges)
+
+
+def test_small_box_is_covered_tightly():
+    ranges = spatial.covering(BBox(1000, 1000, 1100, 1100))
+    leaves = sum(stop - start for start, stop in ranges)
+    # At most the 2x2 leaf cells a 100 px box can straddle
+    assert leaves <= 4
+
+
+def test_positions_outside_the_world_are_clamped():
+    far = spatial.WORLD_MIN + spatial.WORLD_SIZE + 10 ** 9
+    assert spatial.cell_of(far, far) == spatial.morton(
+        (1 << spatial.DEPTH) - 1, (1 << spatial.DEPTH) - 1
+    )
+    assert spatial.cell_of(far, far) in range(
+        *spatial.covering(BBox(far, far, far, far))[0]
+    )
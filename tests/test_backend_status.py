@@ -0,0 +1,321 @@
+"""
+Backend tests for the /api/status endpoints.
+Runs the ASGI app in-process against each storage engine; the MongoDB runs
+skip when it is not reachable.
+"""
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+import status_stats
+
+pytestmark = pytest.mark.anyio
+
+
+def test_status_cursor_round_trip():
+    doc = {"timestamp": "2026-01-01T00:00:00+00:00", "id": "abc"}
+    timestamp, check_id = server.decode_status_cursor(
+        server.encode_status_cursor(doc)
+    )
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat()
+    assert (timestamp, check_id) == (doc["timestamp"], doc["id"])
+
+
+async def test_invalid_cursor_is_rejected(api):
+    response = await api.get("/api/status", params={"after": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+async def test_status_pages_cover_every_check_once(api, status_repo):
+    for i in range(7):
+        await api.post("/api/status", json={"client_name": f"agent-{i}"})
+
+    seen, after = [], None
+    while True:
+        params = {"limit": 3}
+        if after:
+            params["after"] = after
+        response = await api.get("/api/status", params=params)
+        assert response.status_code == 200
+        seen.extend(check["id"] for check in response.json())
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            break
+
+    assert len(seen) == 7
+    assert len(set(seen)) == 7
+
+
+async def test_status_ndjson_stream(api, status_repo):
+    for i in range(5):
+        await api.post("/api/status", json={"client_name": f"agent-{i}"})
+
+    response = await api.get("/api/status", params={"format": "ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    # Checks posted within the same millisecond are ordered by id
+    keys = [
+        (status_stats.as_datetime(row["timestamp"]), row["id"]) for row in rows
+    ]
+    assert keys == sorted(keys)
+    assert sorted(row["client_name"] for row in rows) == [
+        f"agent-{i}" for i in range(5)
+    ]
+
+
+async def test_status_filters_by_client_and_time(api, status_repo):
+    created = []
+    for i in range(6):
+        response = await api.post(
+            "/api/status", json={"client_name": f"agent-{i % 2}"}
+        )
+        created.append(response.json())
+
+    response = await api.get("/api/status", params={"client_name": "agent-1"})
+    assert {row["id"] for row in response.json()} == {
+        row["id"] for row in created[1::2]
+    }
+
+    since = created[2]["timestamp"]
+    response = await api.get(
+        "/api/status", params={"since": since, "client_name": "agent-0"}
+    )
+    assert all(
+        row["client_name"] == "agent-0"
+        and status_stats.as_datetime(row["timestamp"])
+        >= status_stats.as_datetime(since)
+        for row in response.json()
+    )
+    assert created[4]["id"] in {row["id"] for row in response.json()}
+
+    response = await api.get(
+        "/api/status", params={"since": since, "until": since}
+    )
+    assert response.status_code == 400
+
+
+async def test_status_time_filters_accept_any_utc_offset(api, status_repo):
+    for hour in (10, 11, 12, 13):
+        timestamp = datetime(2026, 1, 1, hour, tzinfo=timezone.utc)
+        check = server.StatusCheck(
+            client_name=f"agent-{hour}", timestamp=timestamp
+        )
+        await status_repo.insert(server.status_check_to_doc(check))
+
+    # 10:00Z, so the 11:00Z check is in range even though "11:00" < "12:00"
+    response = await api.get(
+        "/api/status", params={"since": "2026-01-01T12:00:00+02:00"}
+    )
+    assert [row["client_name"] for row in response.json()] == [
+        "agent-10", "agent-11", "agent-12", "agent-13"]
+
+    # 11:00Z up to 12:00Z
+    response = await api.get("/api/status", params={
+        "since": "2026-01-01T13:00:00+02:00", "until": "2026-01-01T09:00:00-03:00",
+    })
+    assert [row["client_name"] for row in response.json()] == ["agent-11"]
+
+
+async def test_status_descending_pages_cover_every_check_once(api, status_repo):
+    for i in range(7):
+        await api.post("/api/status", json={"client_name": f"agent-{i}"})
+
+    keys, after = [], None
+    while True:
+        params = {"limit": 3, "order": "desc"}
+        if after:
+            params["after"] = after
+        response = await api.get("/api/status", params=params)
+        keys.extend((status_stats.as_datetime(row["timestamp"]), row["id"])
+                    for row in response.json())
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            break
+
+    assert len(keys) == 7
+    assert keys == sorted(keys, reverse=True)
+
+
+@pytest.mark.parametrize("fast_json", [True, False])
+async def test_status_returns_only_requested_fields(
+    api, status_repo, monkeypatch, fast_json
+):
+    import serialization
+
+    if not fast_json:
+        monkeypatch.setattr(serialization, "FAST_JSON_ROUTES", frozenset())
+    for i in range(3):
+        await api.post("/api/status", json={"client_name": f"agent-{i}"})
+
+    response = await api.get(
+        "/api/status", params={"fields": "client_name", "limit": 2}
+    )
+    rows = response.json()
+    assert len(rows) == 2 and all(set(row) == {"client_name"} for row in rows)
+    assert "X-Next-Cursor" in response.headers
+
+    response = await api.get(
+        "/api/status", params={"fields": "id,client_name", "format": "ndjson"}
+    )
+    assert all(
+        set(json.loads(line)) == {"id", "client_name"}
+        for line in response.text.splitlines()
+    )
+
+    response = await api.get("/api/status", params={"fields": "id,secret"})
+    assert response.status_code == 400
+
+
+async def test_bulk_rejects_non_array_body(api):
+    response = await api.post("/api/status/bulk", json={"client_name": "agent"})
+    assert response.status_code == 422
+
+
+async def test_bulk_reports_invalid_items_by_index(api):
+    body = b'{"client_name": 1}\nnot json\n\n{}\n'
+    response = await api.post(
+        "/api/status/bulk",
+        content=body,
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 0
+    assert [failure["index"] for failure in result["failed"]] == [0, 1, 2]
+
+
+async def test_bulk_inserts_valid_items_and_reports_the_rest(api, status_repo):
+    items = [{"client_name": f"agent-{i}"} for i in range(1200)]
+    items[3] = {"name": "missing client_name"}
+    response = await api.post("/api/status/bulk", json=items)
+
+    result = response.json()
+    assert result["inserted"] == 1199
+    assert [failure["index"] for failure in result["failed"]] == [3]
+    assert await status_repo.count() == 1199
+
+
+async def test_bulk_json_body_is_capped(api, monkeypatch):
+    monkeypatch.setattr(server, "STATUS_BULK_MAX_JSON_BYTES", 100)
+    items = [{"client_name": f"agent-{i}"} for i in range(10)]
+    response = await api.post("/api/status/bulk", json=items)
+    assert response.status_code == 413
+
+    async def body():
+        # No Content-Length: the cap applies while reading
+        for item in items:
+            yield json.dumps(item).encode()
+
+    response = await api.post(
+        "/api/status/bulk",
+        content=body(),
+        headers={"content-type": "application/json"},
+    )
+    assert response.status_code == 413
+
+
+async def test_bulk_accepts_streamed_ndjson(api, status_repo):
+    async def body():
+        for i in range(10):
+            yield f'{{"client_name": "agent-{i}"}}\n'.encode()
+
+    response = await api.post(
+        "/api/status/bulk",
+        content=body(),
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.json() == {"inserted": 10, "failed": []}
+
+
+async def open_stream(path: str, query: str = ""):
+    """GET an endless response straight through ASGI, which httpx would buffer.
+
+    Returns the ASGI messages sent so far, a disconnect callback and the task
+    running the request.
+    """
+    messages, disconnected = asyncio.Queue(), asyncio.Event()
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+             "method": "GET", "scheme": "http", "path": path,
+             "raw_path": path.encode(), "query_string": query.encode(),
+             "root_path": "", "headers": [(b"host", b"test")],
+             "client": ("127.0.0.1", 1234), "server": ("test", 80)}
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    task = asyncio.create_task(server.app(scope, receive, messages.put))
+    return messages, disconnected.set, task
+
+
+async def next_body(messages) -> bytes:
+    while True:
+        message = await asyncio.wait_for(messages.get(), timeout=5)
+        if message["type"] == "http.response.body":
+            return message["body"]
+
+
+async def test_status_stream_sends_new_checks_until_disconnect(api, status_repo):
+    messages, disconnect, task = await open_stream("/api/status/stream",
+                                                   "client_name=agent-1")
+    start = await asyncio.wait_for(messages.get(), timeout=5)
+    assert start["status"] == 200
+    content_type = (b"content-type", b"text/event-stream; charset=utf-8")
+    assert content_type in start["headers"]
+    assert await next_body(messages) == b"retry: 2000\n\n"
+    assert server.status_broker.subscriber_count == 1
+
+    await api.post("/api/status", json={"client_name": "agent-0"})
+    response = await api.post("/api/status", json={"client_name": "agent-1"})
+    created = response.json()
+    # Only agent-1's check passes the filter
+    frame = await next_body(messages)
+    assert frame.startswith(b"id: " + created["id"].encode() + b"\ndata: ")
+    assert frame.endswith(b"\n\n")
+    data = json.loads(frame.split(b"\ndata: ", 1)[1])
+    assert data["id"] == created["id"] and data["client_name"] == "agent-1"
+
+    disconnect()
+    await asyncio.wait_for(task, timeout=5)
+    assert server.status_broker.subscriber_count == 0
+
+
+async def test_status_stream_reports_dropped_checks(api):
+    messages, disconnect, task = await open_stream("/api/status/stream")
+    await next_body(messages)
+    # Published faster than the stream sends: the two oldest fall out of its
+    # buffer
+    for i in range(server.status_broker.maxlen + 2):
+        server.status_broker.publish(("agent", f"id-{i}", b"{}"))
+    assert await next_body(messages) == b"event: dropped\ndata: 2\n\n"
+    assert (await next_body(messages)).startswith(b"id: id-2\n")
+
+    disconnect()
+    await asyncio.wait_for(task, timeout=5)
+    assert server.status_broker.subscriber_count == 0
+
+
+async def test_unchanged_status_page_revalidates_with_304(api, status_repo):
+    await api.post("/api/status", json={"client_name": "agent"})
+    first = await api.get("/api/status")
+    etag = first.headers["ETag"]
+    assert first.headers["X-Cache"] == "miss"
+
+    unchanged = await api.get("/api/status", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["X-Cache"] == "hit"
+
+    await api.post("/api/status", json={"client_name": "agent"})
+    changed = await api.get("/api/status", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["X-Cache"] == "miss"
+    assert len(changed.json()) == 2
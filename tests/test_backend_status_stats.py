@@ -0,0 +1,119 @@
+"""
+Tests for status check statistics and their rollups.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+import status_stats
+
+
+def test_rollup_updates_coalesce_per_bucket_and_client():
+    docs = [
+        {"client_name": "a", "timestamp": "2026-01-01T10:00:05+00:00"},
+        {
+            "client_name": "a",
+            "timestamp": datetime(2026, 1, 1, 10, 0, 59, tzinfo=timezone.utc),
+        },
+        {"client_name": "a", "timestamp": "2026-01-01T10:01:00+00:00"},
+        {"client_name": "b", "timestamp": "2026-01-01T10:00:30+00:00"},
+    ]
+    increments = {
+        (
+            update._filter["unit"],
+            update._filter["bucket"].minute,
+            update._filter["client_name"],
+        ): update._doc["$inc"]["count"]
+        for update in status_stats.rollup_updates(docs)
+    }
+    assert increments == {
+        ("minute", 0, "a"): 2,
+        ("minute", 1, "a"): 1,
+        ("minute", 0, "b"): 1,
+        ("hour", 0, "a"): 3,
+        ("hour", 0, "b"): 1,
+    }
+
+
+@pytest.mark.anyio
+async def test_stats_rejects_unknown_bucket_and_empty_range(api):
+    assert (
+        await api.get("/api/status/stats", params={"bucket": "7m"})
+    ).status_code == 422
+    response = await api.get("/api/status/stats", params={
+        "from": "2026-01-02T00:00:00Z", "to": "2026-01-01T00:00:00Z",
+    })
+    assert response.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_raw_and_rollup_stats_agree(api, status_repo):
+    items = [{"client_name": f"agent-{i % 3}"} for i in range(30)]
+    await api.post("/api/status/bulk", json=items)
+
+    now = datetime.now(timezone.utc)
+    raw = await api.get("/api/status/stats", params={"bucket": "1h"})
+    rollup = await api.get(
+        "/api/status/stats",
+        params={
+            "bucket": "1h",
+            "from": (now - timedelta(hours=2)).isoformat(),
+            "to": now.isoformat(),
+        },
+    )
+
+    assert raw.headers["X-Stats-Source"] == "raw"
+    assert rollup.headers["X-Stats-Source"] == "rollup"
+    assert sum(row["count"] for row in raw.json()) == 30
+    assert sum(row["count"] for row in rollup.json()) == 30
+
+
+def test_as_datetime_converts_to_utc():
+    converted = status_stats.as_datetime("2026-01-01T12:00:00+02:00")
+    assert converted.utcoffset() == timedelta(0)
+    assert converted == datetime(2026, 1, 1, 10, tzinfo=timezone.utc)
+    assert status_stats.as_datetime(datetime(2026, 1, 1)).tzinfo == timezone.utc
+
+
+@pytest.mark.anyio
+async def test_stats_bounds_with_a_half_hour_offset(api, status_repo):
+    for minute in (6 * 60 + 10, 6 * 60 + 50, 7 * 60 + 20, 8 * 60 + 5):
+        timestamp = datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(
+            minutes=minute
+        )
+        check = server.StatusCheck(client_name="agent", timestamp=timestamp)
+        await status_repo.insert(server.status_check_to_doc(check))
+
+    def counts(response):
+        return {status_stats.as_datetime(row["bucket"]).hour: row["count"]
+                for row in response.json()}
+
+    # 06:45Z to 07:45Z
+    raw = await api.get(
+        "/api/status/stats",
+        params={
+            "bucket": "1h",
+            "from": "2026-01-01T12:15:00+05:30",
+            "to": "2026-01-01T13:15:00+05:30",
+        },
+    )
+    assert raw.headers["X-Stats-Source"] == "raw"
+    assert counts(raw) == {6: 1, 7: 1}
+
+    # 06:40Z to 09:00Z: the hour rollups cover 07:00Z to 09:00Z, and 06:40Z
+    # to 07:00Z is counted from the checks, so 06:10Z is left out
+    rollup = await api.get(
+        "/api/status/stats",
+        params={
+            "bucket": "1h",
+            "from": "2026-01-01T12:10:00+05:30",
+            "to": "2026-01-01T14:30:00+05:30",
+        },
+    )
+    assert rollup.headers["X-Stats-Source"] == "rollup"
+    assert counts(rollup) == {6: 1, 7: 1, 8: 1}
+    assert all(
+        status_stats.as_datetime(row["bucket"]).minute == 0
+        for row in rollup.json()
+    )
@@ -0,0 +1,138 @@
+"""
+Contract tests every status check storage engine must pass.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from status_stats import as_datetime
+from storage import StatusQuery, keyset_filter
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def check(check_id, seconds, client_name="agent"):
+    return {"id": check_id, "client_name": client_name,
+            "timestamp": START + timedelta(seconds=seconds)}
+
+
+async def test_range_breaks_timestamp_ties_by_id(status_repo):
+    await status_repo.insert_many([check("b", 0), check("a", 0), check("c", 1)])
+
+    first = await status_repo.fetch_range(None, 2)
+    assert [doc["id"] for doc in first] == ["a", "b"]
+    after = (START, "b")
+    assert [
+        doc["id"] async for doc in status_repo.iter_range(after, batch_size=1)
+    ] == ["c"]
+
+
+async def test_duplicate_ids_are_reported_not_raised(status_repo):
+    await status_repo.insert(check("a", 0))
+    failures = await status_repo.insert_many(
+        [check("b", 1), check("a", 2), check("c", 3)]
+    )
+
+    assert [position for position, _ in failures] == [1]
+    assert await status_repo.count() == 3
+
+
+async def test_count_by_time_range_and_client(status_repo):
+    await status_repo.insert_many(
+        [check(str(i), i * 60, client_name=f"agent-{i % 2}") for i in range(10)]
+    )
+    end = START + timedelta(minutes=5)
+
+    assert await status_repo.count(START, end) == 5
+    assert await status_repo.count(START, end, client_name="agent-0") == 3
+    assert await status_repo.count(client_name="nobody") == 0
+
+
+async def test_rollups_match_raw_counts(status_repo):
+    from status_stats import BUCKETS
+
+    await status_repo.insert_many(
+        [check(str(i), i * 7, f"agent-{i % 3}") for i in range(100)]
+    )
+    end = START + timedelta(hours=1)
+    for bucket in ("1m", "5m", "1h"):
+        raw = await status_repo.raw_bucket_counts(
+            BUCKETS[bucket], START, end, None
+        )
+        rollup = await status_repo.rollup_bucket_counts(
+            BUCKETS[bucket], START, end, None
+        )
+        assert raw == rollup
+
+
+async def test_rollup_counts_are_exact_at_unaligned_edges(status_repo):
+    from status_stats import BUCKETS
+
+    await status_repo.insert_many(
+        [check(str(i), i * 13, f"agent-{i % 3}") for i in range(1000)]
+    )
+    # Just over an hour, starting and ending mid-minute and mid-hour
+    start = START + timedelta(minutes=17, seconds=30)
+    for end in (start + timedelta(minutes=61), start + timedelta(hours=2)):
+        for bucket in ("1m", "15m", "1h"):
+            for client_name in (None, "agent-1"):
+                raw = await status_repo.raw_bucket_counts(
+                    BUCKETS[bucket], start, end, client_name
+                )
+                rollup = await status_repo.rollup_bucket_counts(
+                    BUCKETS[bucket], start, end, client_name
+                )
+                assert raw == rollup
+
+
+async def test_range_filters_by_client_and_time(status_repo):
+    from storage import StatusQuery
+
+    await status_repo.insert_many(
+        [check(str(i), i * 60, client_name=f"agent-{i % 2}") for i in range(10)]
+    )
+    query = StatusQuery(
+        "agent-0", START + timedelta(minutes=2), START + timedelta(minutes=8)
+    )
+
+    assert [
+        doc["id"] for doc in await status_repo.fetch_range(None, 10, query)
+    ] == ["2", "4", "6"]
+    after = (START + timedelta(minutes=4), "4")
+    assert [
+        doc["id"] async for doc in status_repo.iter_range(after, query=query)
+    ] == ["6"]
+
+
+async def test_descending_range_pages_backwards(status_repo):
+    from storage import StatusQuery
+
+    await status_repo.insert_many(
+        [check("b", 0), check("a", 0), check("c", 1), check("d", 2)]
+    )
+    query = StatusQuery(descending=True)
+
+    first = await status_repo.fetch_range(None, 2, query)
+    assert [doc["id"] for doc in first] == ["d", "c"]
+    after = (START + timedelta(seconds=1), "c")
+    assert [
+        doc["id"]
+        async for doc in status_repo.iter_range(after, batch_size=1, query=query)
+    ] == ["b", "a"]
+
+
+async def test_range_projects_requested_and_keyset_fields(status_repo):
+    await status_repo.insert(check("a", 0))
+
+    [doc] = await status_repo.fetch_range(None, 1, fields=("id",))
+    assert set(doc) == {"id", "timestamp"}
+
+
+def test_string_timestamp_bounds_are_written_in_utc():
+    # Stored ISO strings only order correctly when every one is UTC
+    start = datetime(2026, 1, 1, 12, tzinfo=timezone(timedelta(hours=2)))
+    query = StatusQuery(start=as_datetime(start))
+    assert keyset_filter(None, False, query) == {
+        "timestamp": {"$gte": "2026-01-01T10:00:00+00:00"}}
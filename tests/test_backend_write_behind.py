@@ -0,0 +1,69 @@
+"""
+Tests for the write-behind buffer behind POST /api/status.
+"""
+import asyncio
+
+import pytest
+
+from write_behind import WriteBehindClosed, WriteBehindQueueFull, WriteBehindWriter
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingSink:
+    def __init__(self, delay=0.0):
+        self.batches = []
+        self.delay = delay
+
+    async def __call__(self, docs):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.batches.append(list(docs))
+
+
+async def test_inserts_are_coalesced_by_size():
+    sink = RecordingSink()
+    writer = WriteBehindWriter(sink, batch_size=10, flush_interval=1.0)
+    writer.start()
+    for i in range(25):
+        await writer.submit({"n": i})
+    await writer.close()
+
+    assert [len(batch) for batch in sink.batches] == [10, 10, 5]
+    assert [doc["n"] for batch in sink.batches for doc in batch] == list(range(25))
+
+
+async def test_partial_batch_flushes_on_interval():
+    sink = RecordingSink()
+    writer = WriteBehindWriter(sink, batch_size=100, flush_interval=0.01)
+    writer.start()
+    await writer.submit({"n": 1})
+    await asyncio.sleep(0.05)
+
+    assert sink.batches == [[{"n": 1}]]
+    await writer.close()
+
+
+async def test_full_queue_rejects_after_timeout():
+    sink = RecordingSink(delay=0.2)
+    writer = WriteBehindWriter(
+        sink, max_queue=2, batch_size=1, flush_interval=0.01, enqueue_timeout=0.01
+    )
+    writer.start()
+    with pytest.raises(WriteBehindQueueFull):
+        for i in range(10):
+            await writer.submit({"n": i})
+    await writer.close()
+
+
+async def test_close_drains_and_refuses_new_documents():
+    sink = RecordingSink()
+    writer = WriteBehindWriter(sink, batch_size=1000, flush_interval=10.0)
+    writer.start()
+    for i in range(50):
+        await writer.submit({"n": i})
+    await writer.close()
+
+    assert sum(len(batch) for batch in sink.batches) == 50
+    with pytest.raises(WriteBehindClosed):
+        await writer.submit({"n": 50})
@@ -0,0 +1,170 @@
+"""
+Fractional z-order: keys sort like the stack, placing an entry is one
+update, and over-long keys are respaced in the background without ever
+breaking the order.
+"""
+import asyncio
+import random
+
+import pytest
+
+import server
+import zorder
+from zorder import key_after, key_before, key_between, rebalance_plan, spread_keys
+
+pytestmark = pytest.mark.anyio
+
+BOARD = "board-1"
+
+
+def test_keys_follow_random_placements():
+    rng = random.Random(5)
+    stack = []
+    for _ in range(2000):
+        position = rng.randrange(len(stack) + 1)
+        below = stack[position - 1] if position else None
+        above = stack[position] if position < len(stack) else None
+        key = key_between(below, above)
+        assert (below is None or below < key) and (above is None or key < above)
+        assert not key.endswith("0")
+        stack.insert(position, key)
+    assert stack == sorted(stack)
+
+
+def test_front_and_back_keys_grow_slowly():
+    top = bottom = None
+    for _ in range(1000):
+        new_top, new_bottom = key_after(top), key_before(bottom)
+        assert (top is None or new_top > top) and (
+            bottom is None or new_bottom < bottom
+        )
+        top, bottom = new_top, new_bottom
+    assert len(top) <= 20 and len(bottom) <= 20
+    with pytest.raises(ValueError):
+        key_between("b", "a")
+
+
+@pytest.mark.parametrize("count", [1, 2, 28, 29, 1000, 100_000])
+def test_spread_keys_are_short_sorted_and_inside_the_margins(count):
+    keys = spread_keys(count)
+    assert len(keys) == count and keys == sorted(set(keys))
+    assert keys[0] > "1" and keys[-1] < "z"
+    assert max(map(len, keys)) <= 4
+
+
+def test_every_prefix_of_a_rebalance_keeps_the_stack_order():
+    rng = random.Random(9)
+    keys = []
+    for _ in range(300):
+        # Mostly pushed to the front or back, as taps do
+        if rng.random() < 0.5:
+            keys.append(key_after(keys[-1] if keys else None))
+        else:
+            keys.insert(0, key_before(keys[0] if keys else None))
+    stack = [(str(i), key) for i, key in enumerate(keys)]
+
+    current = dict(stack)
+    for entry_id, old, new in rebalance_plan(stack):
+        assert current[entry_id] == old
+        current[entry_id] = new
+        assert [current[entry_id] for entry_id, _ in stack] == sorted(
+            current.values()
+        )
+    assert [current[entry_id] for entry_id, _ in stack] == spread_keys(len(stack))
+
+
+async def test_rebalancer_runs_once_per_board():
+    started, release = [], asyncio.Event()
+
+    async def rebalance(board_id):
+        started.append(board_id)
+        await release.wait()
+
+    rebalancer = zorder.Rebalancer(rebalance)
+    rebalancer.schedule("a")
+    rebalancer.schedule("a")
+    rebalancer.schedule("b")
+    await asyncio.sleep(0)
+    assert sorted(started) == ["a", "b"]
+    release.set()
+    await rebalancer.wait()
+    rebalancer.schedule("a")
+    await rebalancer.close()
+
+
+async def create(api, title):
+    response = await api.post(
+        f"/api/boards/{BOARD}/entries",
+        json={"user_id": "user-1", "title": title, "x": 100, "y": 100},
+    )
+    return response.json()
+
+
+async def stack_titles(entry_repo):
+    return [(await entry_repo.get(BOARD, entry_id))["title"]
+            for entry_id, _ in await entry_repo.z_order(BOARD)]
+
+
+async def z_order(api, entry, **placement):
+    response = await api.post(
+        f"/api/boards/{BOARD}/ops",
+        json={"ops": [{"op": "z_order", "id": entry["id"], **placement}]},
+    )
+    return response.json()["results"][0]
+
+
+async def test_entries_are_raised_and_lowered(api, entry_repo, op_log):
+    a, b, c, d = [await create(api, title) for title in "abcd"]
+    # New entries land on top
+    assert await stack_titles(entry_repo) == ["a", "b", "c", "d"]
+
+    assert (await z_order(api, a, to="front"))["status"] == "applied"
+    assert await stack_titles(entry_repo) == ["b", "c", "d", "a"]
+    await z_order(api, d, to="back")
+    assert await stack_titles(entry_repo) == ["d", "b", "c", "a"]
+    await z_order(api, a, above=d["id"])
+    assert await stack_titles(entry_repo) == ["d", "a", "b", "c"]
+    await z_order(api, d, below=c["id"])
+    assert await stack_titles(entry_repo) == ["a", "b", "d", "c"]
+    assert (await z_order(api, a, above="missing"))["status"] == "not_found"
+
+    page = (await api.get(f"/api/boards/{BOARD}/ops", params={"since": 4})).json()
+    assert [(op["op"], list(op["changes"])) for op in page["ops"]] == [
+        ("z_order", ["z_key"])
+    ] * 4
+
+
+async def test_long_keys_are_rebalanced_in_the_background(
+    api, entry_repo, op_log, monkeypatch
+):
+    monkeypatch.setattr(server, "Z_KEY_MAX_LENGTH", 3)
+    entries = [await create(api, str(i)) for i in range(5)]
+    # Squeezing one entry in just above the bottom one, over and over,
+    # makes its key longer every time
+    for _ in range(30):
+        await z_order(api, entries[1], above=entries[0]["id"])
+        await z_order(api, entries[2], above=entries[0]["id"])
+    await server.z_rebalancer.wait()
+
+    assert await stack_titles(entry_repo) == ["0", "2", "1", "3", "4"]
+    assert max(len(z_key) for _, z_key in await entry_repo.z_order(BOARD)) <= 3
+    head = await op_log.head(BOARD)
+    last = (
+        await api.get(f"/api/boards/{BOARD}/ops", params={"since": head - 1})
+    ).json()["ops"][-1]
+    assert last["op"] == "z_rebalance" and last["id"] is None
+    assert last["changes"]["z_keys"]
+
+
+async def test_z_order_op_needs_one_placement(api, entry_repo, op_log):
+    for placement in (
+        {},
+        {"to": "front", "above": "b"},
+        {"above": "a"},
+        {"to": "middle"},
+    ):
+        response = await api.post(
+            f"/api/boards/{BOARD}/ops",
+            json={"ops": [{"op": "z_order", "id": "a", **placement}]},
+        )
+        assert response.status_code == 422, placement